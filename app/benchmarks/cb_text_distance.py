@@ -0,0 +1,119 @@
+"""
+@name: cb_text_distance.py
+@overview: Memory and time benchmark of the sparse, block thresholded BM25 text similarity
+           against the former dense implementation
+
+    python -m app.benchmarks.cb_text_distance --sizes 5000 20000 50000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import numpy as np
+from implicit import nearest_neighbours
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from app.config import ConfigTraining
+from app.models.cbcf.helpers.cb_helper_function import get_text_similarity
+
+
+def synthetic_corpus(n_docs: int, vocabulary_size: int = 20000, doc_length: int = 200,
+                     seed: int = 0) -> Tuple[List[str], np.ndarray]:
+    """
+    Build brand-gender like documents: zipf distributed words, log-normal document lengths
+    and roughly 20% of the brand-genders out of stock.
+    """
+    rng = np.random.RandomState(seed)
+
+    lengths = np.maximum(rng.lognormal(np.log(doc_length), 0.75, size=n_docs).astype(int), 5)
+    words = (rng.zipf(1.3, size=lengths.sum()) - 1) % vocabulary_size
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    corpus = [' '.join('w' + str(w) for w in words[offsets[i]:offsets[i + 1]]) for i in range(n_docs)]
+    stock = rng.randint(0, 50, size=n_docs) * (rng.rand(n_docs) > 0.2)
+
+    return corpus, stock
+
+
+def _dense_text_similarity(corpus_in: list, stock_in: list) -> np.ndarray:
+    """Former dense implementation of get_text_distance, kept as reference"""
+    vectorize = CountVectorizer(min_df=ConfigTraining.CB_REC_PARAM['min_df'])
+    X = vectorize.fit_transform(corpus_in)
+    weights = nearest_neighbours.bm25_weight(X=X, K1=ConfigTraining.CB_REC_PARAM['K1'],
+                                             B=ConfigTraining.CB_REC_PARAM['B']).toarray()
+
+    weights_norm = normalize(weights, axis=1, norm='l2')
+    weights_inner = weights_norm @ weights_norm.T
+
+    stock_level = np.array(stock_in)
+    stock_level[stock_level > 0] = 1
+    stock_level[stock_level <= 0] = 0
+
+    stock_diagonal = np.diag(stock_level)
+
+    weights_relevance_score = weights_inner @ stock_diagonal
+
+    balance = 3
+    weights_relevance_score = weights_relevance_score / balance + stock_diagonal * (1 - 1 / balance)
+
+    weights_relevance_score = weights_relevance_score.round(decimals=5)
+
+    dimension = weights_relevance_score.shape[0]
+    quantile_vect = np.quantile(weights_relevance_score, ConfigTraining.CB_REC_PARAM['quantile'], axis=0)
+    quantile_mat = np.repeat(quantile_vect, dimension, axis=0).reshape(dimension, dimension)
+    weights_relevance_score[weights_relevance_score < quantile_mat.T] = 0
+
+    return weights_relevance_score
+
+
+def _measure(func, *args) -> Tuple[object, Dict]:
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {'seconds': round(elapsed, 3), 'peak_mb': round(peak / 2 ** 20, 1)}
+
+
+def run(sizes: List[int], dense_limit: int, doc_length: int) -> List[Dict]:
+    results = []
+
+    for n_docs in sizes:
+        corpus, stock = synthetic_corpus(n_docs, doc_length=doc_length)
+
+        sparse_scores, sparse_stats = _measure(get_text_similarity, corpus, stock)
+        result = {'n_docs': n_docs,
+                  'nnz': int(sparse_scores.nnz),
+                  'density': round(sparse_scores.nnz / n_docs ** 2, 4),
+                  'sparse': sparse_stats}
+
+        if n_docs <= dense_limit:
+            dense_scores, dense_stats = _measure(_dense_text_similarity, corpus, stock)
+            result['dense'] = dense_stats
+            result['max_abs_diff'] = float(np.abs(sparse_scores.toarray() - dense_scores).max())
+
+        print(json.dumps(result))
+        results.append(result)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000, 50000])
+    parser.add_argument('--dense-limit', type=int, default=5000,
+                        help='largest size for which the dense reference is also run (n x n float64 copies)')
+    parser.add_argument('--doc-length', type=int, default=200)
+    parser.add_argument('--output', type=str, default=None, help='optional json file for the results')
+    args = parser.parse_args()
+
+    benchmark_results = run(args.sizes, args.dense_limit, args.doc_length)
+
+    if args.output:
+        with open(args.output, 'w') as file_out:
+            json.dump(benchmark_results, file_out, indent=4)
@@ -0,0 +1,138 @@
+"""
+@name: cb_top_k_recall.py
+@overview: Recall of the top K content similarity against the exact quantile thresholded similarity,
+           to pick CB_REC_PARAM['top_k'] for a quality budget
+
+    python -m app.benchmarks.cb_top_k_recall --k 25 50 100 200
+    python -m app.benchmarks.cb_top_k_recall --products ./shared/products_df.pkl --k 50 100
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from app.config import ConfigTraining
+from app.models.cbcf.helpers.cb_helper_function import get_text_relevance, get_text_similarity_top_k, \
+    _matrix_quantile_zeroes
+from app.models.cbcf.training.cb_train import ContTrain
+from app.utils.serialization import load_pickle
+from tests.fixtures import synthetic_products
+
+
+def _top_n_columns(sim_mat: csr_matrix, n: int) -> List[set]:
+    """Set of the n highest rows of every column"""
+    sim_mat = sim_mat.tocsc()
+    top = []
+
+    for j in range(sim_mat.shape[1]):
+        start, end = sim_mat.indptr[j], sim_mat.indptr[j + 1]
+        order = np.argsort(-sim_mat.data[start:end])[:n]
+        top.append(set(sim_mat.indices[start:end][order]))
+
+    return top
+
+
+def _top_n_rows(scores: csr_matrix, n: int) -> List[set]:
+    """Set of the n highest columns of every row"""
+    top = []
+
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        order = np.argsort(-scores.data[start:end])[:n]
+        top.append(set(scores.indices[start:end][order]))
+
+    return top
+
+
+def _recall(expected: List[set], found: List[set]) -> float:
+    recalls = [len(e & f) / len(e) for e, f in zip(expected, found) if e]
+
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+def _synthetic_users(n_items: int, n_users: int, history_length: int, seed: int) -> csr_matrix:
+    rng = np.random.RandomState(seed)
+    rows = np.repeat(np.arange(n_users), history_length)
+    cols = rng.randint(0, n_items, size=n_users * history_length)
+    hits = rng.gamma(1, 3, size=n_users * history_length)
+
+    return csr_matrix((hits, (rows, cols)), shape=(n_users, n_items))
+
+
+def gender_report(corpus, stock: np.ndarray, k_values: List[int], n_rec: int,
+                  n_users: int, history_length: int) -> List[Dict]:
+    """
+    neighbour_recall: share of the n_rec best neighbours of each column (exact) kept by the top K matrix
+    rec_recall: share of the n_rec best recommendations of synthetic users (exact) also returned with top K
+    """
+    start_time = time.perf_counter()
+    exact = _matrix_quantile_zeroes(get_text_relevance(corpus, stock),
+                                    quantile=ConfigTraining.CB_REC_PARAM['quantile'],
+                                    block_size=ConfigTraining.CB_REC_PARAM['quantile_block_size'])
+    exact_seconds = time.perf_counter() - start_time
+
+    users = _synthetic_users(exact.shape[0], n_users, history_length, seed=0)
+    exact_neighbours = _top_n_columns(exact, n_rec)
+    exact_recs = _top_n_rows(csr_matrix(users @ exact), n_rec)
+
+    report = []
+
+    for k in k_values:
+        start_time = time.perf_counter()
+        approx = get_text_similarity_top_k(corpus, stock, top_k=k,
+                                           block_size=ConfigTraining.CB_REC_PARAM['top_k_block_size'])
+        seconds = time.perf_counter() - start_time
+
+        report.append({'k': k,
+                       'n_items': exact.shape[0],
+                       'nnz': int(approx.nnz),
+                       'exact_nnz': int(exact.nnz),
+                       'seconds': round(seconds, 3),
+                       'exact_seconds': round(exact_seconds, 3),
+                       'neighbour_recall': round(_recall(exact_neighbours, _top_n_columns(approx, n_rec)), 4),
+                       'rec_recall': round(_recall(exact_recs, _top_n_rows(csr_matrix(users @ approx), n_rec)), 4)})
+
+    return report
+
+
+def run(product_data, k_values: List[int], n_rec: int, n_users: int, history_length: int) -> List[Dict]:
+    brand_df, term_counts = ContTrain(product_data).transform_data()
+    report = []
+
+    for gender in brand_df.gender.unique():
+        rows = np.flatnonzero(brand_df['gender'].values == gender)
+
+        for row in gender_report(term_counts[rows], brand_df['stockForSale'].values[rows],
+                                 k_values, n_rec, n_users, history_length):
+            row['gender'] = gender
+            print(json.dumps(row))
+            report.append(row)
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=str, default=None, help='pickled products dataframe')
+    parser.add_argument('--n-brands', type=int, default=500)
+    parser.add_argument('--k', type=int, nargs='+', default=[25, 50, 100, 200])
+    parser.add_argument('--n-rec', type=int, default=10, help='depth at which recall is measured')
+    parser.add_argument('--n-users', type=int, default=1000)
+    parser.add_argument('--history-length', type=int, default=5)
+    parser.add_argument('--output', type=str, default=None, help='optional json file for the report')
+    args = parser.parse_args()
+
+    if args.products:
+        products = load_pickle(directory=Path(args.products).parent, name=Path(args.products).name)
+    else:
+        products = synthetic_products(n_brands=args.n_brands)
+
+    recall_report = run(products, args.k, args.n_rec, args.n_users, args.history_length)
+
+    if args.output:
+        with open(args.output, 'w') as file_out:
+            json.dump(recall_report, file_out, indent=4)
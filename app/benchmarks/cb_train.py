@@ -0,0 +1,51 @@
+"""
+@name: cb_train.py
+@overview: Timing of ContTrain.fit against the former dense, outer merged assembly, whose parity is asserted by
+           tests/test_cb_train.py
+
+    python -m app.benchmarks.cb_train --n-brands 500
+    python -m app.benchmarks.cb_train --products ./shared/products_df.pkl
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.models.cbcf.training.cb_train import ContTrain
+from app.utils.serialization import load_pickle
+from tests.fixtures import legacy_cb_sim_mat, synthetic_products
+
+
+def run(product_data: pd.DataFrame) -> dict:
+    start_time = time.perf_counter()
+    cb_sim_mat, cb_item_dict = ContTrain(product_data.copy()).fit()
+    sparse_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    legacy_sim_mat = legacy_cb_sim_mat(product_data.copy())
+    legacy_seconds = time.perf_counter() - start_time
+
+    return {'n_brand_genders': len(cb_item_dict),
+            'nnz': int(cb_sim_mat.nnz),
+            'seconds': round(sparse_seconds, 3),
+            'legacy_seconds': round(legacy_seconds, 3),
+            'same_shape': cb_sim_mat.shape == legacy_sim_mat.shape,
+            'max_abs_diff': float(np.abs(cb_sim_mat - legacy_sim_mat).max())
+            if cb_sim_mat.shape == legacy_sim_mat.shape else None}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=str, default=None, help='pickled products dataframe')
+    parser.add_argument('--n-brands', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.products:
+        products = load_pickle(directory=Path(args.products).parent, name=Path(args.products).name)
+    else:
+        products = synthetic_products(n_brands=args.n_brands)
+
+    print(json.dumps(run(products)))
@@ -0,0 +1,76 @@
+"""
+@name: cf_train.py
+@overview: Parity check and timing of the blocked float32 CF builder against BM25Recommender.fit
+
+    python -m app.benchmarks.cf_train --n-members 50000
+    python -m app.benchmarks.cf_train --hits ./shared/hits_df.pkl --n-jobs 4
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from implicit.nearest_neighbours import BM25Recommender
+from scipy.sparse import csr_matrix
+
+from app.config import ConfigTraining
+from app.models.cbcf.helpers.cf_helper_function import bm25_item_weights, top_k_similarity
+from app.models.cbcf.training.cf_train import CollabTrain
+from app.utils.serialization import load_pickle
+from tests.fixtures import synthetic_hits
+
+
+def compare(similarity: csr_matrix, reference: csr_matrix) -> dict:
+    """
+    Entries tied at the K-th neighbour may be kept by one builder and not the other,
+    values are compared on the common support and the support overlap is reported apart.
+    """
+    similarity, reference = similarity.tocsr().astype(np.float64), reference.tocsr().astype(np.float64)
+    common = similarity.multiply(reference.astype(bool)).tocsr()
+    common_reference = reference.multiply(similarity.astype(bool)).tocsr()
+    relative = abs(common - common_reference).max() / max(abs(reference).max(), 1e-12) if common.nnz else 0.
+
+    return {'nnz': int(similarity.nnz),
+            'reference_nnz': int(reference.nnz),
+            'support_agreement': round(common.nnz / max(reference.nnz, 1), 6),
+            'max_relative_diff': float(relative)}
+
+
+def run(hits_data: pd.DataFrame, n_jobs: int, block_size: int) -> dict:
+    hits_matrix, item_dict = CollabTrain(hits_data).transform_data()
+    params = ConfigTraining.CF_KNN_PARAM
+
+    start_time = time.perf_counter()
+    weights = bm25_item_weights(hits_matrix, K1=params['K1'], B=params['B'])
+    similarity = top_k_similarity(weights, K=params['K'], block_size=block_size, n_jobs=n_jobs)
+    blocked_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    model = BM25Recommender(**params)
+    model.fit(hits_matrix, show_progress=False)
+    reference_seconds = time.perf_counter() - start_time
+
+    return {'n_items': len(item_dict),
+            'n_members': int(hits_matrix.shape[1]),
+            'seconds': round(blocked_seconds, 3),
+            'reference_seconds': round(reference_seconds, 3),
+            **compare(similarity, model.similarity)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hits', type=str, default=None, help='pickled hits dataframe')
+    parser.add_argument('--n-members', type=int, default=20000)
+    parser.add_argument('--n-brands', type=int, default=2000)
+    parser.add_argument('--n-jobs', type=int, default=ConfigTraining.CF_BUILD_PARAM['n_jobs'])
+    parser.add_argument('--block-size', type=int, default=ConfigTraining.CF_BUILD_PARAM['block_size'])
+    args = parser.parse_args()
+
+    if args.hits:
+        hits = load_pickle(directory=Path(args.hits).parent, name=Path(args.hits).name)
+    else:
+        hits = synthetic_hits(n_members=args.n_members, n_brands=args.n_brands)
+
+    print(json.dumps(run(hits, n_jobs=args.n_jobs, block_size=args.block_size)))
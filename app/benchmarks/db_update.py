@@ -0,0 +1,98 @@
+"""
+@name: db_update.py
+@overview: Time and peak RSS of each stage of the db update on a synthetic interaction dump, read through the
+           local CSV data store and loaded into an in-memory Redis stand-in. The service is called directly, a failed
+           update raises instead of being logged and alerted by DbUpdateApp.start
+
+    python -m app.benchmarks.db_update --n-records 2000000
+    python -m app.benchmarks.db_update --dump-path interactions.csv
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from ssense_logger.app_logger import AppLogger
+
+from app.benchmarks.load_test import InMemoryRedis
+from app.benchmarks.synthetic_interactions import write_interactions
+from app.config import ConfigDBUpdateApp
+from app.db_update_app.container import Container, Repositories
+from app.errors import ApplicationException
+from app.library.predict_data_import.remote_data_store.local_data_store import LocalCsvDataStore
+from app.repositories.redis_repository import RedisRepository
+from app.utils.stage_timer import stage_timer
+
+
+def _max_rss_mb() -> float:
+    # kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run(dump_path: Path, work_dir: Path) -> dict:
+
+    class BenchmarkConfig(ConfigDBUpdateApp):
+        MIN_NUMBER_OF_RECORD_EXPECTED = 0
+        SLACK_ENABLED = False
+
+    app_logger = AppLogger(app_name=BenchmarkConfig.APP_NAME, env=BenchmarkConfig.ENV)
+    redis = InMemoryRedis()
+    repositories = Repositories(BenchmarkConfig,
+                                remote_customer_interactions_source=LocalCsvDataStore(str(dump_path)),
+                                local_source=RedisRepository(BenchmarkConfig, app_logger, redis=redis))
+
+    # peak RSS of the process once each stage is done
+    stage_rss = dict()
+    stage_timer.reset()
+    stage_timer.recorder = lambda name, elapsed_ns: stage_rss.__setitem__(name, _max_rss_mb())
+
+    # the service downloads into the working directory
+    cwd = os.getcwd()
+    os.chdir(str(work_dir))
+    try:
+        start_time = time.perf_counter()
+        Container(BenchmarkConfig, repositories=repositories).services.customer_interaction_service.update()
+        elapsed = time.perf_counter() - start_time
+    finally:
+        os.chdir(cwd)
+        stage_timer.recorder = None
+
+    if not redis.data:
+        raise ApplicationException('No member saved from {}'.format(dump_path))
+
+    return {'dump_mb': round(dump_path.stat().st_size / 1024 ** 2, 1),
+            'seconds': round(elapsed, 2),
+            'n_members_saved': len(redis.data),
+            'max_rss_mb': _max_rss_mb(),
+            'stages': {name: {'seconds': round(histogram['sum_ns'] / 1e9, 2), 'max_rss_mb': stage_rss[name]}
+                       for name, histogram in stage_timer.histograms().items()}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dump-path', type=Path, default=None, help='interaction dump, synthetic when missing')
+    parser.add_argument('--n-records', type=int, default=1000000)
+    parser.add_argument('--n-members', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        if args.dump_path is None:
+            args.dump_path = tmp_dir / 'interactions.csv'
+            start = time.perf_counter()
+            # in a child process, to keep the generation out of the peak RSS
+            generator = multiprocessing.Process(target=write_interactions, args=(str(args.dump_path), args.n_records),
+                                                kwargs=dict(n_members=args.n_members, seed=args.seed))
+            generator.start()
+            generator.join()
+            print(json.dumps({'generate_seconds': round(time.perf_counter() - start, 2)}))
+
+        print(json.dumps(run(args.dump_path, tmp_dir), indent=4))
+    finally:
+        shutil.rmtree(str(tmp_dir))
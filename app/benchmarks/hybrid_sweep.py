@@ -0,0 +1,84 @@
+"""
+@name: hybrid_sweep.py
+@overview: Parity check and timing of the hybrid sweep against one validation run per point of the grid
+
+    python -m app.benchmarks.hybrid_sweep --n-users 2000 --n-jobs 3
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.models.cbcf.helpers.metrics import batch_avg_metrics
+from app.models.cbcf.training.cf_train import CollabTrain
+from app.models.cbcf.validation.rec_val import RecVal, hybrid_sweep
+from tests.fixtures import synthetic_hits
+
+
+def _per_point(rec_val: RecVal, users_array, train_hits, test_hits, cf_model, cb_model,
+               alphas, n_recs, k_vals) -> pd.DataFrame:
+    """Former tuning: scoring, rescaling and aggregation repeated for every n_rec and alpha"""
+    rows = []
+
+    for n_rec in sorted(n_recs):
+        for alpha in sorted(alphas):
+            rec_val.n_rec, rec_val.alpha_val = n_rec, alpha
+
+            cf_df, _ = rec_val.batch_predict(users_array, train_hits, test_hits, *cf_model)
+            cb_df, _ = rec_val.batch_predict(users_array, train_hits, test_hits, *cb_model)
+            _, val_df = rec_val._rec_agg(cf_df, RecVal._rescale_cb(cb_df, cf_df), test_hits)
+
+            for genderT, gender_name in ((0, 'women'), (1, 'men')):
+                val_gender = val_df[val_df.gender == genderT]
+
+                for k_val in k_vals:
+                    rows.append(dict(n_rec=n_rec, alpha=alpha, k_val=k_val, gender=gender_name,
+                                     n_members=val_gender.shape[0],
+                                     **batch_avg_metrics(val_gender.test.tolist(), val_gender.pred.tolist(), k_val)))
+
+    return pd.DataFrame(rows)
+
+
+def run(n_members: int, n_brands: int, n_users: int, n_jobs: int, seed: int = 0) -> dict:
+    rng = np.random.RandomState(seed)
+    alphas, n_recs, k_vals = [0, 0.25, 0.5, 0.75, 1], [10, 20, 50], [5, 10, 20]
+
+    hits = synthetic_hits(n_members=n_members, n_brands=n_brands, seed=seed)
+    hits['gender'] = hits['b_g'].str.split(' ', n=1, expand=True)[1].astype('int8')
+    test_rows = rng.rand(len(hits)) < 0.2
+    train_hits, test_hits = hits[~test_rows].copy(), hits[test_rows].copy()
+
+    # a model trained on half the hits stands in for CB
+    cf_model = CollabTrain(train_hits).fit()
+    cb_model = CollabTrain(train_hits.sample(frac=0.5, random_state=seed)).fit()
+    users_array = rng.choice(train_hits.memberID.unique(), size=n_users, replace=False)
+    rec_val = RecVal(hits, pd.DataFrame())
+
+    start_time = time.perf_counter()
+    cf_df, _ = rec_val.batch_predict(users_array, train_hits, test_hits, *cf_model, n_rec=max(n_recs))
+    cb_df, _ = rec_val.batch_predict(users_array, train_hits, test_hits, *cb_model, n_rec=max(n_recs))
+    table = hybrid_sweep(cf_df, cb_df, test_hits, alphas=alphas, n_recs=n_recs, k_vals=k_vals, n_jobs=n_jobs)
+    sweep_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    ref_table = _per_point(rec_val, users_array, train_hits, test_hits, cf_model, cb_model, alphas, n_recs, k_vals)
+    per_point_seconds = time.perf_counter() - start_time
+
+    return {'n_users': n_users,
+            'n_points': len(alphas) * len(n_recs) * len(k_vals),
+            'seconds': round(sweep_seconds, 3),
+            'per_point_seconds': round(per_point_seconds, 3),
+            'same_table': bool(table.shape == ref_table.shape and table.equals(ref_table))}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-members', type=int, default=20000)
+    parser.add_argument('--n-brands', type=int, default=800)
+    parser.add_argument('--n-users', type=int, default=2000)
+    parser.add_argument('--n-jobs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(json.dumps(run(n_members=args.n_members, n_brands=args.n_brands, n_users=args.n_users, n_jobs=args.n_jobs)))
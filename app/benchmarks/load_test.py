@@ -0,0 +1,285 @@
+"""
+@name: load_test.py
+@overview: Throughput and latency percentiles of the predict path at given concurrency levels, against the Flask app
+           in-process, a running endpoint, or the Cortex PythonPredictor. Member ids are replayed from a request log
+           or drawn from a Zipf distribution over the members. In-process, the customer interactions are read from an
+           in-memory Redis stand-in seeded with synthetic scores:u:* entries over the items of the model.
+
+    python -m app.benchmarks.load_test --target flask --model-path model_bg_A.pkl --concurrency 1,4,16
+    python -m app.benchmarks.load_test --target endpoint --url http://localhost:5555 --request-log requests.log
+    python -m app.benchmarks.load_test --target predictor --predictor-path predictor.py --model-path model_bg_A.pkl
+
+A request log holds one member id per line, or one JSON object per line with a member_id or memberId field.
+"""
+import argparse
+import fnmatch
+import importlib.util
+import json
+import pickle
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+from ssense_logger.app_logger import AppLogger
+
+from app.config import Config
+from tests.fixtures import synthetic_model
+
+
+class InMemoryRedis(object):
+    """Subset of the StrictRedis client used by RedisRepository, with decoded responses"""
+
+    def __init__(self):
+        self.data = dict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        return self.data.get(key)
+
+    def set(self, key: str, value: str, ex: int = None):
+        with self._lock:
+            self.data[key] = value
+
+    def pipeline(self) -> '_Pipeline':
+        return _Pipeline(self)
+
+    def scan_iter(self, match: str = '*'):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+    def randomkey(self):
+        return random.choice(list(self.data)) if self.data else None
+
+    @property
+    def connection_pool(self) -> '_ConnectionPool':
+        return _ConnectionPool()
+
+
+class _ConnectionPool(object):
+
+    class _Connection(object):
+
+        def connect(self):
+            pass
+
+    def get_connection(self, command_name: str) -> '_Connection':
+        return self._Connection()
+
+    def release(self, connection: '_Connection'):
+        pass
+
+
+class _Pipeline(object):
+
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self.commands = []
+
+    def set(self, key: str, value: str, ex: int = None):
+        self.commands.append((key, value))
+
+    def execute(self):
+        for key, value in self.commands:
+            self.redis.set(key, value)
+        self.commands = []
+
+
+def synthetic_interactions(model, n_members: int, miss_rate: float, seed: int = 0) -> pd.DataFrame:
+    """
+    :param miss_rate: share of the member ids 1..n_members without interactions
+    :return: DataFrame ['memberID', 'b_g', 'total_hits'] over the CF items of model, as saved by DbUpdateApp
+    """
+    rng = np.random.RandomState(seed)
+    labels = np.array(list(model.cf_item_dict.values()))
+
+    # popular items are the head of the item index
+    popularity = 1 / np.arange(1, len(labels) + 1) ** 0.9
+    popularity /= popularity.sum()
+
+    member_ids = np.arange(1, n_members + 1)[rng.rand(n_members) >= miss_rate]
+    sizes = np.minimum(rng.geometric(1 / 15, size=len(member_ids)), len(labels))
+
+    interactions = pd.DataFrame({'memberID': np.repeat(member_ids, sizes),
+                                 'b_g': rng.choice(labels, size=sizes.sum(), p=popularity),
+                                 'total_hits': np.round(rng.exponential(2., size=sizes.sum()) + 0.1, 4)})
+
+    return interactions.drop_duplicates(['memberID', 'b_g']).reset_index(drop=True)
+
+
+def zipf_member_ids(n_members: int, n_requests: int, exponent: float, seed: int = 0) -> List[int]:
+    """Member ids 1..n_members, the rank of a member in popularity is random"""
+    rng = np.random.RandomState(seed)
+    popularity = 1 / np.arange(1, n_members + 1) ** exponent
+    popularity /= popularity.sum()
+    ranked_ids = rng.permutation(np.arange(1, n_members + 1))
+
+    return ranked_ids[rng.choice(n_members, size=n_requests, p=popularity)].tolist()
+
+
+def read_request_log(path: Path) -> List[int]:
+    member_ids = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            request = json.loads(line)
+            line = request.get('member_id', request.get('memberId'))
+        member_ids.append(int(line))
+
+    return member_ids
+
+
+def _flask_target(model, interactions: pd.DataFrame, work_dir: Path) -> Callable[[int], int]:
+    """Requests to the app of create_app, the model loaded from a Filesystem repository under work_dir"""
+    from app.library.model_repository.repository import Repository
+    from app.library.model_repository.saver.driver.filesystem import Filesystem
+    from app.repositories.redis_repository import RedisRepository
+    from app.server.factory import create_app
+
+    class LoadTestConfig(Config):
+        MODEL_BASE_DIR = str(work_dir / 'models')
+        MODEL_LOADER_DRIVER = 'Filesystem'
+        TRAINING_ID = None
+        DEBUG = False
+        PROPAGATE_EXCEPTIONS = False
+
+    Filesystem(Repository(LoadTestConfig.MODEL_BASE_DIR)).save_model(model)
+
+    redis_repository = RedisRepository(LoadTestConfig, AppLogger(app_name=Config.APP_NAME, env=Config.ENV),
+                                       redis=InMemoryRedis())
+    redis_repository.batch_save(interactions)
+
+    app, _ = create_app(LoadTestConfig, redis_repository=redis_repository)
+
+    # measured once warm, as behind the readiness probe
+    while app.test_client().get('/readiness').status_code == 503:
+        time.sleep(0.1)
+
+    clients = threading.local()
+
+    def request(member_id: int) -> int:
+        if not hasattr(clients, 'client'):
+            clients.client = app.test_client()
+        return clients.client.get('/predict', query_string={'memberId': member_id}).status_code
+
+    return request
+
+
+def _endpoint_target(url: str, timeout: float) -> Callable[[int], int]:
+    import requests
+
+    sessions = threading.local()
+
+    def request(member_id: int) -> int:
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        return sessions.session.get(url.rstrip('/') + '/predict', params={'memberId': member_id},
+                                    timeout=timeout).status_code
+
+    return request
+
+
+def _predictor_target(predictor_path: Path, model_path: Path) -> Callable[[int], int]:
+    spec = importlib.util.spec_from_file_location('predictor', str(predictor_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    predictor = module.PythonPredictor({'deployment_name': 'load-test', 'model_path': str(model_path)})
+
+    def request(member_id: int) -> int:
+        predictor.predict({'member_id': member_id})
+        return 200
+
+    return request
+
+
+def run_level(request: Callable[[int], int], member_ids: List[int], concurrency: int) -> Dict:
+    """Replays member_ids with concurrency requests in flight"""
+    latencies = np.zeros(len(member_ids))
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def timed(position: int):
+        start_time = time.perf_counter()
+        try:
+            status = request(member_ids[position])
+        except Exception as e:
+            status = type(e).__name__
+        latencies[position] = time.perf_counter() - start_time
+        with lock:
+            statuses[status] += 1
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(len(member_ids))))
+    elapsed = time.perf_counter() - start_time
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+
+    return {'concurrency': concurrency,
+            'n_requests': len(member_ids),
+            'throughput_rps': round(len(member_ids) / elapsed, 1),
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'statuses': {str(status): count for status, count in statuses.items()}}
+
+
+def run(request: Callable[[int], int], member_ids: List[int], concurrency_levels: List[int],
+        n_warmup: int = 0) -> List[Dict]:
+    for member_id in member_ids[:n_warmup]:
+        request(member_id)
+
+    return [run_level(request, member_ids, concurrency) for concurrency in concurrency_levels]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=['flask', 'endpoint', 'predictor'], default='flask')
+    parser.add_argument('--concurrency', type=lambda value: [int(level) for level in value.split(',')],
+                        default=[1, 4, 16], help='comma-separated concurrency levels')
+    parser.add_argument('--n-requests', type=int, default=500, help='per level, when no request log is replayed')
+    parser.add_argument('--n-warmup', type=int, default=20)
+    parser.add_argument('--request-log', type=Path, default=None)
+    parser.add_argument('--n-members', type=int, default=10000)
+    parser.add_argument('--zipf-exponent', type=float, default=1.1)
+    parser.add_argument('--miss-rate', type=float, default=0.05, help='share of members without interactions')
+    parser.add_argument('--model-path', type=Path, default=None, help='pickled RecPred, synthetic when missing')
+    parser.add_argument('--n-items', type=int, default=2000)
+    parser.add_argument('--url', default='http://localhost:5555')
+    parser.add_argument('--timeout', type=float, default=10.)
+    parser.add_argument('--predictor-path', type=Path, default=Path('predictor.py'))
+    args = parser.parse_args()
+
+    if args.request_log is not None:
+        requested_ids = read_request_log(args.request_log)
+    else:
+        requested_ids = zipf_member_ids(args.n_members, args.n_requests, args.zipf_exponent)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        if args.target == 'endpoint':
+            target = _endpoint_target(args.url, args.timeout)
+        elif args.model_path is None:
+            args.model_path = tmp_dir / 'model.pkl'
+            args.model_path.write_bytes(pickle.dumps(synthetic_model(args.n_items, density=0.05, seed=0)))
+
+        if args.target == 'flask':
+            with args.model_path.open('rb') as f:
+                rec_pred = pickle.load(f)
+            target = _flask_target(rec_pred, synthetic_interactions(rec_pred, args.n_members, args.miss_rate),
+                                   tmp_dir)
+        elif args.target == 'predictor':
+            target = _predictor_target(args.predictor_path, args.model_path)
+
+        print(json.dumps(run(target, requested_ids, args.concurrency, n_warmup=args.n_warmup), indent=4))
+    finally:
+        shutil.rmtree(str(tmp_dir))
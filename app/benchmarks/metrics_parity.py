@@ -0,0 +1,42 @@
+"""
+@name: metrics_parity.py
+@overview: Timing of the batch ranking metrics against the single user functions on random lists, their exact
+           parity is asserted by tests/test_metrics.py
+
+    python -m app.benchmarks.metrics_parity --n-users 20000 --k 10
+"""
+import argparse
+import json
+import time
+
+from app.models.cbcf.helpers.metrics import batch_metrics, ragged_codes
+from tests.fixtures import SINGLE_USER_METRICS, random_lists, single_user_scores
+
+
+def run(n_users: int, n_items: int, max_length: int, k: int, seed: int = 0) -> dict:
+    actual, predicted = random_lists(n_users, n_items, max_length, seed)
+
+    start_time = time.perf_counter()
+    batch_metrics(*ragged_codes(actual, predicted), k=k)
+    batch_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for name in SINGLE_USER_METRICS:
+        single_user_scores(name, actual, predicted, k)
+    single_user_seconds = time.perf_counter() - start_time
+
+    return {'n_users': n_users, 'k': k, 'seconds': round(batch_seconds, 3),
+            'single_user_seconds': round(single_user_seconds, 3)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-users', type=int, default=20000)
+    parser.add_argument('--n-items', type=int, default=50)
+    parser.add_argument('--max-length', type=int, default=15)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(n_users=args.n_users, n_items=args.n_items, max_length=args.max_length, k=args.k,
+                         seed=args.seed)))
@@ -0,0 +1,84 @@
+"""
+@name: model_artifact.py
+@overview: Size, save and load time of a RecPred pickle against its pickle-free artifact, and parity of predictions
+
+    python -m app.benchmarks.model_artifact --model-path model_bg_A.pkl
+    python -m app.benchmarks.model_artifact --n-items 4000
+"""
+import argparse
+import json
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.library.model_repository.artifact import load_artifact, load_components, save_artifact
+from tests.fixtures import synthetic_model
+
+
+def _timed(func):
+    start_time = time.perf_counter()
+    output = func()
+
+    return output, round(time.perf_counter() - start_time, 4)
+
+
+def _directory_mb(path: Path) -> float:
+    return round(sum(file.stat().st_size for file in path.iterdir()) / 1024 ** 2, 2)
+
+
+def run(model, n_members: int, seed: int = 0) -> dict:
+    rng = np.random.RandomState(seed)
+    work_dir = Path(tempfile.mkdtemp())
+    try:
+        pickle_path, artifact_dir = work_dir / 'model.pkl', work_dir / 'artifact'
+
+        _, pickle_save_seconds = _timed(lambda: pickle_path.write_bytes(pickle.dumps(model)))
+        _, artifact_save_seconds = _timed(lambda: save_artifact(artifact_dir, model))
+
+        pickled, pickle_load_seconds = _timed(lambda: pickle.loads(pickle_path.read_bytes()))
+        lazy, artifact_open_seconds = _timed(lambda: load_artifact(artifact_dir))
+        _, artifact_components_seconds = _timed(lambda: load_components(lazy))
+
+        labels = list(model.cf_item_dict.values())
+        members = [pd.DataFrame({'b_g': rng.choice(labels, size=8, replace=False), 'total_hits': rng.randint(1, 9, 8)})
+                   for _ in range(n_members)]
+
+        same_predictions = True
+        for user_data in members:
+            expected, actual = pickled.predict(user_data), load_artifact(artifact_dir).predict(user_data)
+            # scores may be NaN, equal on both sides
+            same_predictions &= all(pd.Series(getattr(expected, field)).equals(pd.Series(getattr(actual, field)))
+                                    for field in ('brand', 'gender', 'score', 'liked'))
+
+        return {'pickle_mb': round(pickle_path.stat().st_size / 1024 ** 2, 2),
+                'artifact_mb': _directory_mb(artifact_dir),
+                'pickle_save_seconds': pickle_save_seconds,
+                'artifact_save_seconds': artifact_save_seconds,
+                'pickle_load_seconds': pickle_load_seconds,
+                'artifact_open_seconds': artifact_open_seconds,
+                'artifact_components_seconds': artifact_components_seconds,
+                'same_predictions': bool(same_predictions)}
+    finally:
+        shutil.rmtree(str(work_dir))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', type=Path, default=None, help='pickled RecPred, synthetic when missing')
+    parser.add_argument('--n-items', type=int, default=4000)
+    parser.add_argument('--density', type=float, default=0.05)
+    parser.add_argument('--n-members', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.model_path is not None:
+        with args.model_path.open('rb') as f:
+            rec_pred = pickle.load(f)
+    else:
+        rec_pred = synthetic_model(args.n_items, args.density, seed=0)
+
+    print(json.dumps(run(rec_pred, n_members=args.n_members)))
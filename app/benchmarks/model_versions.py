@@ -0,0 +1,77 @@
+"""
+@name: model_versions.py
+@overview: Versioned saves, retention and rollback of the Filesystem and S3 model repositories,
+           S3 against a local stub client
+
+    python -m app.benchmarks.model_versions --n-trainings 4 --retention-count 2
+"""
+import argparse
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.library.model_repository.loader.driver.filesystem import Filesystem as FilesystemLoader
+from app.library.model_repository.loader.driver.s3 import S3 as S3Loader
+from app.library.model_repository.repository import Repository
+from app.library.model_repository.saver.driver.filesystem import Filesystem as FilesystemSaver
+from app.library.model_repository.saver.driver.s3 import S3 as S3Saver
+from tests.fixtures import LocalS3Client, synthetic_model
+
+
+def _check(saver, loader, s3_client, n_trainings: int, retention_count: int, n_items: int) -> dict:
+    models = []
+    for training in range(n_trainings):
+        model = synthetic_model(n_items, density=0.01, seed=training)
+        model.init_date = datetime(2020, 1, 1) + timedelta(days=training)
+        saver.save_model(model)
+        models.append(model)
+
+    unpinned = models[-1].to_model_info()
+    unpinned.timestamp = None
+    versions = saver.list_versions(unpinned)
+
+    # the server ran the previous training before the last one was activated
+    rollback = models[-2].to_model_info()
+    loader.load_model(rollback)
+    loaded_latest = loader.load_model(unpinned)
+
+    saver.activate(rollback)
+    if s3_client is not None:
+        s3_client.calls.clear()
+    loaded_rollback = loader.load_model(unpinned)
+
+    return {'versions': versions,
+            'kept_last': versions == [model.to_model_info().timestamp for model in models[-retention_count:]],
+            'loads_active': loaded_latest.init_date == models[-1].init_date,
+            'rollback_loaded': loaded_rollback.init_date.strftime('%Y-%m-%d-%H-%M-%S') == rollback.timestamp,
+            'rollback_calls': dict(s3_client.calls) if s3_client is not None else None}
+
+
+def run(n_trainings: int, retention_count: int, n_items: int) -> dict:
+    work_dir = tempfile.mkdtemp()
+    try:
+        filesystem = Repository(str(Path(work_dir) / 'models'))
+        filesystem_result = _check(FilesystemSaver(filesystem, retention_count=retention_count),
+                                   FilesystemLoader(filesystem), None, n_trainings, retention_count, n_items)
+
+        s3_client = LocalS3Client(str(Path(work_dir) / 's3'))
+        s3 = Repository('ds-models')
+        s3_result = _check(S3Saver(s3, s3_client, 'bucket', retention_count=retention_count),
+                           S3Loader(s3, s3_client, 'bucket', cache_dir=str(Path(work_dir) / 'cache')),
+                           s3_client, n_trainings, retention_count, n_items)
+
+        return {'filesystem': filesystem_result, 's3': s3_result}
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-trainings', type=int, default=4)
+    parser.add_argument('--retention-count', type=int, default=2, help='at least 2, to roll back')
+    parser.add_argument('--n-items', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(json.dumps(run(n_trainings=args.n_trainings, retention_count=args.retention_count, n_items=args.n_items)))
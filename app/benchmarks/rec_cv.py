@@ -0,0 +1,49 @@
+"""
+@name: rec_cv.py
+@overview: Timing and reproducibility of RecCrossVal.model_cv with and without the process pool
+
+    python -m app.benchmarks.rec_cv --n-users 2000 --n-jobs 3
+"""
+import argparse
+import json
+import time
+
+from app.models.cbcf.helpers.stage_cache import StageCache
+from app.models.cbcf.validation.rec_cv import RecCrossVal
+from tests.fixtures import synthetic_hits, synthetic_products
+
+
+def _model_cv(hits, products, n_users: int, n_jobs: int, seed: int):
+    rec_cv = RecCrossVal(hits.copy(), products)
+    rec_cv.rec_val.stage_cache = StageCache()
+    rec_cv.n_users, rec_cv.n_jobs, rec_cv.seed = n_users, n_jobs, seed
+
+    start_time = time.perf_counter()
+    scores, summary = rec_cv.model_cv()
+
+    return scores, summary, time.perf_counter() - start_time
+
+
+def run(n_members: int, n_brands: int, n_users: int, n_jobs: int, seed: int = 0) -> dict:
+    hits = synthetic_hits(n_members=n_members, n_brands=n_brands, seed=seed)
+    products = synthetic_products(n_brands=n_brands, seed=seed)
+
+    scores, summary, seconds = _model_cv(hits, products, n_users, n_jobs, seed)
+    sequential_scores, _, sequential_seconds = _model_cv(hits, products, n_users, 1, seed)
+
+    return {'n_folds': int(scores.fold.nunique()),
+            'seconds': round(seconds, 3),
+            'sequential_seconds': round(sequential_seconds, 3),
+            'same_scores': bool(scores.equals(sequential_scores)),
+            'summary': summary.round(4).to_dict(orient='records')}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-members', type=int, default=20000)
+    parser.add_argument('--n-brands', type=int, default=800)
+    parser.add_argument('--n-users', type=int, default=2000)
+    parser.add_argument('--n-jobs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(json.dumps(run(n_members=args.n_members, n_brands=args.n_brands, n_users=args.n_users, n_jobs=args.n_jobs)))
@@ -0,0 +1,155 @@
+"""
+@name: rec_pred_predict.py
+@overview: Per-stage latency and memory of RecPred.predict on synthetic models as the catalog grows,
+           for each length of member history. Results are saved as JSON with the commit they were run at.
+
+    python -m app.benchmarks.rec_pred_predict --sizes 1000 5000 20000 --history-lengths 1 8 32 128
+    python -m app.benchmarks.rec_pred_predict --output rec_pred_predict.json
+
+The synthetic matrices have the shape of the trained ones: the CF similarity keeps the top K neighbours of each
+brand-gender (CollabTrain, K=250) with heavy-tailed BM25 scores, the CB similarity is block diagonal per gender and
+sparse, as left by the quantile 0.5 threshold of ContTrain.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from git import Repo
+from scipy.sparse import coo_matrix, csr_matrix
+
+from app.config import ConfigTraining
+from app.models.cbcf.rec_pred import RecPred
+from app.utils.stage_timer import stage_timer
+
+
+def _item_dict(n_items: int) -> Dict[int, str]:
+    """Codes of the 'brand gender' labels in label order, as the categorical codes of the trainings"""
+    return {code: '{} {}'.format(1000 + code // 2, code % 2) for code in range(n_items)}
+
+
+def synthetic_cf_sim_mat(n_items: int, k: int, rng: np.random.RandomState) -> csr_matrix:
+    """About k neighbours per row, popular brand-genders are the neighbours of more rows"""
+    k = min(k, n_items)
+    popularity = 1 / np.arange(1, n_items + 1) ** 0.8
+    popularity /= popularity.sum()
+
+    rows = np.repeat(np.arange(n_items), k)
+    cols = rng.choice(n_items, size=n_items * k, p=popularity)
+    scores = rng.lognormal(mean=2., sigma=2., size=n_items * k)
+
+    sim_mat = coo_matrix((scores, (rows, cols)), shape=(n_items, n_items)).tocsr()
+    sim_mat.sum_duplicates()
+
+    return sim_mat
+
+
+def synthetic_cb_sim_mat(n_items: int, density: float, rng: np.random.RandomState) -> csr_matrix:
+    """Cosine like similarities within each gender, the codes of a gender alternate as in _item_dict"""
+    n_pairs = int(density * n_items * n_items)
+    rows = rng.randint(n_items, size=n_pairs)
+    # same parity as the row, the gender of the label
+    cols = (rng.randint(n_items // 2, size=n_pairs) * 2 + rows % 2) % n_items
+    similarities = rng.uniform(0.01, 1., size=n_pairs)
+
+    # a brand-gender is its own closest neighbour
+    diagonal = np.arange(n_items)
+    sim_mat = coo_matrix((np.concatenate([similarities, np.full(n_items, 2.)]),
+                          (np.concatenate([rows, diagonal]), np.concatenate([cols, diagonal]))),
+                         shape=(n_items, n_items)).tocsr()
+    sim_mat.sum_duplicates()
+    sim_mat.data = np.minimum(sim_mat.data, 1.)
+
+    return sim_mat
+
+
+def synthetic_rec_pred(n_items: int, k: int, cb_density: float, seed: int = 0) -> RecPred:
+    rng = np.random.RandomState(seed)
+    item_dict = _item_dict(n_items)
+
+    return RecPred(cf_sim_mat=synthetic_cf_sim_mat(n_items, k, rng), cf_item_dict=item_dict,
+                   cb_sim_mat=synthetic_cb_sim_mat(n_items, cb_density, rng), cb_item_dict=dict(item_dict))
+
+
+def synthetic_members(item_dict: Dict[int, str], history_length: int, n_members: int,
+                      seed: int = 0) -> List[pd.DataFrame]:
+    """User data as read from Redis: history_length brand-genders per member, with decayed hits"""
+    rng = np.random.RandomState(seed)
+    labels = np.array(list(item_dict.values()))
+    history_length = min(history_length, len(labels))
+
+    return [pd.DataFrame({'b_g': rng.choice(labels, size=history_length, replace=False),
+                          'total_hits': np.round(rng.exponential(2., size=history_length) + 0.1, 4)})
+            for _ in range(n_members)]
+
+
+def _matrix_mb(matrix: csr_matrix) -> float:
+    return round((matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1024 ** 2, 2)
+
+
+def _measure(model: RecPred, members: List[pd.DataFrame]) -> Dict:
+    # first call pays the lazy imports of pandas
+    model.predict(members[0])
+
+    stage_timer.reset()
+    start_time = time.perf_counter()
+    for user_data in members:
+        with stage_timer.stage('rec_pred'):
+            model.predict(user_data)
+    elapsed = time.perf_counter() - start_time
+    stages = stage_timer.quantiles()
+
+    # separate pass, tracemalloc slows the allocations down
+    peaks = []
+    for user_data in members[:10]:
+        tracemalloc.start()
+        model.predict(user_data)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {'predictions_per_second': round(len(members) / elapsed, 1),
+            'peak_mb_per_prediction': round(max(peaks) / 1024 ** 2, 3),
+            'stages': stages}
+
+
+def run(sizes: List[int], history_lengths: List[int], n_members: int, k: int, cb_density: float) -> Dict:
+    results = []
+    for n_items in sizes:
+        model = synthetic_rec_pred(n_items, k, cb_density)
+        model_stats = {'n_items': n_items,
+                       'cf_nnz': int(model.cf_sim_mat.nnz),
+                       'cb_nnz': int(model.cb_sim_mat.nnz),
+                       'cf_sim_mat_mb': _matrix_mb(model.cf_sim_mat),
+                       'cb_sim_mat_mb': _matrix_mb(model.cb_sim_mat)}
+
+        for history_length in history_lengths:
+            result = dict(model_stats, history_length=history_length,
+                          **_measure(model, synthetic_members(model.cf_item_dict, history_length, n_members)))
+            print(json.dumps({key: value for key, value in result.items() if key != 'stages'}))
+            results.append(result)
+
+    return {'sha': str(Repo(search_parent_directories=True).head.object.hexsha),
+            'params': {'k': k, 'cb_density': cb_density, 'n_members': n_members,
+                       'n_rec': ConfigTraining.MERGED_REC_PARAM['n_rec']},
+            'results': results}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000], help='number of brand-genders')
+    parser.add_argument('--history-lengths', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--n-members', type=int, default=100, help='predictions per size and history length')
+    parser.add_argument('--k', type=int, default=ConfigTraining.CF_KNN_PARAM['K'])
+    parser.add_argument('--cb-density', type=float, default=0.0125,
+                        help='share of non zero CB similarities, 0.0125 in the trained models')
+    parser.add_argument('--output', type=str, default=None, help='optional json file for the results')
+    args = parser.parse_args()
+
+    benchmark_results = run(args.sizes, args.history_lengths, args.n_members, args.k, args.cb_density)
+
+    if args.output:
+        with open(args.output, 'w') as file_out:
+            json.dump(benchmark_results, file_out, indent=4)
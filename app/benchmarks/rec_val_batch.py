@@ -0,0 +1,89 @@
+"""
+@name: rec_val_batch.py
+@overview: Parity check and timing of RecVal.batch_predict and RecVal._rec_agg against their former per member loops,
+           kept in tests/fixtures.py as the reference implementation of the validation scoring
+
+    python -m app.benchmarks.rec_val_batch --n-users 1000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.models.cbcf.training.cf_train import CollabTrain
+from app.models.cbcf.validation.rec_val import RecVal
+from tests.fixtures import legacy_batch_predict, legacy_val_prep, synthetic_hits
+
+
+def _per_member_val(cbf: pd.DataFrame, test_hits: pd.DataFrame) -> pd.DataFrame:
+    """Former _rec_agg validation lists: one filter of the test hits and the hybrid predictions per member"""
+    return pd.concat([legacy_val_prep(userId, test_hits[test_hits.memberID == userId], cbf[cbf.memberID == userId])
+                      for userId in cbf.memberID.unique()]).reset_index(drop=True)
+
+
+def _same_val_lists(val_df: pd.DataFrame, ref_val_df: pd.DataFrame) -> bool:
+    return bool(val_df.shape == ref_val_df.shape
+                and all(a == b for a, b in zip(val_df.test, ref_val_df.test))
+                and all(a == b for a, b in zip(val_df.pred, ref_val_df.pred)))
+
+
+def run(n_members: int, n_brands: int, n_users: int, seed: int = 0) -> dict:
+    rng = np.random.RandomState(seed)
+
+    hits = synthetic_hits(n_members=n_members, n_brands=n_brands, seed=seed)
+    hits['gender'] = hits['b_g'].str.split(' ', n=1, expand=True)[1].astype('int8')
+    test_rows = rng.rand(len(hits)) < 0.2
+    train_hits, test_hits = hits[~test_rows].copy(), hits[test_rows].copy()
+
+    sim_mat, item_dict = CollabTrain(train_hits).fit()
+    users_array = rng.choice(train_hits.memberID.unique(), size=n_users, replace=False)
+    rec_val = RecVal(hits, pd.DataFrame())
+
+    start_time = time.perf_counter()
+    pred_df, val_df = rec_val.batch_predict(users_array, train_hits, test_hits, sim_mat, item_dict)
+    batch_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    ref_pred_df, ref_val_df = legacy_batch_predict(users_array, train_hits, test_hits, sim_mat, item_dict,
+                                                   rec_val.n_rec)
+    per_member_seconds = time.perf_counter() - start_time
+
+    same_shape = pred_df.shape == ref_pred_df.shape and val_df.shape == ref_val_df.shape
+
+    # hybrid of the predictions with those of a model trained on half the hits, standing in for CB
+    half_sim_mat, half_item_dict = CollabTrain(train_hits.sample(frac=0.5, random_state=seed)).fit()
+    half_pred_df, _ = rec_val.batch_predict(users_array, train_hits, test_hits, half_sim_mat, half_item_dict)
+
+    start_time = time.perf_counter()
+    cbf, agg_val_df = rec_val._rec_agg(pred_df, RecVal._rescale_cb(half_pred_df, pred_df), test_hits)
+    agg_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    ref_agg_val_df = _per_member_val(cbf, test_hits)
+    per_member_agg_seconds = time.perf_counter() - start_time
+
+    return {'n_users': n_users,
+            'seconds': round(batch_seconds, 3),
+            'per_member_seconds': round(per_member_seconds, 3),
+            'same_shape': same_shape,
+            'max_score_diff': float(np.abs(pred_df.score.values - ref_pred_df.score.values).max())
+            if same_shape and len(pred_df) else None,
+            # items of equal score may swap places across genders
+            'same_b_g_share': float((pred_df.b_g.values == ref_pred_df.b_g.values).mean())
+            if same_shape and len(pred_df) else None,
+            'same_val_lists': _same_val_lists(val_df, ref_val_df),
+            'agg_seconds': round(agg_seconds, 3),
+            'per_member_agg_val_seconds': round(per_member_agg_seconds, 3),
+            'same_agg_val_lists': _same_val_lists(agg_val_df, ref_agg_val_df)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-members', type=int, default=20000)
+    parser.add_argument('--n-brands', type=int, default=800)
+    parser.add_argument('--n-users', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(json.dumps(run(n_members=args.n_members, n_brands=args.n_brands, n_users=args.n_users)))
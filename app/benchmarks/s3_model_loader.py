@@ -0,0 +1,108 @@
+"""
+@name: s3_model_loader.py
+@overview: Round trip of a model through the S3 saver and loader against a local stub S3 client:
+           streamed upload, cold, cached and offline loads, and a corrupted download
+
+    python -m app.benchmarks.s3_model_loader --n-items 4000 --latency-ms 20 --bandwidth-mb 50
+"""
+import argparse
+import hashlib
+import json
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from app.errors import ApplicationException
+from app.library.model_repository.loader.driver.s3 import S3 as S3Loader
+from app.library.model_repository.repository import Repository
+from app.library.model_repository.saver.driver.s3 import S3 as S3Saver
+from tests.fixtures import LocalS3Client, synthetic_model
+
+
+def _timed_load(loader: S3Loader, s3_client: LocalS3Client, model_info):
+    s3_client.calls.clear()
+    start_time = time.perf_counter()
+    model = loader.load_model(model_info)
+
+    return model, round(time.perf_counter() - start_time, 3), dict(s3_client.calls)
+
+
+def run(n_items: int, density: float, latency: float, bandwidth: float, part_size: int, max_workers: int,
+        seed: int = 0) -> dict:
+    work_dir = tempfile.mkdtemp()
+    try:
+        s3_client = LocalS3Client(str(Path(work_dir) / 's3'), latency=latency, bandwidth=bandwidth)
+        repository = Repository('ds-models')
+        model = synthetic_model(n_items, density, seed)
+        model_info = model.to_model_info()
+
+        s3_client.calls.clear()
+        start_time = time.perf_counter()
+        S3Saver(repository, s3_client, 'bucket', part_size=part_size, max_workers=max_workers).save_model(model)
+        save_seconds = round(time.perf_counter() - start_time, 3)
+        save_calls = dict(s3_client.calls)
+
+        metadata = json.loads(s3_client.get_object(
+            Bucket='bucket', Key=str(repository.build_path_from_info(model_info, 'metadata.json')))['Body'].read())
+        tar_key = str(repository.build_path_from_info(model_info, metadata['tar_file_name']))
+        tar_size = s3_client.head_object(Bucket='bucket', Key=tar_key)['ContentLength']
+
+        def loader(cache_name: str, **kwargs) -> S3Loader:
+            return S3Loader(repository, s3_client, 'bucket', cache_dir=str(Path(work_dir) / cache_name),
+                            part_size=part_size, **kwargs)
+
+        _, single_seconds, _ = _timed_load(loader('single', max_workers=1), s3_client, model_info)
+        loaded, cold_seconds, cold_calls = _timed_load(loader('cache', max_workers=max_workers), s3_client, model_info)
+        extracted = Path(work_dir, 'cache', metadata['sha256'])
+        same_components = all(
+            hashlib.sha256((extracted / name).read_bytes()).hexdigest() == component['sha256']
+            for name, component in metadata['components'].items())
+        _, cached_seconds, cached_calls = _timed_load(loader('cache', max_workers=max_workers), s3_client, model_info)
+        _, offline_seconds, offline_calls = _timed_load(loader('cache', max_workers=max_workers, revalidate=False),
+                                                        s3_client, model_info)
+
+        # a tar changed after its metadata was written must be rejected and leave nothing in the cache
+        with s3_client._path('bucket', tar_key).open('r+b') as f:
+            f.seek(tar_size // 2)
+            f.write(b'corrupted')
+        try:
+            loader('corrupted', max_workers=max_workers).load_model(model_info)
+            corruption_rejected = False
+        except ApplicationException:
+            corruption_rejected = not any(Path(work_dir, 'corrupted').iterdir())
+
+        return {'pickle_mb': round(len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024 ** 2, 1),
+                'tar_mb': round(tar_size / 1024 ** 2, 1),
+                'n_parts': -(-tar_size // part_size),
+                'save_seconds': save_seconds,
+                'save_calls': save_calls,
+                'single_stream_seconds': single_seconds,
+                'cold_seconds': cold_seconds,
+                'cold_calls': cold_calls,
+                'cached_seconds': cached_seconds,
+                'cached_calls': cached_calls,
+                'offline_seconds': offline_seconds,
+                'offline_calls': offline_calls,
+                'same_components': same_components,
+                'same_model': bool((loaded.cf_sim_mat != model.cf_sim_mat).nnz == 0
+                                   and loaded.cf_item_dict == model.cf_item_dict),
+                'corruption_rejected': corruption_rejected}
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-items', type=int, default=4000)
+    parser.add_argument('--density', type=float, default=0.05)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--bandwidth-mb', type=float, default=50, help='MB per second of one connection')
+    parser.add_argument('--part-size-mb', type=float, default=1)
+    parser.add_argument('--max-workers', type=int, default=8)
+    args = parser.parse_args()
+
+    print(json.dumps(run(n_items=args.n_items, density=args.density, latency=args.latency_ms / 1000,
+                         bandwidth=args.bandwidth_mb * 1024 ** 2,
+                         part_size=int(args.part_size_mb * 1024 ** 2), max_workers=args.max_workers)))
@@ -0,0 +1,66 @@
+"""
+@name: stage_timer.py
+@overview: Per-stage latency of RecPred.predict from the stage timer histograms, and the cost of timing a stage
+
+    python -m app.benchmarks.stage_timer --model-path model_bg_A.pkl
+    python -m app.benchmarks.stage_timer --n-items 4000
+"""
+import argparse
+import json
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.utils.stage_timer import StageTimer, stage_timer
+from tests.fixtures import synthetic_model
+
+
+def _overhead_ns(n_stages: int) -> float:
+    """Nanoseconds of an empty timed block beyond an empty loop"""
+    timer = StageTimer()
+
+    start_time = time.perf_counter_ns()
+    for _ in range(n_stages):
+        pass
+    loop_ns = time.perf_counter_ns() - start_time
+
+    start_time = time.perf_counter_ns()
+    for _ in range(n_stages):
+        with timer.stage('empty'):
+            pass
+
+    return round((time.perf_counter_ns() - start_time - loop_ns) / n_stages, 1)
+
+
+def run(model, n_members: int, seed: int = 0) -> dict:
+    rng = np.random.RandomState(seed)
+    labels = list(model.cf_item_dict.values())
+    members = [pd.DataFrame({'b_g': rng.choice(labels, size=8, replace=False), 'total_hits': rng.randint(1, 9, 8)})
+               for _ in range(n_members)]
+
+    stage_timer.reset()
+    for user_data in members:
+        with stage_timer.stage('rec_pred'):
+            model.predict(user_data)
+
+    return {'stage_overhead_ns': _overhead_ns(100000), 'stages': stage_timer.quantiles()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', type=Path, default=None, help='pickled RecPred, synthetic when missing')
+    parser.add_argument('--n-items', type=int, default=4000)
+    parser.add_argument('--density', type=float, default=0.05)
+    parser.add_argument('--n-members', type=int, default=200)
+    args = parser.parse_args()
+
+    if args.model_path is not None:
+        with args.model_path.open('rb') as f:
+            rec_pred = pickle.load(f)
+    else:
+        rec_pred = synthetic_model(args.n_items, args.density, seed=0)
+
+    print(json.dumps(run(rec_pred, n_members=args.n_members), indent=4))
@@ -0,0 +1,100 @@
+"""
+@name: synthetic_interactions.py
+@overview: Seeded customer interaction dumps in the CSV schema of CustomerInteractionDataStore, written in chunks
+           so that dumps of the production size (80M+ records) fit in memory
+
+    python -m app.benchmarks.synthetic_interactions interactions.csv --n-records 80000000 --n-members 2000000
+"""
+import argparse
+import csv
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# columns of the Athena query, in order
+COLUMNS = ['customer_id', 'product_id', 'date', 'brand_id', 'gender', 'views', 'purchased', 'add_to_cart',
+           'add_to_wishlist', 'time_on_page']
+
+
+def _zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _unique_ids(rng: np.random.RandomState, n: int, high: int) -> np.ndarray:
+    """n distinct ids below high, without the permutation of range(high) of rng.choice"""
+    ids = np.unique(rng.randint(1, high, size=n + n // 10 + 10))
+    while len(ids) < n:
+        ids = np.unique(np.concatenate([ids, rng.randint(1, high, size=n)]))
+
+    return rng.permutation(ids)[:n]
+
+
+def write_interactions(path: str, n_records: int, n_members: int = 200000, n_products: int = 100000,
+                       n_brands: int = 2000, n_weeks: int = 26, end_date: date = None, chunk_size: int = 1000000,
+                       seed: int = 0) -> int:
+    """
+    Members and brands are zipf distributed, products belong to one brand and gender (2 for the ungendered ones),
+    dates spread over the n_weeks weeks before end_date with more recent activity.
+
+    :param end_date: last date of the dump, today when None
+    :param chunk_size: records generated and written at once
+    :return: number of records written
+    """
+    rng = np.random.RandomState(seed)
+    end_date = date.today() if end_date is None else end_date
+    n_days = n_weeks * 7
+
+    member_ids = _unique_ids(rng, n_members, 10 ** 8)
+    member_weights = _zipf_weights(n_members, 0.8)
+
+    # products of popular brands are browsed more
+    product_brands = rng.choice(n_brands, size=n_products, p=_zipf_weights(n_brands, 0.9))
+    product_genders = rng.choice(3, size=n_products, p=[0.45, 0.45, 0.10])
+    product_ids = _unique_ids(rng, n_products, 10 ** 7)
+    product_weights = np.bincount(product_brands, minlength=n_brands)[product_brands] ** -1. \
+        * _zipf_weights(n_brands, 0.9)[product_brands]
+    product_weights /= product_weights.sum()
+
+    day_weights = np.exp(-np.arange(n_days) / n_days)
+    day_weights /= day_weights.sum()
+    dates = np.array([(end_date - timedelta(days=int(day))).strftime('%Y-%m-%d') for day in range(n_days)])
+
+    with open(path, 'w', newline='') as file_out:
+        for start in range(0, n_records, chunk_size):
+            size = min(chunk_size, n_records - start)
+            products = rng.choice(n_products, size=size, p=product_weights)
+            views = rng.geometric(0.5, size=size)
+            purchased = (rng.rand(size) < 0.01).astype(int)
+
+            chunk = pd.DataFrame({'customer_id': member_ids[rng.choice(n_members, size=size, p=member_weights)],
+                                  'product_id': product_ids[products],
+                                  'date': dates[rng.choice(n_days, size=size, p=day_weights)],
+                                  'brand_id': product_brands[products],
+                                  'gender': product_genders[products],
+                                  'views': views,
+                                  'purchased': purchased,
+                                  'add_to_cart': ((rng.rand(size) < 0.04) | (purchased == 1)).astype(int),
+                                  'add_to_wishlist': (rng.rand(size) < 0.03).astype(int),
+                                  'time_on_page': np.round(rng.lognormal(3.5, 1., size=size) * views).astype(int)},
+                                 columns=COLUMNS)
+
+            chunk.to_csv(file_out, header=start == 0, index=False, quoting=csv.QUOTE_ALL)
+
+    return n_records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--n-records', type=int, default=1000000)
+    parser.add_argument('--n-members', type=int, default=200000)
+    parser.add_argument('--n-products', type=int, default=100000)
+    parser.add_argument('--n-brands', type=int, default=2000)
+    parser.add_argument('--n-weeks', type=int, default=26)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_interactions(args.path, args.n_records, n_members=args.n_members, n_products=args.n_products,
+                       n_brands=args.n_brands, n_weeks=args.n_weeks, seed=args.seed)
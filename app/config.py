@@ -33,6 +33,23 @@ class Config(ABC):
     # Logging
     LOGGING_LEVEL = int(os.getenv('LOGGING_LEVEL', logging.DEBUG))
 
+    # ddtrace spans of the predict stages, their histograms are kept either way
+    STAGE_TIMER_TRACE = os.getenv('STAGE_TIMER_TRACE', 'True') == 'True'
+
+    # Warm-up of a new worker, /readiness answers 503 until it is done
+    WARM_UP_PARAM = dict(
+        enabled=os.getenv('WARM_UP', 'True') == 'True',
+        # Redis connections opened up front
+        n_connections=4,
+        # requests to /predict per round, synthetic member histories of history_length brand-genders when Redis is empty
+        batch_size=10,
+        history_length=8,
+        # rounds until the median latency of a round is within tolerance of the previous one
+        min_rounds=3,
+        max_rounds=20,
+        tolerance=0.1,
+    )
+
     # Pubsub config
     PUBSUB_HOST = os.getenv('PUBSUB_HOST')
     PUBSUB_PORT = os.getenv('PUBSUB_PORT')
@@ -44,6 +61,24 @@ class Config(ABC):
     # Serialized model location
     MODEL_BASE_DIR = '/opt/ml/model'
     MODEL_BASE_DIR_S3 = 'ds-models'
+    # S3 saver: gzip tar streamed into a multipart upload
+    MODEL_UPLOAD_PARAM = dict(
+        part_size=16 * 1024 * 1024,
+        max_workers=4,
+        compresslevel=1,
+    )
+    # trainings kept by the savers besides the active one
+    MODEL_RETENTION_COUNT = int(os.getenv('MODEL_RETENTION_COUNT', 5))
+    # Filesystem or S3
+    MODEL_LOADER_DRIVER = os.getenv('MODEL_LOADER_DRIVER', 'Filesystem')
+    # S3 loader: extracted artifacts keyed by the sha256 of their tar
+    MODEL_CACHE_DIR = os.getenv('MODEL_CACHE_DIR', '/opt/ml/cache')
+    MODEL_DOWNLOAD_PARAM = dict(
+        part_size=8 * 1024 * 1024,
+        max_workers=8,
+        # read metadata.json on every start, False loads the last cached artifact without the network
+        revalidate=os.getenv('MODEL_CACHE_REVALIDATE', 'True') == 'True',
+    )
 
     # Model id
     TRAINING_ID = os.getenv('TRAINING_ID')
@@ -76,6 +111,15 @@ class Config(ABC):
     K_VAL = int(os.environ.get('VALIDATION_K_VAL', 10))
     ALPHA_VAL = float(os.environ.get('ALPHA_VAL', 0.5))
     STRATEGY = str(os.environ.get('STRATEGY', 'random'))
+    # grid of the hybrid sweep, comma separated
+    ALPHA_SWEEP = [float(alpha) for alpha in os.environ.get('VALIDATION_ALPHA_SWEEP', '0,0.25,0.5,0.75,1').split(',')]
+    N_VAL_SWEEP = [int(n_val) for n_val in os.environ.get('VALIDATION_N_VAL_SWEEP', '10,20,50').split(',')]
+    K_VAL_SWEEP = [int(k_val) for k_val in os.environ.get('VALIDATION_K_VAL_SWEEP', '5,10,20').split(',')]
+    SWEEP_N_JOBS = int(os.environ.get('VALIDATION_SWEEP_N_JOBS', 3))
+    # cross-validation over the CYCLE_COUNT folds
+    CV_N_JOBS = int(os.environ.get('VALIDATION_CV_N_JOBS', 3))
+    CV_N_USERS = int(os.environ.get('VALIDATION_CV_N_USERS', 10000))
+    CV_SEED = int(os.environ.get('VALIDATION_CV_SEED', 0))
 
     # DB VALUES
     SSENSE_DB_HOST = os.environ.get('SSENSE_DB_HOST')
@@ -117,6 +161,19 @@ class ConfigDBUpdateApp(Config):
 
 
 class ConfigTraining(Config):
+    # Local cache of intermediate training results, reused between runs, absolute so that it does not depend on the
+    # directory a job runs from
+    TRAINING_CACHE_DIR = os.path.abspath(os.getenv('TRAINING_CACHE_DIR',
+                                                   os.path.join(os.path.expanduser('~'), '.cache', 'ml-brand-gender')))
+    CB_TEXT_CACHE_DIR = os.path.join(TRAINING_CACHE_DIR, 'clean_text')
+    STAGE_CACHE_PARAM = dict(
+        # outputs of training stages keyed by a fingerprint of their data, parameters and code, opt-in with
+        # STAGE_CACHE=True. Deleting the stages directory, or one stage directory in it, invalidates the entries
+        enabled=os.getenv('STAGE_CACHE') == 'True',
+        cache_dir=os.path.join(TRAINING_CACHE_DIR, 'stages'),
+        max_entries_per_stage=3,
+    )
+
     # MODEL TRAINING PARAMETERS
     MERGED_REC_PARAM = dict(
         n_rec=200,
@@ -127,10 +184,33 @@ class ConfigTraining(Config):
         K=250,
         K1=100,
     )
+    # CF is always rebuilt in full, BM25 normalises each member by the average length of all members,
+    # so any change of the hits reweights every member and co-occurrence sums can't be updated exactly
+    CF_BUILD_PARAM = dict(
+        # blocked float32 builder, False falls back to BM25Recommender.fit
+        blocked=True,
+        block_size=1024,
+        n_jobs=3,
+    )
     CB_REC_PARAM = dict(
         max_product_age_weeks=95,
         quantile=0.5,
+        quantile_block_size=512,
+        # keep only the top_k neighbours of each brand-gender instead of the quantile threshold, None disables
+        top_k=None,
+        top_k_block_size=1024,
         min_df=2,
         B=0.75,
         K1=1.2,
+        # hashing vocabulary size for the brand-gender term counts, None builds an exact vocabulary
+        hashing_n_features=None,
+        n_jobs=3,
+    )
+    CB_INCREMENTAL_PARAM = dict(
+        # RecTrain updates the content-based similarity of the active model of the repository instead of a full build
+        enabled=os.getenv('CB_INCREMENTAL') == 'True',
+        # incremental fits in a row before a full build, which also logs the drift
+        full_rebuild_every=7,
+        # above this share of changed brand-genders in a gender, a full build is cheaper
+        max_changed_fraction=0.25,
     )
@@ -5,27 +5,37 @@ from app.db_update_app.services.customer_interaction_service import CustomerInte
 from app.helpers.alert_helper import AlertHelper
 from app.library.predict_data_import.remote_data_store.athena_data_store \
     import CustomerInteractionDataStore, AwsAthenaConfig
+from app.library.predict_data_import.remote_data_store.remote_data_store import RemoteDataStore
 from app.library.scoring.scoring import Scoring
 from app.repositories.redis_repository import RedisRepository
 
 
 class Container:
 
-    def __init__(self, config: ConfigDBUpdateApp = ConfigDBUpdateApp):
+    def __init__(self, config: ConfigDBUpdateApp = ConfigDBUpdateApp, repositories: 'Repositories' = None):
+        """
+        :param repositories: sources of the services, the Athena and Redis ones of config when None
+        """
         self.config = config
 
         AlertHelper(config)
 
-        self.repositories = Repositories(config=self.config)
+        self.repositories = repositories if repositories is not None else Repositories(config=self.config)
         self.services = Services(repositories=self.repositories, config=config)
 
 
 class Repositories:
-    def __init__(self, config: ConfigDBUpdateApp):
+    def __init__(self, config: ConfigDBUpdateApp, remote_customer_interactions_source: RemoteDataStore = None,
+                 local_source: RedisRepository = None):
         app_logger = AppLogger(app_name=config.APP_NAME, env=config.ENV)
 
-        self.remote_customer_interactions_source = CustomerInteractionDataStore(AwsAthenaConfig(config))
-        self.local_source = RedisRepository(config=config, app_logger=app_logger)
+        if remote_customer_interactions_source is None:
+            remote_customer_interactions_source = CustomerInteractionDataStore(AwsAthenaConfig(config))
+        if local_source is None:
+            local_source = RedisRepository(config=config, app_logger=app_logger)
+
+        self.remote_customer_interactions_source = remote_customer_interactions_source
+        self.local_source = local_source
 
 
 class Services:
@@ -8,6 +8,7 @@ from app.repositories.redis_repository import RedisRepository
 from app.db_update_app.services.base_update_service import BaseUpdateService
 from app.library.predict_data_import.remote_data_store.athena_data_store \
     import CustomerInteractionDataStore
+from app.utils.stage_timer import stage_timer
 
 
 class CustomerInteractionService(BaseUpdateService):
@@ -37,14 +38,18 @@ class CustomerInteractionService(BaseUpdateService):
         :return: None
         """
 
-        self._download_customer_interactions_into_csv()
-        customer_interactions = self._load_customer_interactions_from_csv()
+        with stage_timer.stage('db_update.download'):
+            self._download_customer_interactions_into_csv()
+        with stage_timer.stage('db_update.load_csv'):
+            customer_interactions = self._load_customer_interactions_from_csv()
 
         self._verify_min_record_expected(c_interactions=customer_interactions,
                                          n_record_expected=self.min_record_expected)
 
-        scored_interactions = self._score_customer_interactions(customer_interactions)
-        self._insert_into_local_source(scored_interactions)
+        with stage_timer.stage('db_update.score'):
+            scored_interactions = self._score_customer_interactions(customer_interactions)
+        with stage_timer.stage('db_update.redis_insert'):
+            self._insert_into_local_source(scored_interactions)
 
     def _download_customer_interactions_into_csv(self) -> None:
         """
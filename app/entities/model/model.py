@@ -21,6 +21,13 @@ class Model(ABC):
     def predict(self, data) -> Prediction:
         pass
 
+    def artifact(self):
+        """
+        Pickle-free serialization, see app.library.model_repository.artifact
+        :return: manifest fields and {component name: (codec, value)}, None saves the model with pickle
+        """
+        return None
+
     def to_model_info(self) -> ModelInfo:
         return ModelInfo(
             usecase=self.USE_CASE,
@@ -0,0 +1,173 @@
+"""
+@name: artifact.py
+@overview: Pickle-free model artifact: a manifest.json with the model name, version and params, and one
+           array file per component, read lazily on first use.
+
+A model takes part by implementing Model.artifact and a from_artifact class method, and by being listed in
+MODEL_CLASSES under its name.
+"""
+import importlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, load_npz, save_npz
+
+from app.entities.model.model import Model
+from app.errors import ApplicationException
+
+MANIFEST_FILE_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+
+# model name of the manifest -> class building the model, imported only when such a model is loaded
+MODEL_CLASSES = {
+    'CBCF': 'app.models.cbcf.rec_pred.RecPred',
+}
+
+
+def _write_csr(matrix: csr_matrix, f: BinaryIO):
+    save_npz(f, csr_matrix(matrix), compressed=False)
+
+
+def _read_csr(f: BinaryIO) -> csr_matrix:
+    return load_npz(f).tocsr()
+
+
+def _write_item_index(item_dict: dict, f: BinaryIO):
+    """{item code: label} as two aligned arrays"""
+    np.savez(f,
+             codes=np.fromiter(item_dict.keys(), dtype=np.int64, count=len(item_dict)),
+             labels=np.array(list(item_dict.values()), dtype=str))
+
+
+def _read_item_index(f: BinaryIO) -> dict:
+    with np.load(f, allow_pickle=False) as arrays:
+        return dict(zip(arrays['codes'].tolist(), arrays['labels'].tolist()))
+
+
+def _write_frame(frame: pd.DataFrame, f: BinaryIO):
+    """Columns and index as arrays, text as fixed width unicode"""
+    columns = {'index': frame.index.values, **{'column_' + str(name): frame[name].values for name in frame.columns}}
+    np.savez(f, **{key: values.astype(str) if values.dtype == object else values for key, values in columns.items()},
+             _index_name=np.array('' if frame.index.name is None else frame.index.name),
+             _columns=np.array([str(name) for name in frame.columns], dtype=str))
+
+
+def _read_frame(f: BinaryIO) -> pd.DataFrame:
+    with np.load(f, allow_pickle=False) as arrays:
+        index_name = str(arrays['_index_name']) or None
+        return pd.DataFrame({name: arrays['column_' + name] for name in arrays['_columns'].tolist()},
+                            index=pd.Index(arrays['index'], name=index_name))
+
+
+# codec name -> (file extension, writer, reader)
+CODECS = {
+    'csr_matrix': ('.npz', _write_csr, _read_csr),
+    'item_index': ('.npz', _write_item_index, _read_item_index),
+    'frame': ('.npz', _write_frame, _read_frame),
+}
+
+
+class LazyComponent(object):
+    """Model attribute read from its artifact file on first access, a plain attribute once set"""
+
+    _lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        with self._lock:
+            # loaded by a concurrent first access
+            if self.name in instance.__dict__:
+                return instance.__dict__[self.name]
+
+            loaders = instance.__dict__.get('_component_loaders', {})
+            if self.name not in loaders:
+                raise AttributeError(self.name)
+
+            value = instance.__dict__[self.name] = loaders.pop(self.name)()
+
+        return value
+
+
+def load_components(model: Model) -> Model:
+    """Reads every component not yet loaded, before pickling or to pay the loading cost up front"""
+    for name in list(model.__dict__.get('_component_loaders', {})):
+        getattr(model, name)
+
+    return model
+
+
+def artifact_files(model: Model) -> Tuple[Dict, Dict[str, Callable[[BinaryIO], None]]]:
+    """
+    :return: manifest of the model and {file name: writer of the file}, None when the model has no artifact format
+    """
+    artifact = model.artifact()
+    if artifact is None:
+        return None
+
+    fields, components = artifact
+    manifest = dict(fields, format_version=FORMAT_VERSION, components=dict())
+    writers = dict()
+
+    for name, (codec, value) in components.items():
+        extension, writer, _ = CODECS[codec]
+        manifest['components'][name] = {'file': name + extension, 'codec': codec}
+        writers[name + extension] = (lambda write, component: lambda f: write(component, f))(writer, value)
+
+    return manifest, writers
+
+
+def save_artifact(directory: Path, model: Model) -> Dict:
+    """Write the components of the model, then its manifest, into directory"""
+    manifest, writers = artifact_files(model)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for file_name, write in writers.items():
+        with (directory / file_name).open('wb') as f:
+            write(f)
+
+    tmp_path = directory / '{}.{}.tmp'.format(MANIFEST_FILE_NAME, os.getpid())
+    tmp_path.write_text(json.dumps(manifest, indent=4))
+    os.replace(str(tmp_path), str(directory / MANIFEST_FILE_NAME))
+
+    return manifest
+
+
+def is_artifact(directory: Path) -> bool:
+    return (directory / MANIFEST_FILE_NAME).exists()
+
+
+def load_artifact(directory: Path) -> Model:
+    """Model of the manifest in directory, its components are read on first use"""
+    manifest = json.loads((directory / MANIFEST_FILE_NAME).read_text())
+
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ApplicationException("Unsupported artifact format {} in '{}'".format(manifest.get('format_version'),
+                                                                                  directory))
+    if manifest.get('name') not in MODEL_CLASSES:
+        raise ApplicationException("No model class for '{}' in '{}'".format(manifest.get('name'), directory))
+
+    module_name, class_name = MODEL_CLASSES[manifest['name']].rsplit('.', 1)
+    model_class = getattr(importlib.import_module(module_name), class_name)
+
+    def loader(component: Dict) -> Callable[[], object]:
+        path = directory / component['file']
+        read = CODECS[component['codec']][2]
+
+        def load():
+            with path.open('rb') as f:
+                return read(f)
+
+        return load
+
+    return model_class.from_artifact(manifest, {name: loader(component)
+                                                for name, component in manifest['components'].items()})
@@ -0,0 +1,68 @@
+"""
+@name: convert.py
+@overview: Converts pickled models to the pickle-free artifact format, the manifest and arrays are written next to
+           the pickle, which loaders then ignore. The converted model is checked against the pickle before the
+           pickle is removed.
+
+    python -m app.library.model_repository.convert /opt/ml/model/BRAND_GENDER/CBCF/1.0/latest/model.pkl
+    python -m app.library.model_repository.convert model_bg_A.pkl --output-dir model_bg_A --remove-pickle
+"""
+import argparse
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import spmatrix
+
+from app.errors import ApplicationException
+from app.library.model_repository.artifact import artifact_files, load_artifact, save_artifact
+
+
+def _same(value, other) -> bool:
+    if isinstance(value, spmatrix):
+        return value.shape == other.shape and (value != other).nnz == 0
+    if isinstance(value, np.ndarray):
+        return np.array_equal(value, other)
+    if hasattr(value, 'equals'):
+        return value.equals(other)
+
+    return value == other
+
+
+def convert(pickle_path: Path, output_dir: Path = None, remove_pickle: bool = False) -> dict:
+    """
+    :param output_dir: directory of the artifact, defaults to the directory of the pickle
+    :return: manifest of the artifact
+    """
+    output_dir = pickle_path.parent if output_dir is None else output_dir
+
+    with pickle_path.open('rb') as f:
+        model = pickle.load(f)
+
+    if artifact_files(model) is None:
+        raise ApplicationException("{} has no artifact format".format(type(model).__name__))
+
+    manifest = save_artifact(output_dir, model)
+
+    _, components = model.artifact()
+    _, converted_components = load_artifact(output_dir).artifact()
+    for name, (_, value) in components.items():
+        if not _same(value, converted_components[name][1]):
+            raise ApplicationException("Component {} of '{}' differs once converted".format(name, pickle_path))
+
+    if remove_pickle:
+        pickle_path.unlink()
+
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pickle_path', type=Path)
+    parser.add_argument('--output-dir', type=Path, default=None)
+    parser.add_argument('--remove-pickle', action='store_true')
+    args = parser.parse_args()
+
+    print(json.dumps(convert(args.pickle_path, output_dir=args.output_dir, remove_pickle=args.remove_pickle),
+                     indent=4))
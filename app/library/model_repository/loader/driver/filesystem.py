@@ -3,6 +3,7 @@ from pathlib import Path
 from pandas import DataFrame
 from typing import Union
 from app.entities.model.model_info import ModelInfo
+from app.library.model_repository.artifact import is_artifact, load_artifact
 from app.library.model_repository.loader.loader_interface import LoaderInterface
 from app.entities.model.model import Model
 from app.library.model_repository.repository import Repository
@@ -20,14 +21,33 @@ class Filesystem(LoaderInterface):
 
     def load_model(self, model_info: ModelInfo) -> Model:
         """Load the model artifact from local filesystem"""
-        path = self.repo_config.build_path_from_info(model_info, self.repo_config.model_file_name)
-        return self._load_artifact_file(path)
+        path = self.repo_config.build_path_from_info(self.resolve(model_info))
+        return self._load_model_dir(path, self.repo_config.model_file_name)
 
     def load_data(self, model_info: ModelInfo) -> DataFrame:
         """Load the data artifact from local filesystem"""
-        path = self.repo_config.build_path_from_info(model_info, self.repo_config.data_file_name)
+        path = self.repo_config.build_path_from_info(self.resolve(model_info), self.repo_config.data_file_name)
         return self._load_artifact_file(path)
 
+    def resolve(self, model_info: ModelInfo) -> ModelInfo:
+        """Read the active pointer when no training is requested, models saved before the pointer are 'latest'"""
+        if model_info.timestamp is not None:
+            return model_info
+
+        active_path = self.repo_config.build_active_path(model_info)
+        timestamp = active_path.read_text().strip() if active_path.exists() else self.repo_config.legacy_timestamp
+
+        return self.repo_config.with_timestamp(model_info, timestamp)
+
+    @staticmethod
+    def _load_model_dir(path: Path, model_file_name: str) -> Model:
+        """Structured artifact when the directory has a manifest, its components are read on first use,
+        otherwise the pickled model of the trainings saved before"""
+        if is_artifact(path):
+            return load_artifact(path)
+
+        return Filesystem._load_artifact_file(path / model_file_name)
+
     @staticmethod
     def _load_artifact_file(file_location: Path) -> Union[DataFrame, Model]:
         """Load artifact from path.
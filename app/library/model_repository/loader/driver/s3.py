@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, NoReturn, Union
+from boto3_type_annotations.s3 import Client
+from pandas import DataFrame
+from app.entities.model.model import Model
+from app.entities.model.model_info import ModelInfo
+from app.errors import ApplicationException
+from app.library.model_repository.loader.driver.filesystem import Filesystem
+from app.library.model_repository.loader.loader_interface import LoaderInterface
+from app.library.model_repository.repository import Repository
+
+
+class S3(LoaderInterface):
+    """S3 Model and Data loader, artifacts are downloaded once into a local cache keyed by their sha256"""
+
+    _METADATA_FILENAME = "metadata.json"
+    _TAR_FILE_NAME = "model.tar"
+    _REFS_DIR = "refs"
+    _HASH_CHUNK_SIZE = 1024 * 1024
+    repo_config: Repository = None
+    s3_client: None
+    s3_bucket: str = None
+
+    def __init__(self, repo_config: Repository, s3_client: Client, s3_bucket: str, cache_dir: str,
+                 part_size: int = 8 * 1024 * 1024, max_workers: int = 8, revalidate: bool = True):
+        """
+        :param cache_dir: local directory of the extracted artifacts, one sub directory per sha256
+        :param part_size: bytes of each ranged GET of the tar
+        :param max_workers: number of ranged GETs in flight
+        :param revalidate: read metadata.json on every load, otherwise the last artifact cached for the
+                           model is loaded without touching the network
+        """
+        self.repo_config = repo_config
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.cache_dir = Path(cache_dir)
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.revalidate = revalidate
+
+    def resolve(self, model_info: ModelInfo) -> ModelInfo:
+        """Read the active pointer when no training is requested, models saved before the pointer are 'latest'"""
+        if model_info.timestamp is not None:
+            return model_info
+
+        try:
+            response = self.s3_client.get_object(Bucket=self.s3_bucket,
+                                                 Key=str(self.repo_config.build_active_path(model_info)))
+            timestamp = response['Body'].read().decode().strip()
+        except self.s3_client.exceptions.NoSuchKey:
+            timestamp = self.repo_config.legacy_timestamp
+
+        return self.repo_config.with_timestamp(model_info, timestamp)
+
+    def load_model(self, model_info: ModelInfo) -> Model:
+        """Load the model artifact from the local cache, downloading it first if needed"""
+        return Filesystem._load_model_dir(self._fetch(model_info), self.repo_config.model_file_name)
+
+    def load_data(self, model_info: ModelInfo) -> DataFrame:
+        """Load the data artifact from the local cache, downloading it first if needed"""
+        return Filesystem._load_artifact_file(self._fetch(model_info) / self.repo_config.data_file_name)
+
+    def _fetch(self, model_info: ModelInfo) -> Path:
+        """:return: local directory of the extracted artifact of model_info"""
+        # the artifact last loaded for the request, the active training when model_info has no timestamp
+        requested = self.repo_config.build_active_path(model_info) if model_info.timestamp is None \
+            else self.repo_config.build_path_from_info(model_info)
+        ref_path = self.cache_dir / self._REFS_DIR / (str(requested).replace('/', '_') + '.json')
+
+        if not self.revalidate and ref_path.exists():
+            cached = self._cached_path(json.loads(ref_path.read_text())['sha256'])
+            if cached is not None:
+                return cached
+
+        s3_path = str(self.repo_config.build_path_from_info(self.resolve(model_info)))
+        metadata = self._read_metadata(s3_path)
+        sha256 = metadata['sha256']
+
+        path = self._cached_path(sha256)
+        if path is None:
+            path = self._download(s3_path + '/' + metadata.get('tar_file_name', self._TAR_FILE_NAME),
+                                  sha256, metadata.get('size'))
+
+        self._write_atomic(ref_path, json.dumps({'s3_path': s3_path, 'sha256': sha256, 'metadata': metadata}))
+
+        return path
+
+    def _cached_path(self, sha256: str) -> Union[Path, None]:
+        path = self.cache_dir / sha256
+
+        return path if path.is_dir() else None
+
+    def _read_metadata(self, s3_path: str) -> Dict:
+        key = s3_path + '/' + self._METADATA_FILENAME
+        try:
+            metadata = json.loads(self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)['Body'].read())
+        except Exception as e:
+            raise ApplicationException("Can not read '{}' from bucket '{}': {}".format(key, self.s3_bucket, e))
+
+        if 'sha256' not in metadata:
+            raise ApplicationException("'{}' has no sha256, the model was saved without a checksum".format(key))
+
+        return metadata
+
+    def _download(self, key: str, sha256: str, size: int = None) -> Path:
+        """Download the tar with parallel ranged GETs, verify its checksum and extract it into the cache"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if size is None:
+            size = self.s3_client.head_object(Bucket=self.s3_bucket, Key=key)['ContentLength']
+
+        fd, tar_path = tempfile.mkstemp(dir=str(self.cache_dir), prefix='.' + sha256, suffix='.tar')
+        try:
+            os.ftruncate(fd, size)
+            ranges = [(start, min(start + self.part_size, size) - 1) for start in range(0, size, self.part_size)]
+
+            def download_part(byte_range):
+                start, end = byte_range
+                body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key,
+                                                 Range='bytes={}-{}'.format(start, end))['Body'].read()
+                if len(body) != end - start + 1:
+                    raise ApplicationException("Incomplete part {}-{} of '{}'".format(start, end, key))
+                os.pwrite(fd, body, start)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(download_part, ranges))
+
+            os.fsync(fd)
+            os.close(fd)
+            fd = None
+
+            actual_sha256 = self._sha256(tar_path)
+            if actual_sha256 != sha256:
+                raise ApplicationException("Checksum of '{}' is {}, expected {}".format(key, actual_sha256, sha256))
+
+            return self._extract(tar_path, sha256)
+        finally:
+            if fd is not None:
+                os.close(fd)
+            os.remove(tar_path)
+
+    def _extract(self, tar_path: str, sha256: str) -> Path:
+        """Extract next to the cache entry and rename it into place, a partial extraction is never visible"""
+        path = self.cache_dir / sha256
+        tmp_path = tempfile.mkdtemp(dir=str(self.cache_dir), prefix='.' + sha256 + '-')
+        try:
+            with tarfile.open(tar_path, 'r') as tar:
+                for member in tar.getmembers():
+                    if not (member.isfile() or member.isdir()) or os.path.isabs(member.name) \
+                            or '..' in Path(member.name).parts:
+                        raise ApplicationException("Unsafe member '{}' in the model tar".format(member.name))
+                tar.extractall(tmp_path)
+
+            os.rename(tmp_path, str(path))
+        except OSError:
+            # extracted concurrently by another process
+            if not path.is_dir():
+                raise
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+
+        return path
+
+    @staticmethod
+    def _sha256(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(S3._HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def _write_atomic(path: Path, content: str) -> NoReturn:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name('{}.{}.tmp'.format(path.name, os.getpid()))
+        tmp_path.write_text(content)
+        os.replace(str(tmp_path), str(path))
@@ -0,0 +1,31 @@
+from typing import Type
+from app.errors import ApplicationException
+from app.library.model_repository.loader.loader_interface import LoaderInterface
+from app.library.model_repository.loader.driver.filesystem import Filesystem
+from app.library.model_repository.loader.driver.s3 import S3
+from app.library.model_repository.repository import Repository
+from app.config import Config
+import boto3
+
+
+class Factory:
+
+    DRIVER_FILESYSTEM = 'Filesystem'
+    DRIVER_S3 = 'S3'
+
+    @staticmethod
+    def factory(driver: str, config: Type[Config] = Config) -> LoaderInterface:
+        # Build filesystem loader
+        if driver == Factory.DRIVER_FILESYSTEM:
+            return Filesystem(Repository(config.MODEL_BASE_DIR))
+
+        # Build s3 loader
+        if driver == Factory.DRIVER_S3:
+            s3_client = boto3.client('s3',
+                                     region_name=config.AWS_REGION,
+                                     aws_access_key_id=config.AWS_ACCESS_KEY_ID,
+                                     aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY)
+            return S3(Repository(config.MODEL_BASE_DIR_S3), s3_client, config.AWS_S3_BUCKET,
+                      cache_dir=config.MODEL_CACHE_DIR, **config.MODEL_DOWNLOAD_PARAM)
+
+        raise ApplicationException('Can not initialize a loader for driver {}'.format(driver))
@@ -13,3 +13,8 @@ class LoaderInterface(abc.ABC):
     @abc.abstractmethod
     def load_data(self, model_info: ModelInfo) -> DataFrame:
         pass
+
+    @abc.abstractmethod
+    def resolve(self, model_info: ModelInfo) -> ModelInfo:
+        """model_info with the timestamp of the active training when it has none"""
+        pass
@@ -1,10 +1,16 @@
+from typing import List
 from app.entities.model.model import ModelInfo
+from app.errors import ApplicationException
 from pathlib import Path
 
 
 class Repository:
     model_file_name = 'model.pkl'
     data_file_name = 'input_data.pkl'
+    # holds the timestamp of the active training, next to the training directories
+    active_file_name = 'ACTIVE'
+    # directory of the models saved before trainings were versioned, loaded when there is no pointer
+    legacy_timestamp = 'latest'
 
     def __init__(self, base_dir: str):
         """This class define the repository structure for serialized model,
@@ -13,16 +19,43 @@ class Repository:
 
         self.base_dir = base_dir
 
+    def build_versions_path(self, model_info: ModelInfo) -> Path:
+        """Build the path holding every training of a model version and the active pointer"""
+        return Path('/'.join([self.base_dir,
+                              model_info.usecase,
+                              model_info.model,
+                              model_info.version,
+                              ]))
+
+    def build_active_path(self, model_info: ModelInfo) -> Path:
+        return self.build_versions_path(model_info) / self.active_file_name
+
     def build_path_from_info(self, model_info: ModelInfo, file_name=None) -> Path:
         """Build path from ModelInfo.
-        Contain logic to build the file location"""
-        parts = [self.base_dir,
-                 model_info.usecase,
-                 model_info.model,
-                 model_info.version,
-                 'latest',  # todo: replace with non-hardcoded string after we do cleanup logic
-                 ]
+        Contain logic to build the file location, one directory per training timestamp"""
+        if model_info.timestamp is None:
+            raise ApplicationException('Can not build the path of model {} {} without a training timestamp, '
+                                       'resolve the active one first'.format(model_info.model, model_info.version))
+
+        path = self.build_versions_path(model_info) / model_info.timestamp
         if file_name is not None:
-            parts.append(file_name)
+            path = path / file_name
+
+        return path
+
+    @staticmethod
+    def with_timestamp(model_info: ModelInfo, timestamp: str) -> ModelInfo:
+        return ModelInfo(model_info.usecase, model_info.model, model_info.version, timestamp)
+
+    @staticmethod
+    def versions_to_prune(timestamps: List[str], active: str, retention_count: int, pinned: str = None) -> List[str]:
+        """
+        :param timestamps: trainings of a model version, '%Y-%m-%d-%H-%M-%S' sorts them in time
+        :param active: timestamp of the active training, never pruned
+        :param retention_count: number of most recent trainings kept besides the active and pinned ones
+        :param pinned: timestamp of the training servers load through TRAINING_ID, never pruned
+        :return: timestamps to delete
+        """
+        kept = set(sorted(timestamps, reverse=True)[:retention_count]) | {active, pinned}
 
-        return Path('/'.join(parts))
+        return [timestamp for timestamp in sorted(timestamps) if timestamp not in kept]
@@ -1,7 +1,11 @@
 import pickle
 import os
+import shutil
 from pathlib import Path
-from typing import NoReturn, Union
+from typing import List, NoReturn, Union
+from app.entities.model.model_info import ModelInfo
+from app.errors import ApplicationException
+from app.library.model_repository.artifact import is_artifact, save_artifact
 from app.library.model_repository.saver.saver_interface import SaverInterface
 from app.entities.model.model import Model
 from app.library.model_repository.repository import Repository
@@ -12,17 +16,61 @@ class Filesystem(SaverInterface):
 
     repo_config: Repository = None
 
-    def __init__(self, repo_config: Repository):
-        """Initialize the class with basic path and file names"""
+    def __init__(self, repo_config: Repository, retention_count: int = None, pinned: str = None):
+        """
+        Initialize the class with basic path and file names
+        :param retention_count: trainings kept after each save besides the active one, None keeps them all
+        :param pinned: timestamp of the training servers load through TRAINING_ID, never pruned
+        """
         self.repo_config = repo_config
+        self.retention_count = retention_count
+        self.pinned = pinned
 
     def save_model(self, model: Model) -> NoReturn:
-        """Save the model in the local directory"""
+        """Save the model in the local directory of its training, then make it the active one"""
         model_info = model.to_model_info()
         path = self.repo_config.build_path_from_info(model_info)
 
-        # Save model
-        self._save(path, self.repo_config.model_file_name, model)
+        # Save model, as a manifest and arrays when it has an artifact format
+        if model.artifact() is not None:
+            save_artifact(path, model)
+        else:
+            self._save(path, self.repo_config.model_file_name, model)
+
+        self.activate(model_info)
+        if self.retention_count is not None:
+            self.prune(model_info, self.retention_count)
+
+    def list_versions(self, model_info: ModelInfo) -> List[str]:
+        path = self.repo_config.build_versions_path(model_info)
+        if not path.is_dir():
+            return []
+
+        return sorted(entry.name for entry in path.iterdir()
+                      if entry.is_dir() and entry.name != self.repo_config.legacy_timestamp)
+
+    def activate(self, model_info: ModelInfo) -> NoReturn:
+        """Flip the pointer to the training of model_info, a rename so loaders never read a partial pointer"""
+        path = self.repo_config.build_path_from_info(model_info)
+        if not (is_artifact(path) or (path / self.repo_config.model_file_name).exists()):
+            raise ApplicationException('No model saved for training {}'.format(model_info.timestamp))
+
+        active_path = self.repo_config.build_active_path(model_info)
+        tmp_path = active_path.with_name('{}.{}.tmp'.format(active_path.name, os.getpid()))
+        tmp_path.write_text(model_info.timestamp)
+        os.replace(str(tmp_path), str(active_path))
+
+    def prune(self, model_info: ModelInfo, retention_count: int) -> List[str]:
+        active_path = self.repo_config.build_active_path(model_info)
+        active = active_path.read_text().strip() if active_path.exists() else None
+
+        pruned = self.repo_config.versions_to_prune(self.list_versions(model_info), active, retention_count,
+                                                    self.pinned)
+        for timestamp in pruned:
+            shutil.rmtree(str(self.repo_config.build_path_from_info(
+                self.repo_config.with_timestamp(model_info, timestamp))))
+
+        return pruned
 
     @staticmethod
     def _create_local_dir(path: Path) -> NoReturn:
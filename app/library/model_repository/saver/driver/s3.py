@@ -1,32 +1,109 @@
-import tempfile
+import gzip
+import hashlib
 import pickle
 import json
-import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import NoReturn, Dict
+from typing import Callable, NoReturn, Dict, BinaryIO, List
 from app.entities.model.model import Model
+from app.entities.model.model_info import ModelInfo
+from app.errors import ApplicationException
+from app.library.model_repository.artifact import MANIFEST_FILE_NAME, artifact_files
 from app.library.model_repository.repository import Repository
 from app.library.model_repository.saver.saver_interface import SaverInterface
 from git import Repo
-from pandas import DataFrame
 import tarfile
 from boto3_type_annotations.s3 import Client
 
 
+class _MultipartUpload(object):
+    """Write-only stream uploaded to S3 as a multipart upload, part_size bytes per part, parts sent in parallel"""
+
+    def __init__(self, s3_client: Client, s3_bucket: str, key: str, part_size: int, max_workers: int):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # at most two parts per worker are held in memory
+        self.in_flight = threading.BoundedSemaphore(2 * max_workers)
+        self.upload_id = s3_client.create_multipart_upload(Bucket=s3_bucket, Key=key)['UploadId']
+
+    def write(self, data: bytes) -> int:
+        self.buffer.extend(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+        while len(self.buffer) >= self.part_size:
+            self._submit(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+
+        return len(data)
+
+    def _submit(self, body: bytes) -> NoReturn:
+        self.in_flight.acquire()
+        future = self.executor.submit(self._upload_part, len(self.futures) + 1, body)
+        future.add_done_callback(lambda _: self.in_flight.release())
+        self.futures.append(future)
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict:
+        response = self.s3_client.upload_part(Bucket=self.s3_bucket, Key=self.key, PartNumber=part_number,
+                                              UploadId=self.upload_id, Body=body)
+
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def complete(self) -> NoReturn:
+        # the last part may be smaller than part_size, an empty stream still needs one part
+        if self.buffer or not self.futures:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+
+        parts = [future.result() for future in self.futures]
+        self.executor.shutdown()
+        self.s3_client.complete_multipart_upload(Bucket=self.s3_bucket, Key=self.key, UploadId=self.upload_id,
+                                                 MultipartUpload={'Parts': parts})
+
+    def abort(self) -> NoReturn:
+        self.executor.shutdown(wait=True)
+        self.s3_client.abort_multipart_upload(Bucket=self.s3_bucket, Key=self.key, UploadId=self.upload_id)
+
+
 class S3(SaverInterface):
 
     _GIT_REPO_NAME = "ml-brand-gender"
     _METADATA_FILENAME = "metadata.json"
-    _TAR_FILE_NAME = "model.tar"
+    _TAR_FILE_NAME = "model.tar.gz"
+    _HASH_CHUNK_SIZE = 1024 * 1024
     repo_config: Repository = None
     s3_client: None
     s3_bucket: str = None
 
-    def __init__(self, repo_config: Repository, s3_client: Client, s3_bucket: str):
-        """Initialize the class with basic path and file names"""
+    def __init__(self, repo_config: Repository, s3_client: Client, s3_bucket: str,
+                 part_size: int = 16 * 1024 * 1024, max_workers: int = 4, compresslevel: int = 1,
+                 retention_count: int = None, pinned: str = None):
+        """
+        Initialize the class with basic path and file names
+        :param part_size: bytes of each part of the multipart upload, at least 5MB on S3
+        :param max_workers: number of parts uploaded in parallel
+        :param compresslevel: gzip level of the tar
+        :param retention_count: trainings kept after each save besides the active one, None keeps them all
+        :param pinned: timestamp of the training servers load through TRAINING_ID, never pruned
+        """
         self.repo_config = repo_config
         self.s3_client = s3_client
         self.s3_bucket = s3_bucket
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.compresslevel = compresslevel
+        self.retention_count = retention_count
+        self.pinned = pinned
 
     def save_model(self, model: Model) -> NoReturn:
 
@@ -39,6 +116,62 @@ class S3(SaverInterface):
                        model=model
                        )
 
+        self.activate(model_info)
+        if self.retention_count is not None:
+            self.prune(model_info, self.retention_count)
+
+    def _list(self, prefix: str, delimiter: str = None) -> List[Dict]:
+        """:return: pages of list_objects_v2 under prefix"""
+        kwargs = dict(Bucket=self.s3_bucket, Prefix=prefix)
+        if delimiter is not None:
+            kwargs.update(Delimiter=delimiter)
+
+        pages = [self.s3_client.list_objects_v2(**kwargs)]
+        while pages[-1].get('IsTruncated'):
+            pages.append(self.s3_client.list_objects_v2(ContinuationToken=pages[-1]['NextContinuationToken'],
+                                                        **kwargs))
+
+        return pages
+
+    def list_versions(self, model_info: ModelInfo) -> List[str]:
+        prefix = str(self.repo_config.build_versions_path(model_info)) + '/'
+        timestamps = [common_prefix['Prefix'][len(prefix):].rstrip('/')
+                      for page in self._list(prefix, delimiter='/')
+                      for common_prefix in page.get('CommonPrefixes', [])]
+
+        return sorted(timestamp for timestamp in timestamps if timestamp != self.repo_config.legacy_timestamp)
+
+    def activate(self, model_info: ModelInfo) -> NoReturn:
+        """Flip the pointer to the training of model_info, a single put so loaders never read a partial pointer"""
+        if model_info.timestamp not in self.list_versions(model_info):
+            raise ApplicationException('No model saved for training {}'.format(model_info.timestamp))
+
+        self.s3_client.put_object(Bucket=self.s3_bucket,
+                                  Key=str(self.repo_config.build_active_path(model_info)),
+                                  Body=model_info.timestamp.encode())
+
+    def _active(self, model_info: ModelInfo):
+        try:
+            response = self.s3_client.get_object(Bucket=self.s3_bucket,
+                                                 Key=str(self.repo_config.build_active_path(model_info)))
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+
+        return response['Body'].read().decode().strip()
+
+    def prune(self, model_info: ModelInfo, retention_count: int) -> List[str]:
+        pruned = self.repo_config.versions_to_prune(self.list_versions(model_info), self._active(model_info),
+                                                    retention_count, self.pinned)
+
+        for timestamp in pruned:
+            prefix = str(self.repo_config.build_path_from_info(self.repo_config.with_timestamp(model_info, timestamp)))
+            keys = [{'Key': content['Key']} for page in self._list(prefix + '/') for content in page.get('Contents', [])]
+            # delete_objects takes at most 1000 keys
+            for start in range(0, len(keys), 1000):
+                self.s3_client.delete_objects(Bucket=self.s3_bucket, Delete={'Objects': keys[start:start + 1000]})
+
+        return pruned
+
     def _build_metadata(self) -> Dict[str, str]:
         repo = Repo(search_parent_directories=True)
         sha = repo.head.object.hexsha
@@ -48,30 +181,62 @@ class S3(SaverInterface):
             "sha": str(sha)
         }
 
+    def _add_component(self, tar: tarfile.TarFile, name: str, write: Callable[[BinaryIO], None]) -> Dict:
+        """
+        Serialize a component and append it to the tar stream. Components are spooled to a temporary file
+        past part_size bytes, so that memory stays bounded by the part size whatever the size of the model
+        :param write: writes the component to a binary file object
+        :return: sha256 and size of the component
+        """
+        with tempfile.SpooledTemporaryFile(max_size=self.part_size) as spooled:
+            write(spooled)
+            size = spooled.tell()
+
+            digest = hashlib.sha256()
+            spooled.seek(0)
+            for chunk in iter(lambda: spooled.read(self._HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(time.time())
+            spooled.seek(0)
+            tar.addfile(info, spooled)
+
+        return {"sha256": digest.hexdigest(), "size": size}
+
     def _save_tar(self, path: Path, metadata: Dict, model: Model) -> NoReturn:
-        """Save model and metadata to file, compress it into a tar file an upload it to s3"""
-        model_file_name = self.repo_config.model_file_name
+        """Stream the model components, or its pickle when it has no artifact format, and metadata into a gzip
+        tar uploaded to s3 in parts, then upload the metadata with the checksums of the tar and of each component"""
+        s3_file_path = str(Path(str(path) + '/' + self._TAR_FILE_NAME))
+        upload = _MultipartUpload(self.s3_client, self.s3_bucket, s3_file_path,
+                                  part_size=self.part_size, max_workers=self.max_workers)
 
         try:
-            # Create a tmp directory
-            with tempfile.TemporaryDirectory() as tmp_path:
-                os.chdir(tmp_path)
-
-                # Save to file the dat
-                with open(model_file_name, 'wb') as f:
-                    pickle.dump(model, f)
-
-                with open(self._METADATA_FILENAME, 'w') as f:
-                    json.dump(metadata, f)
-
-                # Tar the tmp directory with all the files
-                with tarfile.open(self._TAR_FILE_NAME, "w") as tar:
-                    for file in os.listdir(tmp_path):
-                        tar.add(file)
-
-                # Upload the tar file to S3
-                s3_file_path = str(Path(str(path) + '/' + self._TAR_FILE_NAME))
-                tmp_file_path = tmp_path + '/' + self._TAR_FILE_NAME
-                self.s3_client.upload_file(tmp_file_path, self.s3_bucket, s3_file_path)
-        finally:
-            del tmp_path
+            files = artifact_files(model)
+            if files is not None:
+                manifest, writers = files
+                writers[MANIFEST_FILE_NAME] = lambda f: f.write(json.dumps(manifest, indent=4).encode())
+            else:
+                writers = {self.repo_config.model_file_name:
+                           lambda f: pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)}
+            writers[self._METADATA_FILENAME] = lambda f: f.write(json.dumps(metadata).encode())
+
+            with gzip.GzipFile(fileobj=upload, mode='wb', compresslevel=self.compresslevel) as compressed, \
+                    tarfile.open(fileobj=compressed, mode='w|') as tar:
+                components = {file_name: self._add_component(tar, file_name, write)
+                              for file_name, write in writers.items()}
+            upload.complete()
+        except BaseException:
+            upload.abort()
+            raise
+
+        # Upload the metadata with the checksum of the tar last, loaders read it first
+        s3_metadata_path = str(Path(str(path) + '/' + self._METADATA_FILENAME))
+        self.s3_client.put_object(Bucket=self.s3_bucket,
+                                  Key=s3_metadata_path,
+                                  Body=json.dumps(dict(metadata,
+                                                       tar_file_name=self._TAR_FILE_NAME,
+                                                       sha256=upload.digest.hexdigest(),
+                                                       size=upload.size,
+                                                       components=components)).encode())
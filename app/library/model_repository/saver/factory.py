@@ -16,7 +16,8 @@ class Factory:
     def factory(driver: str) -> SaverInterface:
         # Build filesystem saver
         if driver == Factory.DRIVER_FILESYSTEM:
-            return Filesystem(Repository(Config.MODEL_BASE_DIR))
+            return Filesystem(Repository(Config.MODEL_BASE_DIR), retention_count=Config.MODEL_RETENTION_COUNT,
+                              pinned=Config.TRAINING_ID)
 
         # Build s3 saver
         if driver == Factory.DRIVER_S3:
@@ -24,6 +25,8 @@ class Factory:
                                      region_name=Config.AWS_REGION,
                                      aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
                                      aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY)
-            return S3(Repository(Config.MODEL_BASE_DIR_S3), s3_client, Config.AWS_S3_BUCKET)
+            return S3(Repository(Config.MODEL_BASE_DIR_S3), s3_client, Config.AWS_S3_BUCKET,
+                      retention_count=Config.MODEL_RETENTION_COUNT, pinned=Config.TRAINING_ID,
+                      **Config.MODEL_UPLOAD_PARAM)
 
         raise ApplicationException('Can not initialize a saver for driver {}'.format(driver))
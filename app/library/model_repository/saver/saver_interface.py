@@ -1,8 +1,9 @@
 import abc
 from datetime import datetime
 from app.entities.model.model import Model
+from app.entities.model.model_info import ModelInfo
 from pandas import DataFrame
-from typing import NoReturn
+from typing import List, NoReturn
 
 
 class SaverInterface(abc.ABC):
@@ -10,3 +11,21 @@ class SaverInterface(abc.ABC):
     @abc.abstractmethod
     def save_model(self, model: Model) -> NoReturn:
         pass
+
+    @abc.abstractmethod
+    def list_versions(self, model_info: ModelInfo) -> List[str]:
+        """Timestamps of the saved trainings of the model version, oldest first"""
+        pass
+
+    @abc.abstractmethod
+    def activate(self, model_info: ModelInfo) -> NoReturn:
+        """Point the model version to the training of model_info.timestamp"""
+        pass
+
+    @abc.abstractmethod
+    def prune(self, model_info: ModelInfo, retention_count: int) -> List[str]:
+        """
+        Delete all but the retention_count most recent trainings, the active one and the one pinned by TRAINING_ID,
+        return the deleted ones
+        """
+        pass
@@ -0,0 +1,39 @@
+"""
+@name: versions.py
+@overview: Lists, activates and prunes the saved trainings of the configured model version.
+           Activating an older training rolls back on the next start of the server.
+
+    python -m app.library.model_repository.versions --driver S3 list
+    python -m app.library.model_repository.versions --driver S3 activate 2020-01-31-10-00-00
+    python -m app.library.model_repository.versions --driver S3 prune --retention-count 5
+"""
+import argparse
+import json
+
+from app.config import Config
+from app.entities.model.model_info import ModelInfo
+from app.library.model_repository.saver.factory import Factory
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--driver', default=Config.MODEL_LOADER_DRIVER, choices=[Factory.DRIVER_FILESYSTEM,
+                                                                               Factory.DRIVER_S3])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    commands.add_parser('list')
+    activate_parser = commands.add_parser('activate')
+    activate_parser.add_argument('timestamp')
+    prune_parser = commands.add_parser('prune')
+    prune_parser.add_argument('--retention-count', type=int, default=Config.MODEL_RETENTION_COUNT)
+    args = parser.parse_args()
+
+    saver = Factory.factory(args.driver)
+    model_info = ModelInfo(Config.USE_CASE_ID, Config.MODEL_ID, Config.MODEL_VERSION_ID, None)
+
+    if args.command == 'list':
+        print(json.dumps(saver.list_versions(model_info)))
+    elif args.command == 'activate':
+        saver.activate(ModelInfo(Config.USE_CASE_ID, Config.MODEL_ID, Config.MODEL_VERSION_ID, args.timestamp))
+    elif args.command == 'prune':
+        print(json.dumps(saver.prune(model_info, args.retention_count)))
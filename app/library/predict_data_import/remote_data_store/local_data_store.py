@@ -0,0 +1,47 @@
+import csv
+import shutil
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app.library.predict_data_import.remote_data_store.remote_data_store \
+    import RemoteDataStore
+
+
+class LocalCsvDataStore(RemoteDataStore):
+    """
+    Remote data store over a local dump in the CSV schema of the Athena query results,
+    to run the imports without AWS (e.g. on the dumps of app.benchmarks.synthetic_interactions)
+    """
+
+    _CHUNK_SIZE = 1_000_000
+
+    def __init__(self, source_path: str, reference_date: date = None):
+        """
+        :param source_path: CSV dump, header and quoted values as written by Athena
+        :param reference_date: keep the rows of the number_of_week weeks before this date as the Athena query does,
+                               None copies the dump as is
+        """
+        self.source_path = source_path
+        self.reference_date = reference_date
+
+    def download_to_csv(self, local_file_path: str, number_of_week: int = None) -> None:
+        """
+        Copy the dump into a local CSV file
+
+        @:param local_file_path: str; file path to save data
+        @:param: number_of_week: int; number of week to import, when the store has a reference date
+        @:return: None
+        """
+        if self.reference_date is None or number_of_week is None:
+            shutil.copyfile(self.source_path, local_file_path)
+            return
+
+        start_date = (self.reference_date - timedelta(weeks=int(number_of_week))).strftime('%Y-%m-%d')
+
+        with open(local_file_path, 'w', newline='') as file_out:
+            for i, chunk in enumerate(pd.read_csv(self.source_path, dtype=str, keep_default_na=False,
+                                                  chunksize=self._CHUNK_SIZE)):
+                # ISO dates compare as strings
+                chunk[chunk['date'] >= start_date].to_csv(file_out, header=i == 0, index=False,
+                                                         quoting=csv.QUOTE_ALL)
@@ -4,6 +4,7 @@ from pandas import DataFrame
 from ssense_logger.app_logger import AppLogger
 
 from app.config import Config
+from app.utils.stage_timer import stage_timer
 
 app_logger = AppLogger(app_name=Config.APP_NAME, env=Config.ENV)
 
@@ -47,9 +48,12 @@ class Scoring:
         if interactions.size < 1:
             raise Exception('Can not score empty user interactions.')
 
-        interactions = self._weight_interactions(interactions)
-        interactions = self._apply_decay(interactions)
-        interactions = self._aggregate_interactions(interactions)
+        with stage_timer.stage('scoring.weight'):
+            interactions = self._weight_interactions(interactions)
+        with stage_timer.stage('scoring.decay'):
+            interactions = self._apply_decay(interactions)
+        with stage_timer.stage('scoring.aggregate'):
+            interactions = self._aggregate_interactions(interactions)
         return interactions
 
     def _weight_interactions(self, interactions: DataFrame) -> DataFrame:
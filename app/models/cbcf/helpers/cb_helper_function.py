@@ -6,14 +6,18 @@ Created on March 11, 2019
 """
 
 import datetime
+import hashlib
+import numbers
 from datetime import datetime
 import numpy as np
 import pandas as pd
 import re
+from typing import Tuple
+from scipy.sparse import csr_matrix, diags, issparse
 
 from sklearn.preprocessing import normalize
 
-from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
 from implicit import nearest_neighbours
 
 from gensim.parsing.preprocessing import \
@@ -21,63 +25,309 @@ from gensim.parsing.preprocessing import \
     strip_punctuation, strip_multiple_whitespaces
 
 from app.config import ConfigTraining
+from app.models.cbcf.helpers.text_cache import TextCache
 
 
-def _matrix_quantile_zeroes(weights_inner: pd.DataFrame,
-                            quantile: float) -> pd.DataFrame:
+def _blocked_quantile_zeroes(weights_inner: csr_matrix,
+                             quantile: float,
+                             block_size: int) -> Tuple[csr_matrix, np.ndarray]:
+    """
+    Zero the entries of each column that fall below the column quantile.
+
+    Columns are processed in blocks of block_size: each block is densified on its own,
+    its quantile cutoffs computed and the surviving entries written straight to the
+    sparse output, so peak memory is bounded by n x block_size rather than n x n.
+
+    :param weights_inner: square similarity matrix
+    :param quantile: column quantile below which entries are set to zero
+    :param block_size: number of columns densified at a time
+    :return: csr_matrix with the thresholded similarity and the cutoff of each column
+    """
 
     assert (quantile >= 0) & (quantile <= 1), 'Quantile outside range 0 <= x <= 1'
 
-    dimension = weights_inner.shape[0]
+    weights_inner = weights_inner.tocsc()
+    dimension, n_cols = weights_inner.shape
 
-    # get vector of quantiles
-    quantile_vect = np.quantile(weights_inner, quantile, axis=0)
+    rows, cols, data, cutoffs = [], [], [], []
 
-    # repeat vector, matching dimension of imput similaity matrix
-    quantile_mat = np.repeat(quantile_vect, dimension, axis=0).reshape(dimension, dimension)
+    for start in range(0, n_cols, block_size):
+        block = weights_inner[:, start:start + block_size].toarray()
 
-    # note that similarity quantiles are set to columns-wise
-    # (ie each column (not row) contains the top K most similar results
-    tf = weights_inner < quantile_mat.T
+        # note that similarity quantiles are set to columns-wise
+        # (ie each column (not row) contains the top K most similar results
+        quantile_vect = np.quantile(block, quantile, axis=0)
 
-    # set values below threshold to zero
-    weights_inner[tf] = 0
+        block_rows, block_cols = np.nonzero((block >= quantile_vect) & (block != 0))
 
-    return weights_inner
+        rows.append(block_rows)
+        cols.append(block_cols + start)
+        data.append(block[block_rows, block_cols])
+        cutoffs.append(quantile_vect)
 
+    weights_thresholded = csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                                     shape=(dimension, n_cols))
 
-def get_text_distance(corpus_in: list,
-                      stock_in: list,
-                      docids_in: list) -> pd.DataFrame:
+    return weights_thresholded, np.concatenate(cutoffs)
+
+
+def _matrix_quantile_zeroes(weights_inner: csr_matrix,
+                            quantile: float,
+                            block_size: int) -> csr_matrix:
     """
-    :param corpus_in:
-    :param stock_in:
-    :param docids_in:
-    :return weights_inner_pd: pandas dataframe and top 5 similar brand csv file
+    :param weights_inner: square similarity matrix
+    :param quantile: column quantile below which entries are set to zero
+    :param block_size: number of columns densified at a time
+    :return: csr_matrix with the thresholded similarity
+    """
+
+    return _blocked_quantile_zeroes(weights_inner, quantile=quantile, block_size=block_size)[0]
+
+
+def _term_counts(corpus_in) -> csr_matrix:
+    """
+    :param corpus_in: list of documents, or sparse document x term counts
+    :return: csr_matrix of term counts, restricted to terms found in at least min_df documents, a float min_df
+             being a share of the documents as for CountVectorizer
+    """
+
+    min_df = ConfigTraining.CB_REC_PARAM['min_df']
+
+    if not issparse(corpus_in):
+        vectorize = CountVectorizer(min_df=min_df)
+        return vectorize.fit_transform(corpus_in)  # X is a sparse matrix
+
+    X = csr_matrix(corpus_in)
+    document_frequency = np.bincount(X.indices, minlength=X.shape[1])
+    min_document_count = min_df if isinstance(min_df, numbers.Integral) else min_df * X.shape[0]
+
+    return X[:, np.flatnonzero(document_frequency >= min_document_count)]
+
+
+def _normalized_bm25_weights(corpus_in) -> csr_matrix:
+    """
+    :param corpus_in: list of documents, or sparse document x term counts
+    :return: csr_matrix of l2 normalized BM25 document vectors
+    """
+
+    X = _term_counts(corpus_in)
+    weights = nearest_neighbours.bm25_weight(X=X, K1=ConfigTraining.CB_REC_PARAM['K1'], B=ConfigTraining.CB_REC_PARAM['B']).tocsr()
+
+    return normalize(weights, axis=1, norm='l2')
+
+
+def _stock_relevance(weights_inner: csr_matrix,
+                     stock_in: list) -> csr_matrix:
+    """
+    Scale each column by the in-stock flag of its document and blend with the stock diagonal.
+
+    :param weights_inner: csr_matrix of cosine similarities, modified in place
+    :param stock_in: stock level of each document
+    :return weights_relevance_score: csr_matrix of relevance scores, rounded to 5 decimals
+    """
+
+    stock_level = (np.asarray(stock_in) > 0).astype(np.float64)
+
+    # scale each column by its stock flag, equivalent to weights_inner @ diag(stock_level)
+    weights_inner.data *= stock_level[weights_inner.indices]
+
+    balance = 3
+    weights_relevance_score = csr_matrix(weights_inner / balance + diags(stock_level * (1 - 1 / balance)))
+
+    weights_relevance_score.data = np.round(weights_relevance_score.data, decimals=5)
+    weights_relevance_score.eliminate_zeros()
+
+    return weights_relevance_score
+
+
+def get_text_relevance(corpus_in,
+                       stock_in: list) -> csr_matrix:
     """
+    Sparse BM25 cosine similarity between documents, blended with stock level.
 
-    vectorize = CountVectorizer(min_df=ConfigTraining.CB_REC_PARAM['min_df'])
-    X = vectorize.fit_transform(corpus_in)  # X is a sparse matrix
-    weights = nearest_neighbours.bm25_weight(X=X, K1=ConfigTraining.CB_REC_PARAM['K1'], B=ConfigTraining.CB_REC_PARAM['B']).toarray()
+    The BM25 weights are kept sparse end to end and each column is scaled by the
+    in-stock flag of its document directly on the csr data, so no dense n x n
+    intermediate is allocated.
+
+    :param corpus_in: list of documents, or sparse document x term counts
+    :param stock_in: stock level of each document
+    :return weights_relevance_score: csr_matrix of relevance scores, rounded to 5 decimals
+    """
 
     # normalize, make symmetric matrix inner product
-    weights_norm = normalize(weights, axis=1, norm='l2')
-    weights_inner = weights_norm @ weights_norm.T
+    weights_norm = _normalized_bm25_weights(corpus_in)
+    weights_inner = csr_matrix(weights_norm @ weights_norm.T)
 
     # ----------- modify results using stock level -------------- #
-    stock_level = np.array(stock_in)
-    stock_level[stock_level > 0] = 1
-    stock_level[stock_level <= 0] = 0
+    return _stock_relevance(weights_inner, stock_in)
+
+
+def get_text_similarity_top_k(corpus_in,
+                              stock_in: list,
+                              top_k: int,
+                              block_size: int) -> csr_matrix:
+    """
+    Relevance scores restricted to the top_k most similar documents of each column.
+
+    The cosine similarity is symmetric and the stock flag scales whole columns, so the
+    top_k entries of a column are the top_k neighbours of its document. Neighbours are
+    selected block by block of block_size documents, the full n x n product is never built.
+
+    :param corpus_in: list of documents, or sparse document x term counts
+    :param stock_in: stock level of each document
+    :param top_k: number of neighbours kept per column
+    :param block_size: number of documents whose similarities are densified at a time
+    :return: csr_matrix of relevance scores with at most top_k entries per column
+    """
+
+    weights_norm = _normalized_bm25_weights(corpus_in)
+    weights_norm_t = weights_norm.T.tocsr()
+
+    dimension = weights_norm.shape[0]
+    top_k = min(top_k, dimension)
+
+    rows, cols, data = [], [], []
+
+    for start in range(0, dimension, block_size):
+        block = (weights_norm[start:start + block_size] @ weights_norm_t).toarray()
+
+        neighbours = np.argpartition(-block, top_k - 1, axis=1)[:, :top_k]
+
+        rows.append(neighbours.ravel())
+        cols.append(np.repeat(np.arange(start, start + block.shape[0]), top_k))
+        data.append(np.take_along_axis(block, neighbours, axis=1).ravel())
+
+    weights_inner = csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                               shape=(dimension, dimension))
+
+    return _stock_relevance(weights_inner, stock_in)
+
+
+def get_text_similarity(corpus_in,
+                        stock_in: list) -> csr_matrix:
+    """
+    Uses the top K neighbours builder when CB_REC_PARAM['top_k'] is set,
+    the column quantile threshold otherwise.
+
+    :param corpus_in: list of documents, or sparse document x term counts
+    :param stock_in: stock level of each document
+    :return: csr_matrix of thresholded relevance scores
+    """
 
-    stock_diagonal = np.diag(stock_level)
+    if ConfigTraining.CB_REC_PARAM['top_k'] is not None:
+        return get_text_similarity_top_k(corpus_in=corpus_in,
+                                         stock_in=stock_in,
+                                         top_k=ConfigTraining.CB_REC_PARAM['top_k'],
+                                         block_size=ConfigTraining.CB_REC_PARAM['top_k_block_size'])
 
-    weights_relevance_score = weights_inner @ stock_diagonal
-    # weights_relevance_score = np.multiply(weights_inner, stock_level)
+    weights_relevance_score = get_text_relevance(corpus_in=corpus_in, stock_in=stock_in)
+
+    return _matrix_quantile_zeroes(weights_relevance_score,
+                                   quantile=ConfigTraining.CB_REC_PARAM['quantile'],
+                                   block_size=ConfigTraining.CB_REC_PARAM['quantile_block_size'])
+
+
+def get_text_similarity_cutoffs(corpus_in,
+                                stock_in) -> Tuple[csr_matrix, np.ndarray]:
+    """
+    Full quantile thresholded similarity, with the column cutoffs needed by later incremental updates.
+
+    :param corpus_in: list of documents, or sparse document x term counts
+    :param stock_in: stock level of each document
+    :return: csr_matrix of thresholded relevance scores and the quantile cutoff of each column
+    """
+
+    weights_relevance_score = get_text_relevance(corpus_in=corpus_in, stock_in=stock_in)
+
+    return _blocked_quantile_zeroes(weights_relevance_score,
+                                    quantile=ConfigTraining.CB_REC_PARAM['quantile'],
+                                    block_size=ConfigTraining.CB_REC_PARAM['quantile_block_size'])
+
+
+def get_text_similarity_incremental(corpus_in,
+                                    stock_in,
+                                    changed: np.ndarray,
+                                    unchanged_sim: csr_matrix,
+                                    cutoffs: np.ndarray) -> Tuple[csr_matrix, np.ndarray]:
+    """
+    Update a quantile thresholded similarity for the documents whose text or stock changed.
+
+    - entries between unchanged documents are taken from the previous fit
+    - columns of changed documents are recomputed and thresholded on their new quantile
+    - rows of changed documents in unchanged columns are thresholded on the previous cutoffs
+
+    BM25 weights are recomputed on the whole corpus, entries kept from the previous fit do
+    not follow the drift of the corpus statistics until the next full build.
+
+    :param corpus_in: list of documents, or sparse document x term counts
+    :param stock_in: stock level of each document
+    :param changed: boolean mask of the documents to update, new documents included
+    :param unchanged_sim: previous thresholded similarity between unchanged documents, in mask order
+    :param cutoffs: previous column cutoffs, only read for unchanged documents
+    :return: csr_matrix of thresholded relevance scores and the quantile cutoff of each column
+    """
+
+    quantile = ConfigTraining.CB_REC_PARAM['quantile']
+    block_size = ConfigTraining.CB_REC_PARAM['quantile_block_size']
+
+    weights_norm = _normalized_bm25_weights(corpus_in)
+    stock_level = (np.asarray(stock_in) > 0).astype(np.float64)
+
+    dimension = weights_norm.shape[0]
+    changed_rows = np.flatnonzero(changed)
+    unchanged_rows = np.flatnonzero(~changed)
+    cutoffs = np.array(cutoffs, dtype=np.float64)
 
     balance = 3
-    weights_relevance_score = weights_relevance_score / balance + stock_diagonal * (1 - 1 / balance)
 
-    weights_relevance_score = weights_relevance_score.round(decimals=5)
+    # entries between unchanged documents are kept
+    unchanged_sim = unchanged_sim.tocoo()
+    rows, cols, data = [unchanged_rows[unchanged_sim.row]], [unchanged_rows[unchanged_sim.col]], [unchanged_sim.data]
+
+    # changed columns: same computation as the full build, on the changed columns only
+    for start in range(0, len(changed_rows), block_size):
+        block_cols = changed_rows[start:start + block_size]
+
+        block = (weights_norm @ weights_norm[block_cols].T).toarray() * stock_level[block_cols] / balance
+        block[block_cols, np.arange(len(block_cols))] += stock_level[block_cols] * (1 - 1 / balance)
+        block = np.round(block, decimals=5)
+
+        cutoffs[block_cols] = np.quantile(block, quantile, axis=0)
+
+        block_rows, block_cols_idx = np.nonzero((block >= cutoffs[block_cols]) & (block != 0))
+        rows.append(block_rows)
+        cols.append(block_cols[block_cols_idx])
+        data.append(block[block_rows, block_cols_idx])
+
+    # changed rows of unchanged columns: thresholded on the previous column cutoffs
+    for start in range(0, len(unchanged_rows) if len(changed_rows) else 0, block_size):
+        block_cols = unchanged_rows[start:start + block_size]
+
+        block = (weights_norm[changed_rows] @ weights_norm[block_cols].T).toarray() * stock_level[block_cols] / balance
+        block = np.round(block, decimals=5)
+
+        block_rows, block_cols_idx = np.nonzero((block >= cutoffs[block_cols]) & (block != 0))
+        rows.append(changed_rows[block_rows])
+        cols.append(block_cols[block_cols_idx])
+        data.append(block[block_rows, block_cols_idx])
+
+    weights_thresholded = csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                                     shape=(dimension, dimension))
+
+    return weights_thresholded, cutoffs
+
+
+def get_text_distance(corpus_in: list,
+                      stock_in: list,
+                      docids_in: list) -> pd.DataFrame:
+    """
+    :param corpus_in:
+    :param stock_in:
+    :param docids_in:
+    :return weights_inner_pd: pandas dataframe and top 5 similar brand csv file
+    """
+
+    weights_similarity = get_text_similarity(corpus_in=corpus_in, stock_in=stock_in)
 
     # ---------- return pandas dataframe -------- #
 
@@ -86,12 +336,10 @@ def get_text_distance(corpus_in: list,
     COLS = pd.Index(docids_in, name="cols")
 
     # reindex contains the missing columns
-    weights_inner_pd = pd.DataFrame(weights_relevance_score,
+    weights_inner_pd = pd.DataFrame(weights_similarity.toarray(),
                                     index=ROWS,
                                     columns=COLS)
 
-    weights_inner_pd = _matrix_quantile_zeroes(weights_inner_pd, quantile=ConfigTraining.CB_REC_PARAM['quantile'])
-
     return weights_inner_pd
 
 
@@ -114,18 +362,46 @@ def clean_text(x: str) -> str:
     return x
 
 
-def merge_description(df, col_list_in):
-    return df[col_list_in].apply(lambda y: clean_text(' '.join(y)), axis=1)
+def _text_cache() -> TextCache:
+    return TextCache(func=clean_text,
+                     cache_dir=ConfigTraining.CB_TEXT_CACHE_DIR,
+                     n_jobs=ConfigTraining.CB_REC_PARAM['n_jobs'])
 
 
-def cb_manipulate_text(raw_text_in: pd.DataFrame,
-                       start_date: str,
-                       end_date: str):
+def merge_description(df, col_list_in, text_cache: TextCache = None):
+    """
+    :param text_cache: cache shared by the calls of one run, a new one is loaded when None
+    """
+    raw_text = df[col_list_in[0]]
+    for col in col_list_in[1:]:
+        raw_text = raw_text + ' ' + df[col]
+
+    text_cache = text_cache if text_cache is not None else _text_cache()
+
+    return text_cache.transform(raw_text)
+
+
+# frequency of repeated products
+COL_LIST_REP = {'name': 1,
+                'firstW': 1,  # color
+                'fitSize': 2,  # 2
+                'description': 1,
+                'composition': 1,
+                'priceCDtxt': 2,
+                'subcategory': 1}
+
+# choose which columns to join together
+COL_LIST = ['description', 'composition', 'category', 'name']
+
+
+def _cb_products(raw_text_in: pd.DataFrame,
+                 start_date: str,
+                 end_date: str) -> pd.DataFrame:
     """
     :param raw_text_in: unprocessed product dataframe
     :param start_date: str
     :param end_date: str
-    :return:
+    :return: products of the time span, with brand-gender and derived text columns
     """
 
     date_min = datetime.strptime(start_date, "%Y-%m-%d")
@@ -152,31 +428,32 @@ def cb_manipulate_text(raw_text_in: pd.DataFrame,
     raw_text_in_list = raw_text_in.description.str.split(' ')
     raw_text_in['fitSize'] = raw_text_in_list.str[0] + ' ' + raw_text_in_list.str[1]
 
-    # frequency of repeated products
-    col_list_rep = {'name': 1,
-                    'firstW': 1,  # color
-                    'fitSize': 2,  # 2
-                    'description': 1,
-                    'composition': 1,
-                    'priceCDtxt': 2,
-                    'subcategory': 1}
-
     # duplicate words n times from dictionary
-    for key, value in col_list_rep.items():
+    for key, value in COL_LIST_REP.items():
         if value > 1:
             raw_text_in[key] = (raw_text_in[key] + " ") * value
 
-    # choose which columns to join together
-    col_list = ['description', 'composition', 'category', 'name']
-
     # data pre-processing
-    raw_text_gend = (raw_text_in
-                     .assign(creationDate=lambda x: pd.to_datetime(x['creationDate']),
-                             creationDateMax=lambda x: x.groupby(['b_g'])['creationDate'].transform(max))
-                     .pipe(lambda x: x[x['creationDate'] <= date_max])
-                     .pipe(lambda x: x[(x['creationDate'] > date_min) | (x['creationDateMax'] < date_min)])
-                     .assign(description=lambda x: merge_description(x.astype(str), col_list_in=col_list))
-                     )
+    return (raw_text_in
+            .assign(creationDate=lambda x: pd.to_datetime(x['creationDate']),
+                    creationDateMax=lambda x: x.groupby(['b_g'])['creationDate'].transform(max))
+            .pipe(lambda x: x[x['creationDate'] <= date_max])
+            .pipe(lambda x: x[(x['creationDate'] > date_min) | (x['creationDateMax'] < date_min)])
+            )
+
+
+def cb_manipulate_text(raw_text_in: pd.DataFrame,
+                       start_date: str,
+                       end_date: str):
+    """
+    :param raw_text_in: unprocessed product dataframe
+    :param start_date: str
+    :param end_date: str
+    :return:
+    """
+
+    raw_text_gend = (_cb_products(raw_text_in, start_date=start_date, end_date=end_date)
+                     .assign(description=lambda x: merge_description(x.astype(str), col_list_in=COL_LIST)))
 
     # merge all brand information together
     collapse_brands = {'description': [lambda x: ' '.join(x)],
@@ -196,3 +473,102 @@ def cb_manipulate_text(raw_text_in: pd.DataFrame,
     bg_text = bg_text.astype({'b_g': 'category'})
 
     return bg_text
+
+
+def _product_term_counts(products: pd.DataFrame,
+                         n_features: int = None) -> Tuple[csr_matrix, np.ndarray]:
+    """
+    Tokenize every product once into sparse term counts.
+
+    Fields sharing a repetition weight are cleaned together, the weight is applied
+    to the counts instead of repeating the words in the text.
+
+    :param products: product dataframe, text columns as str
+    :param n_features: size of the hashing vocabulary, None builds an exact vocabulary
+    :return: csr_matrix product x term counts and a run independent id of each term column
+    """
+
+    field_groups = dict()
+    for col in COL_LIST:
+        field_groups.setdefault(COL_LIST_REP.get(col, 1), []).append(col)
+
+    # one cache for all field groups, each group would otherwise overwrite the cached texts of the previous ones
+    text_cache = _text_cache()
+    texts = {weight: merge_description(products, col_list_in=cols, text_cache=text_cache)
+             for weight, cols in field_groups.items()}
+
+    if n_features is not None:
+        vectorize = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        counts = csr_matrix(sum(weight * vectorize.transform(text) for weight, text in texts.items()))
+        return counts, np.arange(n_features, dtype=np.uint64)
+
+    # one vocabulary for all field groups, rows of each group are stacked then split back
+    vectorize = CountVectorizer()
+    X = vectorize.fit_transform([text for weight in texts for text in texts[weight]])
+
+    n_products = products.shape[0]
+    counts = csr_matrix(sum(weight * X[i * n_products:(i + 1) * n_products] for i, weight in enumerate(texts)))
+
+    term_ids = np.zeros(len(vectorize.vocabulary_), dtype=np.uint64)
+    for term, column in vectorize.vocabulary_.items():
+        term_ids[column] = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    return counts, term_ids
+
+
+def _row_digests(counts: csr_matrix, term_ids: np.ndarray) -> np.ndarray:
+    """
+    :param counts: csr_matrix document x term counts
+    :param term_ids: run independent id of each term column
+    :return: digest of the term counts of each row, equal across runs for the same document
+    """
+
+    digests = []
+
+    for i in range(counts.shape[0]):
+        start, end = counts.indptr[i], counts.indptr[i + 1]
+        row_terms = term_ids[counts.indices[start:end]]
+        order = np.argsort(row_terms)
+        payload = row_terms[order].tobytes() + counts.data[start:end][order].astype(np.float64).tobytes()
+        digests.append(hashlib.blake2b(payload, digest_size=16).hexdigest())
+
+    return np.array(digests)
+
+
+def cb_manipulate_counts(raw_text_in: pd.DataFrame,
+                         start_date: str,
+                         end_date: str,
+                         n_features: int = None) -> Tuple[pd.DataFrame, csr_matrix]:
+    """
+    Same brand-gender corpus as cb_manipulate_text, as term counts: products are
+    tokenized once and their counts summed per b_g with a sparse group by, the
+    brand-gender documents are never concatenated into strings.
+
+    :param raw_text_in: unprocessed product dataframe
+    :param start_date: str
+    :param end_date: str
+    :param n_features: size of the hashing vocabulary, None builds an exact vocabulary
+    :return: brand-gender dataframe and csr_matrix of brand-gender x term counts, aligned by row.
+             text_digest identifies the term counts of each brand-gender across runs
+    """
+
+    raw_text_gend = _cb_products(raw_text_in, start_date=start_date, end_date=end_date)
+
+    product_counts, term_ids = _product_term_counts(raw_text_gend.astype(str), n_features=n_features)
+
+    # merge all brand information together
+    bg_text = (raw_text_gend[['b_g', 'brandID', 'gender', 'stockForSale', 'creationDateMax']]
+               .groupby(['b_g', 'brandID', 'gender'], as_index=False)
+               .agg({'stockForSale': 'sum', 'creationDateMax': 'max'}))
+
+    # sparse group by: sum product rows into their brand-gender row
+    bg_rows = pd.Categorical(raw_text_gend['b_g'], categories=bg_text['b_g']).codes
+    group_by = csr_matrix((np.ones(len(bg_rows)), (bg_rows, np.arange(len(bg_rows)))),
+                          shape=(bg_text.shape[0], len(bg_rows)))
+
+    bg_counts = csr_matrix(group_by @ product_counts)
+
+    bg_text['text_digest'] = _row_digests(bg_counts, term_ids)
+    bg_text = bg_text.astype({'b_g': 'category'})
+
+    return bg_text, bg_counts
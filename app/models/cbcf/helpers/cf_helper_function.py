@@ -0,0 +1,112 @@
+"""
+@name: cf_helper_function.py
+@overview: Blocked, multi-process BM25 item-item similarity with top K neighbours per item
+"""
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+import numpy as np
+from implicit.nearest_neighbours import bm25_weight
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+from ssense_logger.app_logger import AppLogger
+
+from app.config import ConfigTraining
+
+app_logger = AppLogger(app_name=ConfigTraining.APP_NAME, env=ConfigTraining.ENV)
+
+# item x user weights and their transpose, set once per worker process by _init_worker
+_WORKER_MATRICES = {}
+# share of non-zero similarities above which a block is selected from its dense form
+_DENSE_TOP_K_DENSITY = 0.1
+
+
+def bm25_item_weights(hits_matrix: coo_matrix, K1: float, B: float, dtype=np.float32) -> csr_matrix:
+    """
+    Same weighting as BM25Recommender.fit: members are the documents, brand-genders the terms.
+
+    :param hits_matrix: item x user hits
+    :return: item x user BM25 weights
+    """
+    return bm25_weight(hits_matrix.T, K1, B).T.tocsr().astype(dtype)
+
+
+def _top_k_rows(block: csr_matrix, k: int) -> csr_matrix:
+    """Keep the k largest entries of each row of a sparse block"""
+    block = block.tocsr()
+
+    # popular items co-occur with most others, a dense partition is then cheaper than a sort
+    if k < block.shape[1] and block.nnz > _DENSE_TOP_K_DENSITY * block.shape[0] * block.shape[1]:
+        dense = block.toarray()
+        neighbours = np.argpartition(-dense, k - 1, axis=1)[:, :k]
+        values = np.take_along_axis(dense, neighbours, axis=1)
+        row = np.repeat(np.arange(block.shape[0]), k).reshape(neighbours.shape)
+        stored = values != 0
+
+        return csr_matrix((values[stored], (row[stored], neighbours[stored])), shape=block.shape)
+
+    row = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+
+    # rows ascending, values descending inside a row: the rank of an entry is its offset in its row
+    order = np.lexsort((-block.data, row))
+    rank = np.arange(len(order)) - block.indptr[row[order]]
+    keep = order[rank < k]
+
+    return csr_matrix((block.data[keep], (row[keep], block.indices[keep])), shape=block.shape)
+
+
+def _init_worker(weights: csr_matrix):
+    _WORKER_MATRICES['weights'] = weights
+    _WORKER_MATRICES['weights_t'] = weights.T.tocsr()
+
+
+def _block_top_k(start: int, end: int, k: int) -> csr_matrix:
+    weights = _WORKER_MATRICES['weights']
+
+    return _top_k_rows(weights[start:end] @ _WORKER_MATRICES['weights_t'], k)
+
+
+def _peak_rss_mb() -> Tuple[float, float]:
+    """Peak resident memory of this process and of its finished worker processes, in MB"""
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def top_k_similarity(weights: csr_matrix, K: int, block_size: int, n_jobs: int = 1) -> csr_matrix:
+    """
+    Top K entries of each row of weights @ weights.T, the similarity kept by BM25Recommender.
+
+    The product is computed block_size rows at a time and reduced to its top K before the
+    next block, so at most block_size x n_items similarities are held at once per worker.
+
+    :param weights: item x user weights
+    :param K: number of neighbours kept per item, the item itself included
+    :param block_size: number of items multiplied at a time
+    :param n_jobs: number of worker processes, each holds its own copy of weights
+    :return: item x item csr_matrix with at most K entries per row
+    """
+    start_time = time.perf_counter()
+    n_items = weights.shape[0]
+    bounds = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+    n_jobs = min(n_jobs, len(bounds))
+
+    if n_jobs <= 1:
+        _init_worker(weights)
+        try:
+            blocks = [_block_top_k(start, end, K) for start, end in bounds]
+        finally:
+            _WORKER_MATRICES.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(weights,)) as executor:
+            blocks = list(executor.map(_block_top_k, *zip(*bounds), [K] * len(bounds)))
+
+    similarity = vstack(blocks, format='csr') if blocks else csr_matrix((0, 0), dtype=weights.dtype)
+
+    peak_rss, peak_rss_workers = _peak_rss_mb()
+    app_logger.info(msg=f'CF similarity: {n_items} items, {weights.shape[1]} users, {similarity.nnz} neighbours '
+                        f'in {round(time.perf_counter() - start_time, 2)}s, {len(bounds)} blocks, {n_jobs} jobs, '
+                        f'peak rss {round(peak_rss)}MB, workers peak rss {round(peak_rss_workers)}MB',
+                    tags=['cf_train', 'similarity'])
+
+    return similarity
@@ -3,6 +3,8 @@
 @author: Graydon Snider, Mohammad Jeihoonian
 Created on Sept 2019
 """
+from typing import Tuple
+
 import numpy as np
 import pandas as pd
 
@@ -241,6 +243,239 @@ def avg_f1_at_k(actual: list, predicted: list, k=10):
     return np.round(np.mean([f1_at_k(a, p, k) for a, p in zip(actual, predicted)]), 2)
 
 
+def ndcg_at_k(actual: list, predicted: list, k=10):
+
+    """
+    Computes the normalized discounted cumulative gain at k, with binary relevance.
+    Parameters
+    ----------
+    actual : list
+             A list of elements that are to be predicted (order doesn't matter)
+    predicted : list
+                A list of predicted elements (order does matter)
+    k : int, optional
+        The maximum number of predicted elements
+    Returns
+    -------
+    score : double
+            The ndcg at k over the input lists
+    """
+    dcg = 0.0
+    predicted = predicted[:k]
+
+    for i, p in enumerate(predicted):
+        if p in actual and p not in predicted[:i]:
+            dcg += 1.0 / np.log2(i + 2)
+    if not actual or not predicted:
+        return 0.0
+
+    idcg = 0.0
+    for i in range(min(len(set(actual)), k)):
+        idcg += 1.0 / np.log2(i + 2)
+
+    return dcg / idcg
+
+
+def avg_ndcg_at_k(actual: list, predicted: list, k=10):
+    """
+    Computes the mean ndcg at k over lists of lists of items.
+    """
+    return np.round(np.mean([ndcg_at_k(a, p, k) for a, p in zip(actual, predicted)]), 2)
+
+
+def average_precision_at_k(actual: list, predicted: list, k=10):
+
+    """
+    Computes the average precision at k.
+    Parameters
+    ----------
+    actual : list
+             A list of elements that are to be predicted (order doesn't matter)
+    predicted : list
+                A list of predicted elements (order does matter)
+    k : int, optional
+        The maximum number of predicted elements
+    Returns
+    -------
+    score : double
+            The average precision at k over the input lists
+    """
+    score = 0.0
+    num_hits = 0.0
+    predicted = predicted[:k]
+
+    for i, p in enumerate(predicted):
+        if p in actual and p not in predicted[:i]:
+            num_hits += 1.0
+            score += num_hits / (i + 1.0)
+    if not actual or not predicted:
+        return 0.0
+    return score / min(len(actual), k)
+
+
+def avg_map_at_k(actual: list, predicted: list, k=10):
+    """
+    Computes the mean average precision at k over lists of lists of items.
+    """
+    return np.round(np.mean([average_precision_at_k(a, p, k) for a, p in zip(actual, predicted)]), 2)
+
+
+def ragged_codes(actual: list, predicted: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flattens lists of lists of items into integer codes and CSR style offsets,
+    actual and predicted items share the same codes.
+
+    :return: actual_items, actual_offsets, predicted_items, predicted_offsets
+    """
+    actual_lengths = np.array([len(items) for items in actual], dtype=np.int64)
+    predicted_lengths = np.array([len(items) for items in predicted], dtype=np.int64)
+
+    flat = [item for items in actual for item in items] + [item for items in predicted for item in items]
+    codes = pd.factorize(pd.Series(flat, dtype=object))[0] if flat else np.zeros(0, dtype=np.int64)
+
+    actual_offsets = np.concatenate([[0], np.cumsum(actual_lengths)])
+    predicted_offsets = np.concatenate([[0], np.cumsum(predicted_lengths)])
+
+    return codes[:actual_offsets[-1]], actual_offsets, codes[actual_offsets[-1]:], predicted_offsets
+
+
+def _prefix(items: np.ndarray, offsets: np.ndarray, length: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: owner, position and item of the first length[owner] items of each list
+    """
+    owner = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    position = np.arange(len(items)) - offsets[owner]
+    keep = position < length[owner]
+
+    return owner[keep], position[keep], items[keep]
+
+
+def _first_occurrence(owner: np.ndarray, items: np.ndarray, n_items: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: keys (owner, item) of each entry and a flag on the first entry of each key
+    """
+    keys = owner * n_items + items
+    first = np.zeros(len(keys), dtype=bool)
+    first[np.unique(keys, return_index=True)[1]] = True
+
+    return keys, first
+
+
+def _prefix_counts(owner: np.ndarray, position: np.ndarray, n_users: int, width: int) -> np.ndarray:
+    """
+    :return: n_users x width counts of the entries at a position up to each column
+    """
+    counts = np.zeros((n_users, width), dtype=np.int64)
+    np.add.at(counts, (owner, position), 1)
+
+    return np.cumsum(counts, axis=1)
+
+
+def batch_metrics(actual_items: np.ndarray, actual_offsets: np.ndarray,
+                  predicted_items: np.ndarray, predicted_offsets: np.ndarray, k=10) -> dict:
+    """
+    Per user recall_at_k, precision_at_k, f1_at_k, jaccard_at_k, jaccard_ranked, ndcg_at_k and
+    average_precision_at_k of all users at once, equal to the functions above.
+
+    Users are described CSR style: the items of user u are items[offsets[u]:offsets[u + 1]],
+    actual and predicted items as integer codes (see ragged_codes). Sums run position by
+    position in the same order as the single user functions, so the results match them exactly.
+    Jaccard scores of users whose actual and predicted lists are both empty are nan,
+    the single user functions raise on them.
+
+    :return: {metric name: array of one score per user}
+    """
+    n_users = len(actual_offsets) - 1
+    n_items = int(max(actual_items.max(initial=-1), predicted_items.max(initial=-1))) + 1
+    actual_length = np.diff(actual_offsets)
+    predicted_length = np.diff(predicted_offsets)
+    predicted_length_k = np.minimum(predicted_length, k)
+    width = max(int(min(max(actual_length.max(initial=0), predicted_length.max(initial=0)), k)), 1)
+
+    # hits of the top k predictions: first occurrence of an actual item
+    actual_keys = np.arange(n_users).repeat(actual_length) * n_items + actual_items
+    owner, position, items = _prefix(predicted_items, predicted_offsets, predicted_length_k)
+    keys, first = _first_occurrence(owner, items, n_items)
+    hit = first & np.isin(keys, actual_keys)
+
+    hits = np.zeros((n_users, width), dtype=bool)
+    hits[owner[hit], position[hit]] = True
+    num_hits = hits.sum(axis=1).astype(np.float64)
+
+    scored = (actual_length > 0) & (predicted_length_k > 0)
+    recall = np.where(scored, num_hits / np.maximum(actual_length, 1), 0.0)
+    precision = np.where(scored, num_hits / np.maximum(predicted_length_k, 1), 0.0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros(n_users), where=(precision + recall) != 0)
+
+    dcg, average_precision, cumulative_hits = np.zeros(n_users), np.zeros(n_users), np.zeros(n_users)
+    for i in range(width):
+        dcg[hits[:, i]] += 1.0 / np.log2(i + 2)
+        cumulative_hits[hits[:, i]] += 1.0
+        average_precision[hits[:, i]] += cumulative_hits[hits[:, i]] / (i + 1.0)
+
+    actual_owner = np.arange(n_users).repeat(actual_length)
+    _, actual_first = _first_occurrence(actual_owner, actual_items, n_items)
+    n_unique_actual = np.minimum(np.bincount(actual_owner[actual_first], minlength=n_users), k)
+    idcg = np.zeros(n_users)
+    for i in range(width):
+        idcg[n_unique_actual > i] += 1.0 / np.log2(i + 2)
+
+    ndcg = np.divide(dcg, idcg, out=np.zeros(n_users), where=scored)
+    average_precision = np.divide(average_precision, np.minimum(actual_length, k),
+                                  out=np.zeros(n_users), where=scored)
+
+    # jaccard: both lists cut at the same bin size, sets of their prefixes
+    bin_size = np.minimum(np.maximum(actual_length, predicted_length), k)
+
+    a_owner, a_position, a_items = _prefix(actual_items, actual_offsets, bin_size)
+    a_keys, a_first = _first_occurrence(a_owner, a_items, n_items)
+    p_owner, p_position, p_items = _prefix(predicted_items, predicted_offsets, bin_size)
+    p_keys, p_first = _first_occurrence(p_owner, p_items, n_items)
+
+    # an item common to both prefixes from the later of its two first positions on
+    _, a_index, p_index = np.intersect1d(a_keys[a_first], p_keys[p_first], assume_unique=True, return_indices=True)
+    common_owner = a_owner[a_first][a_index]
+    common_position = np.maximum(a_position[a_first][a_index], p_position[p_first][p_index])
+
+    actual_sets = _prefix_counts(a_owner[a_first], a_position[a_first], n_users, width)
+    predicted_sets = _prefix_counts(p_owner[p_first], p_position[p_first], n_users, width)
+    intersections = _prefix_counts(common_owner, common_position, n_users, width)
+    unions = actual_sets + predicted_sets - intersections
+
+    jaccard_prefix = np.divide(intersections, unions, out=np.zeros((n_users, width)), where=unions > 0)
+    last = np.maximum(bin_size, 1) - 1
+    jaccard_k = np.where(bin_size > 0, jaccard_prefix[np.arange(n_users), last], np.nan)
+
+    jaccard_sum = np.zeros(n_users)
+    for i in range(width):
+        jaccard_sum[bin_size > i] += jaccard_prefix[bin_size > i, i]
+    jaccard_rank = np.divide(jaccard_sum, bin_size, out=np.full(n_users, np.nan), where=bin_size > 0)
+
+    return {'recall_at_k': recall,
+            'precision_at_k': precision,
+            'f1_at_k': f1,
+            'jaccard_at_k': jaccard_k,
+            'jaccard_ranked': jaccard_rank,
+            'ndcg_at_k': ndcg,
+            'average_precision_at_k': average_precision}
+
+
+def batch_avg_metrics(actual: list, predicted: list, k=10) -> dict:
+    """
+    avg_recall_at_k, avg_precision_at_k, avg_f1_at_k, avg_jaccard_at_k, avg_ndcg_at_k and avg_map_at_k
+    of lists of lists of items, computed with batch_metrics
+    """
+    scores = batch_metrics(*ragged_codes(actual, predicted), k=k)
+
+    return {'avg_recall_at_k': np.round(np.mean(scores['recall_at_k']), 2),
+            'avg_precision_at_k': np.round(np.mean(scores['precision_at_k']), 2),
+            'avg_f1_at_k': np.round(np.mean(scores['f1_at_k']), 2),
+            'avg_jaccard_at_k': np.mean(scores['jaccard_at_k']),
+            'avg_ndcg_at_k': np.round(np.mean(scores['ndcg_at_k']), 2),
+            'avg_map_at_k': np.round(np.mean(scores['average_precision_at_k']), 2)}
+
+
 def df_of_lists(dataframe: pd.DataFrame,
                 target_col: str,
                 group_col: list,
@@ -0,0 +1,123 @@
+"""
+@name: stage_cache.py
+@overview: Disk backed cache of training stage outputs, keyed by a fingerprint of the stage inputs
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, List
+
+import pandas as pd
+from ssense_logger.app_logger import AppLogger
+
+from app.config import ConfigTraining
+from app.utils.serialization import load_pickle, save_pickle
+
+app_logger = AppLogger(app_name=ConfigTraining.APP_NAME, env=ConfigTraining.ENV)
+
+
+class StageCache(object):
+    """
+    Runs a training stage only when no output was stored for the same inputs.
+
+    The fingerprint of a stage covers the content of its DataFrames, its parameters and the
+    source of the modules implementing it, so editing the stage code invalidates its entries.
+    Stages whose output depends on anything else (dates, previous models) must pass it as a parameter.
+
+    Disabled unless STAGE_CACHE=True, entries are stored under STAGE_CACHE_PARAM['cache_dir'], one
+    directory per stage. An output that is stale for a reason the fingerprint does not cover, e.g. a
+    change in a library, is invalidated with clear() or by deleting the directory of its stage.
+    """
+    _TAGS = ['training', 'stage_cache']
+
+    def __init__(self, cache_dir: str = None, max_entries_per_stage: int = 3):
+        """
+        :param cache_dir: directory of the cached outputs, None disables the cache
+        :param max_entries_per_stage: number of most recently used outputs kept per stage
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries_per_stage = max_entries_per_stage
+
+    @classmethod
+    def from_config(cls):
+        params = ConfigTraining.STAGE_CACHE_PARAM
+
+        return cls(cache_dir=params['cache_dir'] if params['enabled'] else None,
+                   max_entries_per_stage=params['max_entries_per_stage'])
+
+    @staticmethod
+    def fingerprint(data: List[pd.DataFrame], params: dict, modules: List[ModuleType]) -> str:
+        digest = hashlib.sha256()
+
+        for dataset in data:
+            digest.update(json.dumps([str(column) for column in dataset.columns]).encode('utf-8'))
+            digest.update(json.dumps([str(dtype) for dtype in dataset.dtypes]).encode('utf-8'))
+            digest.update(pd.util.hash_pandas_object(dataset, index=True).values.tobytes())
+
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+
+        for module in modules:
+            digest.update(inspect.getsource(module).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def clear(self, stage: str = None) -> None:
+        """
+        :param stage: stage whose entries are deleted, None deletes every stage
+        """
+        if self.cache_dir is None:
+            return
+
+        shutil.rmtree(str(self.cache_dir / stage if stage else self.cache_dir), ignore_errors=True)
+
+        app_logger.info(msg=f'Stage cache cleared: {stage or "all stages"}', tags=self._TAGS)
+
+    def _prune(self, stage_dir: Path) -> None:
+        entries = sorted(stage_dir.glob('*.pkl'), key=lambda path: path.stat().st_mtime, reverse=True)
+
+        for path in entries[self.max_entries_per_stage:]:
+            path.unlink()
+
+    def run(self, stage: str, func: Callable, data: List[pd.DataFrame], params: dict,
+            modules: List[ModuleType]):
+        """
+        :param stage: stage name, entries of a stage are stored in their own directory
+        :param func: computes the stage output, called without arguments on a miss
+        :param data: DataFrames the stage reads
+        :param params: parameters the stage output depends on, json serializable
+        :param modules: modules implementing the stage
+        :return: stage output
+        """
+        if self.cache_dir is None:
+            return func()
+
+        start_time = time.time()
+        key = self.fingerprint(data, params, modules)
+        stage_dir = self.cache_dir / stage
+        name = key + '.pkl'
+
+        if (stage_dir / name).exists():
+            output = load_pickle(directory=stage_dir, name=name)
+            os.utime(str(stage_dir / name))
+            app_logger.info(msg=f'Stage {stage}: cache hit {key[:12]}, loaded in {round(time.time() - start_time, 2)} sec.',
+                            tags=self._TAGS)
+            return output
+
+        output = func()
+
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        # write then rename, a crashed run never leaves a truncated entry behind
+        tmp_name = name + '.' + str(os.getpid())
+        save_pickle(directory=stage_dir, name=tmp_name, obj=output)
+        os.replace(str(stage_dir / tmp_name), str(stage_dir / name))
+        self._prune(stage_dir)
+
+        app_logger.info(msg=f'Stage {stage}: cache miss {key[:12]}, computed in {round(time.time() - start_time, 2)} sec.',
+                        tags=self._TAGS)
+
+        return output
@@ -0,0 +1,123 @@
+"""
+@name: text_cache.py
+@overview: Disk backed cache of normalized product texts, keyed by a hash of the source fields
+"""
+import hashlib
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+from ssense_logger.app_logger import AppLogger
+
+from app.config import ConfigTraining
+from app.utils.serialization import load_pickle, save_pickle
+
+app_logger = AppLogger(app_name=ConfigTraining.APP_NAME, env=ConfigTraining.ENV)
+
+
+class TextCache(object):
+    """
+    Applies a text normalization function to a series of raw texts, reusing the results
+    of previous runs for the texts that did not change.
+
+    The cache file stores {hash(raw text): normalized text} plus a fingerprint of the
+    normalization function source, a change in the function invalidates the whole cache.
+    Only texts transformed by this instance are kept when the cache is written back, so its
+    size follows the catalog: a run transforming several series shares one instance.
+    """
+    _CACHE_FILE_NAME = 'text_cache.pkl'
+    _MIN_PARALLEL_TEXTS = 1000
+    _TAGS = ['cb_train', 'text_cache']
+
+    def __init__(self, func: Callable[[str], str], cache_dir: str = None, n_jobs: int = 1):
+        """
+        :param func: text normalization function, must be picklable (module level)
+        :param cache_dir: directory of the cache file, None keeps the cache in memory only
+        :param n_jobs: number of worker processes used on cache misses
+        """
+        self.func = func
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.n_jobs = n_jobs
+        self.fingerprint = hashlib.sha1(inspect.getsource(func).encode('utf-8')).hexdigest()
+        self.entries, self.seconds_per_text = self._load()
+        self.kept_keys = set()
+        self.stats = dict()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _load(self) -> Tuple[Dict[str, str], float]:
+        if self.cache_dir is None or not (self.cache_dir / self._CACHE_FILE_NAME).exists():
+            return dict(), 0.
+
+        cache = load_pickle(directory=self.cache_dir, name=self._CACHE_FILE_NAME)
+
+        if cache.get('fingerprint') != self.fingerprint:
+            app_logger.info(msg='Text normalization changed, discarding text cache', tags=self._TAGS)
+            return dict(), 0.
+
+        return cache['entries'], cache['seconds_per_text']
+
+    def _save(self) -> None:
+        if self.cache_dir is None:
+            return
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        cache = {'fingerprint': self.fingerprint,
+                 'seconds_per_text': self.seconds_per_text,
+                 'entries': {key: self.entries[key] for key in self.kept_keys}}
+
+        # write then rename, a crashed run never leaves a truncated cache behind
+        tmp_name = self._CACHE_FILE_NAME + '.' + str(os.getpid())
+        save_pickle(directory=self.cache_dir, name=tmp_name, obj=cache)
+        os.replace(str(self.cache_dir / tmp_name), str(self.cache_dir / self._CACHE_FILE_NAME))
+
+    def _apply(self, texts: List[str]) -> List[str]:
+        n_jobs = self.n_jobs if len(texts) >= self._MIN_PARALLEL_TEXTS else 1
+
+        if n_jobs <= 1:
+            return [self.func(text) for text in texts]
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(executor.map(self.func, texts, chunksize=max(1, len(texts) // (n_jobs * 4))))
+
+    def transform(self, texts: pd.Series) -> pd.Series:
+        """
+        :param texts: raw texts
+        :return: normalized texts, same index as the input
+        """
+        start_time = time.time()
+
+        keys = [self._key(text) for text in texts]
+        misses = {key: text for key, text in zip(keys, texts) if key not in self.entries}
+
+        if misses:
+            miss_start_time = time.time()
+            self.entries.update(zip(misses.keys(), self._apply(list(misses.values()))))
+            self.seconds_per_text = (time.time() - miss_start_time) / len(misses)
+
+        unique_keys = set(keys)
+        self.kept_keys.update(unique_keys)
+        n_hits = len(unique_keys) - len(misses)
+
+        self.stats = {'texts': len(keys),
+                      'unique_texts': len(unique_keys),
+                      'hits': n_hits,
+                      'hit_rate': round(n_hits / len(unique_keys), 4) if unique_keys else 0.,
+                      'seconds': round(time.time() - start_time, 2),
+                      'seconds_saved': round(n_hits * self.seconds_per_text, 2)}
+
+        app_logger.info(msg=f'Text normalization: {self.stats["hits"]}/{self.stats["unique_texts"]} cache hits '
+                            f'(hit rate {self.stats["hit_rate"]}), {self.stats["seconds"]} sec., '
+                            f'about {self.stats["seconds_saved"]} sec. saved',
+                        tags=self._TAGS)
+
+        self._save()
+
+        return pd.Series([self.entries[key] for key in keys], index=texts.index)
@@ -1,4 +1,6 @@
 import uuid
+from datetime import datetime
+from typing import Callable, Dict
 
 import numpy as np
 import pandas as pd
@@ -6,7 +8,9 @@ from scipy.sparse import csr_matrix
 
 from app.entities.model.model import Model
 from app.entities.model.prediction import Prediction
+from app.library.model_repository.artifact import LazyComponent, load_components
 from app.utils.exception_decorator import exception_decorator
+from app.utils.stage_timer import stage_timer
 from app.config import ConfigTraining
 
 
@@ -14,15 +18,78 @@ class RecPred(Model):
     name = ConfigTraining.MODEL_ID
     version = ConfigTraining.MODEL_VERSION_ID
 
-    def __init__(self, cf_sim_mat, cf_item_dict, cb_sim_mat, cb_item_dict):
+    # read from the artifact files on first use when the model comes from load_artifact
+    cf_sim_mat = LazyComponent()
+    cf_item_dict = LazyComponent()
+    cb_sim_mat = LazyComponent()
+    cb_item_dict = LazyComponent()
+    cb_state = LazyComponent()
+
+    _DATE_FORMAT = '%Y-%m-%d-%H-%M-%S-%f'
+
+    def __init__(self, cf_sim_mat, cf_item_dict, cb_sim_mat, cb_item_dict, cb_state=None):
         Model.__init__(self)
         self.cf_sim_mat = cf_sim_mat
         self.cf_item_dict = cf_item_dict
         self.cb_sim_mat = cb_sim_mat
         self.cb_item_dict = cb_item_dict
+        # state of the content-based fit, used by the next incremental training
+        self.cb_state = cb_state
         self.n_rec = ConfigTraining.MERGED_REC_PARAM['n_rec']
         self.alpha = ConfigTraining.MERGED_REC_PARAM['alpha']
 
+    def __getstate__(self):
+        # pickling reads the components still on disk, their loaders can not be pickled
+        state = load_components(self).__dict__.copy()
+        state.pop('_component_loaders', None)
+
+        return state
+
+    def artifact(self):
+        fields = dict(name=self.name,
+                      version=self.version,
+                      init_date=self.init_date.strftime(self._DATE_FORMAT),
+                      params=dict(n_rec=self.n_rec, alpha=self.alpha))
+
+        components = dict(cf_sim_mat=('csr_matrix', self.cf_sim_mat),
+                          cf_item_dict=('item_index', self.cf_item_dict),
+                          cb_sim_mat=('csr_matrix', self.cb_sim_mat),
+                          cb_item_dict=('item_index', self.cb_item_dict))
+
+        # models pickled before the incremental content-based fit have no cb_state
+        if getattr(self, 'cb_state', None) is not None:
+            fields['params']['cb_state_runs_since_full_build'] = self.cb_state.runs_since_full_build
+            components['cb_state_items'] = ('frame', self.cb_state.items)
+
+        return fields, components
+
+    @classmethod
+    def from_artifact(cls, manifest: Dict, components: Dict[str, Callable[[], object]]) -> 'RecPred':
+        """
+        :param manifest: fields of artifact
+        :param components: {component name: loader of the component}
+        """
+        rec_pred = cls.__new__(cls)
+        Model.__init__(rec_pred)
+        rec_pred.init_date = datetime.strptime(manifest['init_date'], cls._DATE_FORMAT)
+        rec_pred.n_rec = manifest['params']['n_rec']
+        rec_pred.alpha = manifest['params']['alpha']
+
+        def cb_state():
+            if 'cb_state_items' not in components:
+                return None
+            # only used by the next incremental training
+            from app.models.cbcf.training.cb_state import CbState
+            return CbState(components['cb_state_items'](), manifest['params']['cb_state_runs_since_full_build'])
+
+        rec_pred._component_loaders = dict(cf_sim_mat=components['cf_sim_mat'],
+                                           cf_item_dict=components['cf_item_dict'],
+                                           cb_sim_mat=components['cb_sim_mat'],
+                                           cb_item_dict=components['cb_item_dict'],
+                                           cb_state=cb_state)
+
+        return rec_pred
+
     @staticmethod
     def _gender_processing(dataset):
 
@@ -89,9 +156,10 @@ class RecPred(Model):
                                                           lsuffix='_cf', rsuffix='_cb')
 
     @exception_decorator
-    def _rec_predict(self, user_data, sim_mat: csr_matrix, item_dict: dict):
+    def _rec_predict(self, user_data, sim_mat: csr_matrix, item_dict: dict, stage: str = 'rec_pred'):
 
         """
+        :param stage: prefix of the timed stages
         :return recommendations for each user in the dataset
         """
 
@@ -103,7 +171,8 @@ class RecPred(Model):
         user_items = csr_matrix(user_items)
 
         # Compute dot product
-        rec_mat = user_items @ sim_mat
+        with stage_timer.stage(stage + '.spmv'):
+            rec_mat = user_items @ sim_mat
 
         result = []
         liked = set(user_items.indices)
@@ -121,7 +190,8 @@ class RecPred(Model):
         if len(rec.index) == 0:
             return pd.DataFrame(columns=['brand', 'gender', 'score', 'liked'])
 
-        return self._post_process_rec(rec)
+        with stage_timer.stage(stage + '.post_process'):
+            return self._post_process_rec(rec)
 
     @exception_decorator
     def _rec_agg(self, cf_rec: pd.DataFrame, cb_rec: pd.DataFrame):
@@ -156,8 +226,12 @@ class RecPred(Model):
 
     @exception_decorator
     def predict(self, data) -> Prediction:
-        cf_rec = self._rec_predict(data, sim_mat=self.cf_sim_mat, item_dict=self.cf_item_dict)
-        cb_rec = self._rec_predict(data, sim_mat=self.cb_sim_mat, item_dict=self.cb_item_dict)
-        cb_rec = self._rescale_cb(cb_rec, cf_rec)
-        rec_dict = self._rec_agg(cf_rec, cb_rec).to_dict()
+        with stage_timer.stage('rec_pred.cf'):
+            cf_rec = self._rec_predict(data, sim_mat=self.cf_sim_mat, item_dict=self.cf_item_dict, stage='rec_pred.cf')
+        with stage_timer.stage('rec_pred.cb'):
+            cb_rec = self._rec_predict(data, sim_mat=self.cb_sim_mat, item_dict=self.cb_item_dict, stage='rec_pred.cb')
+        with stage_timer.stage('rec_pred.cb_rescale'):
+            cb_rec = self._rescale_cb(cb_rec, cf_rec)
+        with stage_timer.stage('rec_pred.blend'):
+            rec_dict = self._rec_agg(cf_rec, cb_rec).to_dict()
         return Prediction(rec_dict['brand'], rec_dict['gender'], rec_dict['score'], rec_dict['liked'])
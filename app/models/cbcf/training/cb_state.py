@@ -0,0 +1,19 @@
+"""
+@name: cb_state.py
+@overview: Fingerprints of a content-based fit, kept with the model for incremental updates
+"""
+import pandas as pd
+
+
+class CbState(object):
+
+    def __init__(self, items: pd.DataFrame, runs_since_full_build: int):
+        """
+        :param items: one row per brand-gender (index b_g) with
+                      text_digest: digest of its term counts
+                      in_stock: stock flag used by the relevance score
+                      cutoff: quantile cutoff of its similarity column
+        :param runs_since_full_build: number of incremental fits since the last full build
+        """
+        self.items = items
+        self.runs_since_full_build = runs_since_full_build
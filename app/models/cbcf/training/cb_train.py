@@ -1,4 +1,3 @@
-
 """
 @name: cb_train.py
 
@@ -7,20 +6,157 @@
 Created on Nov 2019
 """
 import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Callable
+
+import numpy as np
 import pandas as pd
 from scipy.sparse import csr_matrix
+from ssense_logger.app_logger import AppLogger
 
-from app.models.cbcf.helpers.cb_helper_function import get_text_distance, cb_manipulate_text
+from app.models.cbcf.helpers import cb_helper_function
+from app.models.cbcf.helpers.stage_cache import StageCache
+from app.models.cbcf.helpers.cb_helper_function import get_text_similarity, get_text_similarity_cutoffs, \
+    get_text_similarity_incremental, cb_manipulate_counts
+from app.models.cbcf.training.cb_state import CbState
 from app.config import ConfigTraining
 
+# Initialize Logger
+app_logger = AppLogger(app_name=ConfigTraining.APP_NAME, env=ConfigTraining.ENV)
+
 
 class ContTrain(object):
 
-    def __init__(self, product_data: pd.DataFrame):
+    def __init__(self, product_data: pd.DataFrame,
+                 previous_state: CbState = None,
+                 previous_sim_mat: csr_matrix = None,
+                 previous_item_dict: dict = None,
+                 stage_cache: StageCache = None):
+        """
+        :param product_data: products dataframe
+        :param previous_state: state of the previous fit, enables incremental updates
+        :param previous_sim_mat: cb_sim_mat of the previous fit
+        :param previous_item_dict: cb_item_dict of the previous fit
+        :param stage_cache: reuses the brand-gender corpus of a previous run on the same products
+        """
 
         self.product_data = product_data
+        self.n_jobs = ConfigTraining.CB_REC_PARAM['n_jobs']
+        self.incremental_params = ConfigTraining.CB_INCREMENTAL_PARAM
+        self.previous_state = previous_state
+        self.previous_sim_mat = previous_sim_mat
+        self.previous_item_dict = previous_item_dict
+        self.stage_cache = stage_cache if stage_cache is not None else StageCache()
+        self.state = None
+
+    @staticmethod
+    def _block_diagonal(blocks: List[csr_matrix], codes: List[np.ndarray], dimension: int) -> csr_matrix:
+        """
+        Scatter per gender similarity blocks into one sparse matrix indexed by bg_codes.
+        Brand-genders of different genders never share a non-zero entry.
+        """
+        rows, cols, data = [], [], []
+
+        for block, block_codes in zip(blocks, codes):
+            block = block.tocoo()
+            rows.append(block_codes[block.row])
+            cols.append(block_codes[block.col])
+            data.append(block.data)
+
+        return csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(dimension, dimension))
+
+    def _run(self, tasks: List[Tuple[Callable, tuple]]) -> list:
+
+        n_jobs = min(self.n_jobs, len(tasks))
+
+        if n_jobs <= 1:
+            return [func(*args) for func, args in tasks]
+
+        # one worker process per gender, each gender is an independent similarity problem
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(func, *args) for func, args in tasks]
+            return [future.result() for future in futures]
+
+    def _incremental_inputs(self, labels: np.ndarray, digests: np.ndarray, stock: np.ndarray):
+        """
+        :return: changed mask, previous similarity between unchanged brand-genders and previous cutoffs,
+                 None when there is no previous fit or too many brand-genders changed
+        """
+        if self.previous_state is None:
+            return None
+
+        previous_items = self.previous_state.items.reindex(labels)
+
+        # new brand-genders have no previous digest and always count as changed
+        changed = ((previous_items['text_digest'].values != digests)
+                   | (previous_items['in_stock'].values != (stock > 0)))
+
+        if changed.mean() > self.incremental_params['max_changed_fraction']:
+            return None
+
+        previous_codes = pd.Series(list(self.previous_item_dict.keys()), index=list(self.previous_item_dict.values()))
+        unchanged_codes = previous_codes.reindex(labels[~changed]).values.astype(np.int64)
+        unchanged_sim = self.previous_sim_mat[unchanged_codes][:, unchanged_codes]
+
+        return changed, unchanged_sim, previous_items['cutoff'].values
+
+    @staticmethod
+    def _log_drift(gender: str, full_sim: csr_matrix, incremental_sim: csr_matrix):
+
+        overlap = full_sim.multiply(incremental_sim).nnz
+        support_agreement = overlap / max(full_sim.nnz + incremental_sim.nnz - overlap, 1)
+        max_abs_diff = abs(full_sim - incremental_sim).max() if full_sim.nnz or incremental_sim.nnz else 0.
+
+        app_logger.info(msg=f'CB incremental drift for gender {gender}: max abs diff {round(float(max_abs_diff), 5)}, '
+                            f'support agreement {round(support_agreement, 4)}',
+                        tags=['cb_train', 'incremental', 'drift'])
+
+    def _fit_quantile(self, genders: List[str], labels: List[np.ndarray], corpora: List[csr_matrix], stocks: List[np.ndarray],
+                      digests: List[np.ndarray]) -> List[csr_matrix]:
+        """
+        Quantile thresholded similarity per gender, incremental when a previous fit allows it.
+        A full build runs every full_rebuild_every fits and its drift from the incremental update is logged.
+        """
+        full_build_due = (self.previous_state is None or self.previous_state.runs_since_full_build + 1
+                          >= self.incremental_params['full_rebuild_every'])
+
+        inputs = [self._incremental_inputs(*args) for args in zip(labels, digests, stocks)]
+
+        tasks, task_index = [], []
+        for i, (corpus, stock) in enumerate(zip(corpora, stocks)):
+            if full_build_due or inputs[i] is None:
+                task_index.append(('full', i))
+                tasks.append((get_text_similarity_cutoffs, (corpus, stock)))
+            if inputs[i] is not None:
+                task_index.append(('incremental', i))
+                tasks.append((get_text_similarity_incremental, (corpus, stock) + inputs[i]))
+
+        results = dict(zip(task_index, self._run(tasks)))
+
+        weights_inner, items = [], []
+        for i, gender_labels in enumerate(labels):
+            mode = 'full' if ('full', i) in results else 'incremental'
+
+            if mode == 'full' and ('incremental', i) in results:
+                self._log_drift(genders[i], results[('full', i)][0], results[('incremental', i)][0])
+
+            sim, cutoffs = results[(mode, i)]
+            weights_inner.append(sim)
+            items.append(pd.DataFrame({'text_digest': digests[i], 'in_stock': stocks[i] > 0, 'cutoff': cutoffs},
+                                      index=pd.Index(gender_labels, name='b_g')))
 
-    def fit(self):
+            app_logger.info(msg=f'CB similarity {mode} fit for {len(gender_labels)} brand-genders of gender {genders[i]}'
+                                + (f', {int(inputs[i][0].sum())} changed' if mode == 'incremental' else ''),
+                            tags=['cb_train', mode])
+
+        all_full = all(('full', i) in results for i in range(len(labels)))
+        self.state = CbState(items=pd.concat(items),
+                             runs_since_full_build=0 if all_full else self.previous_state.runs_since_full_build + 1)
+
+        return weights_inner
+
+    def transform_data(self) -> Tuple[pd.DataFrame, csr_matrix]:
 
         assert self.product_data.shape[0] > 0
 
@@ -32,39 +168,55 @@ class ContTrain(object):
         start_date = (datetime.date.today() - datetime.timedelta(weeks=last_n_weeks)).strftime('%Y-%m-%d')
         end_date = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
 
-        # convert product df to brand df
-        brand_df = cb_manipulate_text(self.product_data,
-                                      start_date=start_date,
-                                      end_date=end_date)
+        # convert product df to brand df and brand x term counts
+        brand_df, term_counts = self.stage_cache.run(
+            stage='cb_corpus',
+            func=lambda: cb_manipulate_counts(self.product_data,
+                                              start_date=start_date,
+                                              end_date=end_date,
+                                              n_features=ConfigTraining.CB_REC_PARAM['hashing_n_features']),
+            data=[self.product_data],
+            params=dict(start_date=start_date, end_date=end_date, min_df=ConfigTraining.CB_REC_PARAM['min_df'],
+                        hashing_n_features=ConfigTraining.CB_REC_PARAM['hashing_n_features']),
+            modules=[cb_helper_function])
 
-        # create two dictionaries of codes
         brand_df['bg_codes'] = brand_df['b_g'].cat.codes
-        cb_item_dict = dict(zip(brand_df['bg_codes'], brand_df['b_g']))
 
         # Create a sparse matrix of all the brands, per gender
         new = brand_df["b_g"].str.split(" ", n=1, expand=True)
         brand_df["gender"] = new[1]
 
-        weights_inner: pd.DataFrame = pd.DataFrame()
-
-        for gender in brand_df.gender.unique():
-
-            dataset_sub = brand_df.copy()
-            dataset_sub = dataset_sub[dataset_sub['gender'] == gender]
+        return brand_df, term_counts
 
-            # extract 1 minus cosine distance between bg texts
-            weights_inner_sub = get_text_distance(corpus_in=list(dataset_sub['description']),
-                                                  stock_in=dataset_sub['stockForSale'],
-                                                  docids_in=dataset_sub['bg_codes'])
+    def fit(self):
 
-            weights_inner = pd.merge(weights_inner, weights_inner_sub,
-                                     left_index=True, right_index=True, how='outer')
+        brand_df, term_counts = self.transform_data()
 
-        weights_inner.fillna(0, inplace=True)
-        weights_inner.sort_index(axis=0, inplace=True)
-        weights_inner.sort_index(axis=1, inplace=True)
+        # create two dictionaries of codes
+        cb_item_dict = dict(zip(brand_df['bg_codes'], brand_df['b_g']))
 
-        # convert to sparse for efficiency
-        cb_sim_mat = csr_matrix(weights_inner)
+        genders = list(brand_df.gender.unique())
+        gender_rows = [np.flatnonzero(brand_df['gender'].values == gender) for gender in genders]
+
+        corpora = [term_counts[rows] for rows in gender_rows]
+        stocks = [brand_df['stockForSale'].values[rows] for rows in gender_rows]
+
+        # extract 1 minus cosine distance between bg texts
+        if ConfigTraining.CB_REC_PARAM['top_k'] is not None:
+            # incremental updates rely on the quantile cutoffs, top K fits are always full
+            weights_inner = self._run([(get_text_similarity, (corpus, stock)) for corpus, stock in zip(corpora, stocks)])
+        else:
+            weights_inner = self._fit_quantile(
+                genders=genders,
+                labels=[brand_df['b_g'].astype(str).values[rows] for rows in gender_rows],
+                corpora=corpora,
+                stocks=stocks,
+                digests=[brand_df['text_digest'].values[rows] for rows in gender_rows])
+
+        # assemble per gender blocks, aligned with cb_item_dict codes
+        cb_sim_mat = self._block_diagonal(
+            blocks=weights_inner,
+            codes=[brand_df['bg_codes'].values[rows].astype(np.int64) for rows in gender_rows],
+            dimension=len(brand_df['b_g'].cat.categories))
 
         return cb_sim_mat, cb_item_dict
@@ -8,14 +8,20 @@ from implicit.nearest_neighbours import BM25Recommender
 from scipy.sparse import coo_matrix
 
 from app.config import ConfigTraining
+from app.models.cbcf.helpers.cf_helper_function import bm25_item_weights, top_k_similarity
 
 
 class CollabTrain(object):
 
-    def __init__(self, hits_data):
+    def __init__(self, hits_data, n_jobs: int = None):
+        """
+        :param n_jobs: worker processes of the blocked build, defaults to CF_BUILD_PARAM
+        """
         self.hits_data = hits_data
         self.item_colname = 'b_g'
         self.model_params = ConfigTraining.CF_KNN_PARAM
+        self.build_params = ConfigTraining.CF_BUILD_PARAM if n_jobs is None \
+            else dict(ConfigTraining.CF_BUILD_PARAM, n_jobs=n_jobs)
         self.model = None
 
     def coo_transform(self, dataset):
@@ -54,6 +60,14 @@ class CollabTrain(object):
         # Transform data into sparse matrix
         hits_matrix, item_dict = self.transform_data()
 
+        if self.build_params['blocked']:
+            weights = bm25_item_weights(hits_matrix, K1=self.model_params['K1'], B=self.model_params['B'])
+
+            return top_k_similarity(weights,
+                                    K=self.model_params['K'],
+                                    block_size=self.build_params['block_size'],
+                                    n_jobs=self.build_params['n_jobs']), item_dict
+
         # Create the model from the input data
         self.model = self.get_model()
 
@@ -1,34 +1,67 @@
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 from pandas import DataFrame
+from ssense_logger.app_logger import AppLogger
+from app.config import ConfigTraining
 from app.entities.model.model import Model
+from app.entities.model.model_info import ModelInfo
 from app.entities.trainer.trainer import Trainer
-from app.models.cbcf.training.cb_train import ContTrain
-from app.models.cbcf.training.cf_train import CollabTrain
+from app.library.model_repository.loader.factory import Factory as LoaderFactory
+from app.models.cbcf.helpers.stage_cache import StageCache
+from app.models.cbcf.training.stages import cf_similarity, cb_similarity
 from app.models.cbcf.validation.rec_val import RecVal
 from app.models.cbcf.rec_pred import RecPred
 from app.utils.serialization import load_pickle
 
+app_logger = AppLogger(app_name=ConfigTraining.APP_NAME, env=ConfigTraining.ENV)
+
 
 class RecTrain(Trainer):
 
-    def train(self, hits_data: DataFrame = None, products_data: DataFrame = None) -> Model:
+    def train(self, hits_data: DataFrame = None, products_data: DataFrame = None,
+              previous_model: RecPred = None) -> Model:
+        """
+        :param hits_data: member x brand-gender hits
+        :param products_data: products
+        :param previous_model: previously trained model, enables the incremental content-based fit.
+                               The active model of the repository when None and CB_INCREMENTAL_PARAM is enabled
+        """
         if hits_data is None or products_data is None:
             data = RecTrain._load_data_local()
             hits_data, products_data = data[0], data[1]
 
-        cf_sim_mat, cf_item_dict = CollabTrain(hits_data).fit()
+        if previous_model is None and ConfigTraining.CB_INCREMENTAL_PARAM['enabled']:
+            previous_model = RecTrain._load_previous_model()
+
+        stage_cache = StageCache.from_config()
+
+        cf_sim_mat, cf_item_dict = cf_similarity(hits_data, stage_cache)
 
-        cb_sim_mat, cb_item_dict = ContTrain(products_data).fit()
+        cb_sim_mat, cb_item_dict, cb_state = cb_similarity(products_data, stage_cache, previous_model=previous_model)
 
         rec_pred = RecPred(cf_sim_mat=cf_sim_mat,
                            cf_item_dict=cf_item_dict,
                            cb_sim_mat=cb_sim_mat,
                            cb_item_dict=cb_item_dict,
+                           cb_state=cb_state,
                            )
 
         return rec_pred
 
+    @staticmethod
+    def _load_previous_model() -> Optional[RecPred]:
+        """Active model of the repository, None when it can not be loaded and the content-based fit is full"""
+        loader = LoaderFactory.factory(ConfigTraining.MODEL_LOADER_DRIVER, ConfigTraining)
+        model_info = ModelInfo(ConfigTraining.USE_CASE_ID, ConfigTraining.MODEL_ID, ConfigTraining.MODEL_VERSION_ID,
+                               None)
+
+        try:
+            return loader.load_model(model_info)
+        except Exception as e:
+            app_logger.error(msg=f'No previous model for the incremental content-based fit, full fit: {e}',
+                             tags=['rec_train', 'incremental'])
+            return None
+
     @staticmethod
     def _load_data_local() -> Tuple:
         hits_data = load_pickle(directory=Path('./shared/'), name='hits_df.pkl')
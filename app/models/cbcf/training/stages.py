@@ -0,0 +1,64 @@
+"""
+@name: stages.py
+@overview: CF and CB similarity training stages, shared by RecTrain and RecVal through the stage cache
+"""
+import datetime
+from typing import Tuple
+
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from app.config import ConfigTraining
+from app.models.cbcf.helpers import cb_helper_function, cf_helper_function
+from app.models.cbcf.helpers.stage_cache import StageCache
+from app.models.cbcf.training import cb_state, cb_train, cf_train
+from app.models.cbcf.training.cb_state import CbState
+from app.models.cbcf.training.cb_train import ContTrain
+from app.models.cbcf.training.cf_train import CollabTrain
+
+
+def cf_similarity(hits_data: pd.DataFrame, stage_cache: StageCache,
+                  n_jobs: int = None) -> Tuple[csr_matrix, dict]:
+    """
+    :param n_jobs: worker processes of the blocked build, defaults to CF_BUILD_PARAM
+    :return: cf_sim_mat, cf_item_dict
+    """
+    return stage_cache.run(stage='cf_similarity',
+                           func=CollabTrain(hits_data, n_jobs=n_jobs).fit,
+                           data=[hits_data],
+                           params=dict(knn=ConfigTraining.CF_KNN_PARAM,
+                                       blocked=ConfigTraining.CF_BUILD_PARAM['blocked']),
+                           modules=[cf_train, cf_helper_function])
+
+
+def cb_similarity(products_data: pd.DataFrame, stage_cache: StageCache,
+                  previous_model=None) -> Tuple[csr_matrix, dict, CbState]:
+    """
+    :param previous_model: previously trained model, enables the incremental content-based fit
+    :return: cb_sim_mat, cb_item_dict, state of the fit
+    """
+    if previous_model is not None and getattr(previous_model, 'cb_state', None) is not None:
+        # an incremental fit depends on the previous model, only its corpus is cached
+        cont_train = ContTrain(products_data.copy(),
+                               previous_state=previous_model.cb_state,
+                               previous_sim_mat=previous_model.cb_sim_mat,
+                               previous_item_dict=previous_model.cb_item_dict,
+                               stage_cache=stage_cache)
+
+        return cont_train.fit() + (cont_train.state,)
+
+    def fit():
+        # the product filtering adds columns in place, which would change the fingerprint of the next run
+        cont_train = ContTrain(products_data.copy(), stage_cache=stage_cache)
+
+        return cont_train.fit() + (cont_train.state,)
+
+    # products are filtered on their age, the output changes with the day
+    params = {key: value for key, value in ConfigTraining.CB_REC_PARAM.items() if key != 'n_jobs'}
+    params.update(date=datetime.date.today().isoformat(), incremental=ConfigTraining.CB_INCREMENTAL_PARAM)
+
+    return stage_cache.run(stage='cb_similarity',
+                           func=fit,
+                           data=[products_data],
+                           params=params,
+                           modules=[cb_train, cb_helper_function, cb_state])
@@ -0,0 +1,134 @@
+"""
+@name: batch_scoring.py
+@overview: Scores all validation members with one sparse product, same output as the former per member predictions
+           of RecVal, kept as the reference in tests/fixtures.py
+"""
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# genders kept by the per member validation scoring
+VAL_GENDERS = (0, 1)
+
+
+def user_item_matrix(hits: pd.DataFrame, users: np.ndarray, item_dict: dict, n_items: int) -> csr_matrix:
+    """
+    :param hits: ['memberID', 'b_g', 'total_hits'], the last row of a member and brand-gender wins
+    :param users: members of the rows, in order
+    :param item_dict: {item code: b_g} of the columns
+    :param n_items: number of columns
+    :return: member x item total hits
+    """
+    codes = pd.Series(list(item_dict.keys()), index=list(item_dict.values()))
+
+    hits = hits[hits['memberID'].isin(users)].drop_duplicates(['memberID', 'b_g'], keep='last')
+    rows = pd.Index(users).get_indexer(hits['memberID'])
+    cols = codes.reindex(hits['b_g'].values).values
+    known = ~np.isnan(cols)
+
+    return csr_matrix((hits['total_hits'].values[known].astype(np.float64), (rows[known], cols[known].astype(np.int64))),
+                      shape=(len(users), n_items))
+
+
+def _item_labels(item_dict: dict, n_items: int):
+    """brand, gender and b_g of each item code, parsed once"""
+    labels = pd.Series(item_dict).reindex(np.arange(n_items)).fillna('-1 -1')
+    brand_gender = labels.str.split(' ', n=1, expand=True)
+    brand = brand_gender[0].values.astype('int16')
+    gender = brand_gender[1].values.astype('int8')
+
+    return brand, gender, (pd.Series(brand).astype(str) + ' ' + pd.Series(gender).astype(str)).values
+
+
+def _top_n_block(user_items: csr_matrix, sim_mat: csr_matrix, item_gender: np.ndarray, n_rec: int):
+    """:return: row, col and normalized score of the kept recommendations, ranked within each row"""
+    scores = (user_items @ sim_mat).tocoo()
+    liked = user_items.tocoo()
+    n_items = sim_mat.shape[1]
+
+    candidate = ~np.isin(scores.row.astype(np.int64) * n_items + scores.col,
+                         liked.row.astype(np.int64) * n_items + liked.col)
+    row, col, score = scores.row[candidate], scores.col[candidate], scores.data[candidate]
+
+    keep = ~np.isin(row, np.unique(row[score < 0])) & np.isin(item_gender[col], VAL_GENDERS)
+    row, col, log_score = row[keep], col[keep], np.log1p(score[keep])
+    gender = item_gender[col]
+
+    # best first within a member and gender, then the n_rec head of each gender
+    order = np.lexsort((-log_score, gender, row))
+    row, col, log_score, gender = row[order], col[order], log_score[order], gender[order]
+
+    group_start = np.ones(len(row), dtype=bool)
+    group_start[1:] = (row[1:] != row[:-1]) | (gender[1:] != gender[:-1])
+    group_id = np.cumsum(group_start) - 1
+    head = np.arange(len(row)) - np.flatnonzero(group_start)[group_id] < n_rec
+
+    # the best of each group comes first
+    score = log_score / log_score[group_start][group_id]
+    row, col, gender, score = row[head], col[head], gender[head], score[head]
+
+    # ranked on the unrounded score, gender 1 before gender 0 on equal scores, then rounded as the per member
+    # scoring did
+    order = np.lexsort((-gender, -score, row))
+
+    return row[order], col[order], np.round(score[order], 6)
+
+
+def top_n_recommendations(users: np.ndarray, train_hits: pd.DataFrame, sim_mat: csr_matrix, item_dict: dict,
+                          n_rec: int, block_size: int = 2000) -> pd.DataFrame:
+    """
+    Recommendations of RecVal.predict for every member at once: items already liked are excluded,
+    members with a negative score get none, the n_rec best items of each gender are kept and
+    their log1p scores divided by the best of the gender.
+
+    :param block_size: number of members scored by one sparse product
+    :return: ['brand', 'gender', 'score', 'liked', 'b_g', 'memberID'], members in the order of users,
+             scores descending within a member
+    """
+    user_items = user_item_matrix(train_hits, users, item_dict, sim_mat.shape[0])
+    item_brand, item_gender, item_b_g = _item_labels(item_dict, sim_mat.shape[1])
+
+    rows, cols, scores = [], [], []
+    for start in range(0, len(users), block_size):
+        row, col, score = _top_n_block(user_items[start:start + block_size], sim_mat, item_gender, n_rec)
+        rows.append(row + start)
+        cols.append(col)
+        scores.append(score)
+
+    row, col = np.concatenate(rows or [[]]).astype(np.int64), np.concatenate(cols or [[]]).astype(np.int64)
+
+    return pd.DataFrame({'brand': item_brand[col],
+                         'gender': item_gender[col],
+                         'score': np.concatenate(scores or [[]]).astype(np.float64),
+                         'liked': np.zeros(len(col), dtype=bool),
+                         'b_g': item_b_g[col],
+                         'memberID': np.asarray(users)[row]})
+
+
+def validation_frame(users: np.ndarray, test_hits: pd.DataFrame, pred: pd.DataFrame) -> pd.DataFrame:
+    """
+    The per member validation lists of every member at once.
+
+    :param users: members to validate, in order
+    :param test_hits: held out ['memberID', 'gender', 'b_g']
+    :param pred: ranked ['memberID', 'gender', 'b_g'], best first within a member
+    :return: ['memberID', 'gender', 'test', 'pred'], one row per member and gender with held out hits
+    """
+    test = test_hits[test_hits['memberID'].isin(users) & test_hits['gender'].isin(VAL_GENDERS)]
+
+    if test.empty:
+        return pd.DataFrame()
+
+    test = test.assign(user=pd.Index(users).get_indexer(test['memberID']), gender=test['gender'].astype(np.int64))
+    test_lists = test.groupby(['user', 'gender'], sort=True)['b_g'].agg(list)
+
+    pred_lists = pred.groupby(['memberID', pred['gender'].astype(np.int64)], sort=False)['b_g'].agg(list).to_dict() \
+        if not pred.empty else dict()
+
+    member_ids = np.asarray(users)[test_lists.index.get_level_values('user')]
+    genders = test_lists.index.get_level_values('gender')
+
+    return pd.DataFrame({'memberID': member_ids,
+                         'gender': genders,
+                         'test': test_lists.values,
+                         'pred': [pred_lists.get(key, []) for key in zip(member_ids, genders)]})
@@ -0,0 +1,145 @@
+"""
+@name: rec_cv.py
+@overview: Cross-validation of CF, CB and the hybrid over every position of the validation cycle
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from typing import Tuple
+
+from app.config import Config
+from app.models.cbcf.helpers.metrics import batch_avg_metrics
+from app.models.cbcf.helpers.stage_cache import StageCache
+from app.models.cbcf.training.stages import cf_similarity, cb_similarity
+from app.models.cbcf.validation.rec_val import RecVal, REFERENCE_DATA_PARAMS
+from ssense_logger.app_logger import AppLogger
+
+# Initialize Logger
+app_logger = AppLogger(app_name=Config.APP_NAME, env=Config.ENV)
+
+
+CV_PARAMS = dict(n_jobs=Config.CV_N_JOBS,
+                 n_users=Config.CV_N_USERS,
+                 seed=Config.CV_SEED)
+
+# hits with their cycle position, products and CB model, set once per worker process by _init_cv_worker
+_CV_DATA = {}
+
+
+def _init_cv_worker(hits_sub: pd.DataFrame, products: pd.DataFrame, cb_sim_mat: csr_matrix, cb_item_dict: dict):
+    _CV_DATA.update(hits_sub=hits_sub, products=products, cb_sim_mat=cb_sim_mat, cb_item_dict=cb_item_dict)
+
+
+def _val_rows(val_df: pd.DataFrame, k_val: int, **keys) -> list:
+    """:return: metrics of each gender of validation lists, with keys"""
+    rows = []
+    for genderT, gender_name in ((0, 'women'), (1, 'men')):
+
+        val_gender = val_df[val_df.gender == genderT] if not val_df.empty else val_df
+
+        if not val_gender.empty:
+            rows.append(dict(keys, gender=gender_name, n_members=val_gender.shape[0],
+                             **batch_avg_metrics(val_gender.test.tolist(), val_gender.pred.tolist(), k_val)))
+
+    return rows
+
+
+def _cv_fold(fold: int, seed: int, n_users: int) -> list:
+    """
+    Trains CF on the hits outside the fold and validates CF, CB and the hybrid on the fold
+    :return: metrics of each model and gender
+    """
+    start_time = time.perf_counter()
+    hits_sub = _CV_DATA['hits_sub']
+
+    test_rows = hits_sub['count_roll'].values == fold
+    train_hits = hits_sub[~test_rows].drop(columns=['count_roll'])
+    test_hits = hits_sub[test_rows].drop(columns=['count_roll'])
+
+    members = train_hits.memberID.unique()
+    users_array = np.random.RandomState(seed).choice(members, size=min(n_users, len(members)), replace=False)
+
+    rec_val = RecVal(train_hits, _CV_DATA['products'])
+
+    # one process per fold already, and the training state and stage cache of production are left alone
+    cf_sim_mat, cf_item_dict = cf_similarity(train_hits, StageCache(), n_jobs=1)
+    cf_df, cf_val_df = rec_val.batch_predict(users_array, train_hits, test_hits, cf_sim_mat, cf_item_dict)
+
+    cb_df, cb_val_df = rec_val.batch_predict(users_array, train_hits, test_hits,
+                                             _CV_DATA['cb_sim_mat'], _CV_DATA['cb_item_dict'])
+
+    _, cbf_val_df = rec_val._rec_agg(cf_df, RecVal._rescale_cb(cb_df, cf_df), test_hits)
+
+    rows = []
+    for model, val_df in (('cf', cf_val_df), ('cb', cb_val_df), ('hybrid', cbf_val_df)):
+        rows.extend(_val_rows(val_df, rec_val.k_val, fold=fold, model=model))
+
+    app_logger.info(msg=f'Fold {fold}: {train_hits.shape[0]} train and {test_hits.shape[0]} test rows, '
+                        f'{len(users_array)} members in {round(time.perf_counter() - start_time, 2)}s',
+                    tags=['validation', 'cross_validation'])
+
+    return rows
+
+
+class RecCrossVal(object):
+
+    def __init__(self, hits: pd.DataFrame, products: pd.DataFrame):
+
+        self.rec_val = RecVal(hits, products)
+        self.n_folds = REFERENCE_DATA_PARAMS['cycle_count']
+        self.n_jobs = CV_PARAMS['n_jobs']
+        self.n_users = CV_PARAMS['n_users']
+        self.seed = CV_PARAMS['seed']
+
+    @staticmethod
+    def _summary(scores: pd.DataFrame) -> pd.DataFrame:
+        """:return: mean and variance over the folds of each metric, per model and gender"""
+        metrics = [column for column in scores.columns if column.startswith('avg_')]
+
+        summary = scores.groupby(['model', 'gender'])[metrics].agg(['mean', 'var'])
+        summary.columns = [f'{metric}_{stat}' for metric, stat in summary.columns]
+
+        return summary.reset_index()
+
+    def model_cv(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Validates every position of the cycle in turn: the folds come from one pass over the hits and are
+        trained and validated in a process pool, each with its own seed drawn from seed.
+        CB does not depend on the hits, it is trained once and shared by the folds.
+        :return: metrics per fold, model and gender, and their mean and variance per model and gender
+        """
+        start_time = time.perf_counter()
+        rec_val = self.rec_val
+
+        rec_val.hits_data = rec_val._brand_gender_split()
+        hits_sub = rec_val._cycle_positions()
+
+        cb_sim_mat, cb_item_dict, _ = cb_similarity(rec_val.products_data, rec_val.stage_cache)
+
+        folds = list(range(self.n_folds))
+        seeds = np.random.RandomState(self.seed).randint(0, np.iinfo(np.int32).max, size=len(folds)).tolist()
+        n_jobs = min(self.n_jobs, len(folds))
+        init_args = (hits_sub, rec_val.products_data, cb_sim_mat, cb_item_dict)
+
+        if n_jobs <= 1:
+            _init_cv_worker(*init_args)
+            try:
+                rows = [_cv_fold(fold, seed, self.n_users) for fold, seed in zip(folds, seeds)]
+            finally:
+                _CV_DATA.clear()
+        else:
+            # forked workers share the inputs read-only instead of receiving copies per fold
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_cv_worker, initargs=init_args) as executor:
+                rows = list(executor.map(_cv_fold, folds, seeds, [self.n_users] * len(folds)))
+
+        scores = pd.DataFrame([row for fold_rows in rows for row in fold_rows])
+        summary = RecCrossVal._summary(scores)
+
+        app_logger.info(msg=f'Cross-validation: {len(folds)} folds in {round(time.perf_counter() - start_time, 2)}s, '
+                            f'{n_jobs} jobs\n{summary.to_string(index=False)}',
+                        tags=['validation', 'cross_validation'])
+
+        return scores, summary
@@ -16,12 +16,15 @@ class ValidationMetrics(object):
 
     def grouping_score_ranked(self):
 
-        methods = {'maf_at_k': avg_f1_at_k}
+        # maf_at_k is avg_f1_at_k, computed over all users in one pass
+        methods = {'maf_at_k': 'avg_f1_at_k'}
+
+        scores = batch_avg_metrics(self.actual, self.predict, self.k_val)
 
         metrics = dict()
 
         for key in methods:
 
-            metrics.update({key: [methods.get(key)(self.actual, self.predict, self.k_val)]})
+            metrics.update({key: [scores[methods.get(key)]]})
 
         return metrics
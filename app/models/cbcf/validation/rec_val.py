@@ -3,15 +3,18 @@
 @author: Mohammad Jeihoonian
 Created on Jan 2020
 """
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 from typing import Tuple
-from scipy.sparse import csr_matrix
 
 from app.config import Config
-from app.models.cbcf.training.cb_train import ContTrain
-from app.models.cbcf.training.cf_train import CollabTrain
-from app.utils.exception_decorator import exception_decorator
+from app.models.cbcf.helpers.stage_cache import StageCache
+from app.models.cbcf.training.stages import cf_similarity, cb_similarity
+from app.models.cbcf.validation.batch_scoring import top_n_recommendations, validation_frame
+from app.models.cbcf.helpers.metrics import batch_avg_metrics
 from app.models.cbcf.validation.rec_metrics import ValidationMetrics
 from ssense_logger.app_logger import AppLogger
 
@@ -24,6 +27,11 @@ VAL_PARAMS = dict(n_val=Config.N_VAL,
                   alpha_val=Config.ALPHA_VAL,
                   strategy=Config.STRATEGY)
 
+SWEEP_PARAMS = dict(alphas=Config.ALPHA_SWEEP,
+                    n_recs=Config.N_VAL_SWEEP,
+                    k_vals=Config.K_VAL_SWEEP,
+                    n_jobs=Config.SWEEP_N_JOBS)
+
 REFERENCE_DATA_PARAMS = dict(
     # These vars are used to collect the reference point data. It's not run often, but refreshed
     # every once in a while for sanity checks when training the models.
@@ -42,15 +50,7 @@ class RecVal(object):
         self.k_val = VAL_PARAMS['k_val']
         self.alpha_val = VAL_PARAMS['alpha_val']
         self.strategy = VAL_PARAMS['strategy']
-
-    @staticmethod
-    def _gender_processing(dataset):
-
-        dataset = dataset.copy()
-        dataset = dataset.assign(norm_score=lambda x: x.log_score / dataset.log_score.max())
-        dataset.rename(columns={'norm_score': 'score'}, inplace=True)
-
-        return dataset[['brand', 'gender', 'score', 'liked']]
+        self.stage_cache = StageCache.from_config()
 
     @staticmethod
     def train(class_obj):
@@ -61,51 +61,22 @@ class RecVal(object):
 
     @staticmethod
     def _rescale_cb(dataset, ref_dataset) -> pd.DataFrame:
+        """
+        Maps the CB scores of each gender onto [lowest CF score of the gender, 1]
+        """
+        dataset = dataset[dataset.gender.isin([0, 1])]
 
-        def interp_func(x, lb):
-            return ((x - min(x)) / (1 - min(x))) * (1 - lb) + lb
-
-        dataset_out = pd.DataFrame()
-
-        for gender in [0, 1]:
-
-            dataset_sub = dataset[dataset.gender == gender].copy()
-
-            if dataset_sub.empty:
-                continue
-
-            lower_bound = ref_dataset.groupby('gender')['score'].apply(min)[gender]
-
-            dataset_sub = dataset_sub.assign(score=lambda x: interp_func(x['score'], lb=lower_bound))
-
-            dataset_out = dataset_out.append(dataset_sub)
-
-        return dataset_out.sort_values(by='score', ascending=False).reset_index(drop=True)
-
-    @staticmethod
-    def _val_prep(userId, act, pred):
-
-        df = pd.DataFrame()
-
-        for genderT in (0, 1):
-
-            if not act[act.gender == genderT].empty:
-
-                dataset = pd.DataFrame({'memberID': [userId]})
-
-                dataset = dataset.assign(gender=genderT,
-                                         test=np.empty((dataset.shape[0], 0)).tolist(),
-                                         pred=np.empty((dataset.shape[0], 0)).tolist())
-
-                dataset.at[0, 'test'] = list(act[act.gender == genderT].b_g.tolist())
-
-                dataset.at[0, 'pred'] = list(pred[pred.gender == genderT].b_g.tolist())
+        lower_bound = dataset.gender.map(ref_dataset.groupby('gender')['score'].min())
+        if lower_bound.isnull().any():
+            raise KeyError('no reference score for genders ' + str(dataset.gender[lower_bound.isnull()].unique()))
 
-                df = df.append(dataset)
+        min_score = dataset.groupby('gender')['score'].transform('min')
 
-        if not df.empty:
+        dataset = dataset.assign(score=((dataset.score - min_score) / (1 - min_score)) * (1 - lower_bound) + lower_bound)
 
-            return df
+        # gender 0 before gender 1 on equal scores, as the per gender concatenation did
+        return dataset.sort_values(by=['score', 'gender'], ascending=[False, True]) \
+            .reset_index(drop=True)
 
     def _brand_gender_split(self):
 
@@ -115,10 +86,10 @@ class RecVal(object):
 
         return self.hits_data
 
-    def _train_test_split(self):
+    def _cycle_positions(self) -> pd.DataFrame:
         """
         Label the parameters as a cycle of labels
-        :return: train and test sets
+        :return: hits of the members and genders above bg_cutpoint, with their position in the cycle in count_roll
         """
         app_logger.info(msg=f'Incoming data has {self.hits_data.shape[0]} rows for {self.hits_data.memberID.nunique()} members')
         hits_sub = self.hits_data.copy()
@@ -133,10 +104,18 @@ class RecVal(object):
         # take modulo (rolling count of brand genders per member)
         hits_sub['count_roll'] = hits_sub.groupby(['memberID', 'gender']).cumcount() % REFERENCE_DATA_PARAMS[
             'cycle_count']
+        app_logger.info(msg=f'Outgoing data has {hits_sub.shape[0]} rows for {hits_sub.memberID.nunique()} members')
+
+        return hits_sub
+
+    def _train_test_split(self):
+        """
+        :return: train and test sets, the test set is one random position of the cycle
+        """
+        hits_sub = self._cycle_positions()
         random_row = np.random.randint(0, REFERENCE_DATA_PARAMS['cycle_count'])
         # assign random row within each cycle to be for out-of-sample validation test
         hits_sub['test_train'] = np.where(hits_sub['count_roll'] == random_row, 'test', 'train')
-        app_logger.info(msg=f'Outgoing data has {hits_sub.shape[0]} rows for {hits_sub.memberID.nunique()} members')
         train_set = hits_sub[hits_sub.test_train == 'train'].copy()
         train_set.drop(['test_train', 'count_roll'], axis=1, inplace=True)
         app_logger.info(msg=f'The number of users in train set: {train_set["memberID"].nunique()}', tags=['check_data'])
@@ -146,100 +125,26 @@ class RecVal(object):
 
         return train_set, test_set
 
-    def _post_process_rec(self, dataset):
+    def batch_predict(self, users_array, train_hits, test_hits, sim_mat, item_dict, n_rec: int = None):
         """
-        Process recommendations
-        :param dataset
-        :return dataset
+        Predictions and validation lists of all sampled members, scored with one sparse product
+        :param n_rec: recommendations kept per member and gender, defaults to n_val
+        :return: predictions ['brand', 'gender', 'score', 'liked', 'b_g', 'memberID'] and
+                 validation lists ['memberID', 'gender', 'test', 'pred']
         """
+        pred_df = top_n_recommendations(users_array, train_hits, sim_mat, item_dict,
+                                        n_rec=self.n_rec if n_rec is None else n_rec)
 
-        dataset = dataset.assign(log_score=lambda x: np.log1p(x.score))
-        dataset.drop(columns=['score'], axis=1, inplace=True)
-
-        dataset.brand = dataset.brand.astype('int16')
-        dataset.gender = dataset.gender.astype('int8')
+        val_df = validation_frame(users_array, test_hits, pred_df)
 
-        proc_dataset = pd.DataFrame()
-        for genderT in (1, 0):
-            dataset_gender = dataset[dataset.gender == genderT].head(self.n_rec).copy()
-            dataset_gender = RecVal._gender_processing(dataset_gender)
-            proc_dataset = proc_dataset.append(dataset_gender, sort=False)
-
-        proc_dataset.sort_values(by='score', ascending=False, inplace=True)
-        proc_dataset.reset_index(inplace=True, drop=True)
-
-        proc_dataset.score = np.round(proc_dataset.score, decimals=6)
-
-        return proc_dataset
-
-    @exception_decorator
-    def _rec_predict(self, user_data, sim_mat: csr_matrix, item_dict: dict):
+        return pred_df, val_df
 
+    @staticmethod
+    def _rec_join(cf_rec: pd.DataFrame, cb_rec: pd.DataFrame) -> pd.DataFrame:
         """
-        :return recommendations for each user in the dataset
+        CF and CB recommendations side by side, independent of alpha
+        :return: ['memberID', 'brand', 'gender', 'score_cf', 'liked_cf', 'score_cb', 'liked_cb', ...]
         """
-
-        user_data_dict = dict(zip(user_data.b_g, user_data.total_hits))
-
-        user_items = np.zeros(len(item_dict))
-        for i in range(user_items.shape[0]):
-            if item_dict[i] in list(user_data_dict):
-                user_items[i] = user_data_dict[item_dict[i]]
-
-        user_items = user_items.reshape(1, -1)
-        user_items = csr_matrix(user_items)
-
-        # Compute dot product
-        rec_mat = user_items @ sim_mat
-
-        result = []
-        liked = set(user_items.indices)
-        user_indices, user_scores = rec_mat.indices, rec_mat.data
-        best = sorted(zip(user_indices, user_scores), key=lambda x: -x[1])
-        tagged_best = [rec + (False,) for rec in best if rec[0] not in liked]
-        result.extend([(item_dict[rid].split(' ')[0], item_dict[rid].split(' ')[1],
-                        score, flag_brx) for rid, score, flag_brx in tagged_best])
-
-        rec = pd.DataFrame(result, columns=['brand', 'gender', 'score', 'liked'])
-
-        if rec.score.lt(0).any():
-            return pd.DataFrame(columns=['brand', 'gender', 'score', 'liked'])
-
-        return self._post_process_rec(rec)
-
-    def predict(self, user_train_hits, sim_mat, item_dict):
-
-        rec_df = self._rec_predict(user_train_hits, sim_mat, item_dict)
-
-        rec_df = rec_df.assign(b_g=lambda x: x.brand.astype('str') + ' ' + x.gender.astype('str'))
-
-        return rec_df
-
-    def batch_predict(self, users_array, train_hits, test_hits, sim_mat, item_dict):
-
-        pred_df = pd.DataFrame()
-        val_df = pd.DataFrame()
-
-        for userId in users_array:
-
-            user_train_hits = train_hits[train_hits.memberID == userId].copy()
-
-            pred = self.predict(user_train_hits, sim_mat, item_dict)
-
-            pred = pred.assign(memberID=userId)
-
-            pred_df = pred_df.append(pred)
-
-            val = RecVal._val_prep(userId, test_hits[test_hits.memberID == userId], pred)
-
-            val_df = val_df.append(val)
-
-        val_df.reset_index(inplace=True, drop=True)
-
-        return pred_df, val_df
-
-    def _rec_agg(self, cf_rec: pd.DataFrame, cb_rec: pd.DataFrame, test_hits: pd.DataFrame) -> Tuple:
-
         cbf = cf_rec.set_index(['memberID', 'brand', 'gender'])\
             .join(cb_rec.set_index(['memberID', 'brand', 'gender']),
                   how='outer', lsuffix='_cf', rsuffix='_cb')
@@ -247,29 +152,35 @@ class RecVal(object):
         cbf.reset_index(inplace=True)
         cbf.liked_cf.fillna(cbf.liked_cb, inplace=True)
         cbf.liked_cb.fillna(cbf.liked_cf, inplace=True)
+
+        return cbf
+
+    @staticmethod
+    def _rec_blend(cbf: pd.DataFrame, alpha: float) -> pd.DataFrame:
+        """
+        Hybrid recommendations of joined CF and CB recommendations
+        :return: ['memberID', 'brand', 'gender', 'score', 'liked', 'b_g'], scores descending within a member
+        """
         cbf = cbf.assign(score=lambda x: np.where(x.score_cf.isnull(),
                                                   x.score_cb,
                                                   np.where(
                                                       x.score_cb.isnull(),
                                                       x.score_cf,
-                                                      ((self.alpha_val * x.score_cb) + ((1 - self.alpha_val) * x.score_cf)))),
+                                                      ((alpha * x.score_cb) + ((1 - alpha) * x.score_cf)))),
                          liked=lambda x: np.where(x.liked_cf == x.liked_cb, x.liked_cf, x.liked_cf)
                          )
         cbf = cbf.sort_values(by=['memberID', 'score'], ascending=[True, False])
         cbf.reset_index(drop=True, inplace=True)
 
         cbf = cbf[['memberID', 'brand', 'gender', 'score', 'liked']]
-        cbf = cbf.assign(b_g=lambda x: x.brand.astype('str') + ' ' + x.gender.astype('str'))
 
-        val_df = pd.DataFrame()
+        return cbf.assign(b_g=lambda x: x.brand.astype('str') + ' ' + x.gender.astype('str'))
 
-        for userId in cbf.memberID.unique():
-
-            val = RecVal._val_prep(userId, test_hits[test_hits.memberID == userId], cbf[cbf.memberID == userId])
+    def _rec_agg(self, cf_rec: pd.DataFrame, cb_rec: pd.DataFrame, test_hits: pd.DataFrame) -> Tuple:
 
-            val_df = val_df.append(val)
+        cbf = RecVal._rec_blend(RecVal._rec_join(cf_rec, cb_rec), self.alpha_val)
 
-        val_df.reset_index(inplace=True, drop=True)
+        val_df = validation_frame(cbf.memberID.unique(), test_hits, cbf)
 
         return cbf, val_df
 
@@ -299,11 +210,11 @@ class RecVal(object):
 
         users_array = np.random.choice(train_hits.memberID.unique(), size=10000, replace=False)
 
-        cf_sim_mat, cf_item_dict = self.train(CollabTrain(train_hits))
+        cf_sim_mat, cf_item_dict = cf_similarity(train_hits, self.stage_cache)
         cf_df, cf_val_df = self.batch_predict(users_array, train_hits, test_hits, cf_sim_mat, cf_item_dict)
 
         self._val_score_gender(cf_val_df)
-        cb_sim_mat, cb_item_dict = self.train(ContTrain(self.products_data))
+        cb_sim_mat, cb_item_dict, _ = cb_similarity(self.products_data, self.stage_cache)
         cb_df, cb_val_df = self.batch_predict(users_array, train_hits, test_hits, cb_sim_mat, cb_item_dict)
 
         self._val_score_gender(cb_val_df)
@@ -313,3 +224,101 @@ class RecVal(object):
         cbf_df, cbf_val_df = self._rec_agg(cf_df, cb_df, test_hits)
 
         return self._val_score_gender(cbf_val_df)
+
+    def model_sweep(self) -> pd.DataFrame:
+        """
+        Validation metrics of the hybrid over the alpha, n_rec and k_val grid of SWEEP_PARAMS.
+        CF and CB are trained and scored once for the largest n_rec, each point of the grid only
+        recombines those scores.
+        :return: one row per n_rec, alpha, k_val and gender
+        """
+        self.hits_data = self._brand_gender_split()
+
+        train_hits, test_hits = self._train_test_split()
+
+        users_array = np.random.choice(train_hits.memberID.unique(), size=10000, replace=False)
+        n_rec = max(SWEEP_PARAMS['n_recs'])
+
+        cf_sim_mat, cf_item_dict = cf_similarity(train_hits, self.stage_cache)
+        cf_df, _ = self.batch_predict(users_array, train_hits, test_hits, cf_sim_mat, cf_item_dict, n_rec=n_rec)
+
+        cb_sim_mat, cb_item_dict, _ = cb_similarity(self.products_data, self.stage_cache)
+        cb_df, _ = self.batch_predict(users_array, train_hits, test_hits, cb_sim_mat, cb_item_dict, n_rec=n_rec)
+
+        table = hybrid_sweep(cf_df, cb_df, test_hits, **SWEEP_PARAMS)
+
+        app_logger.info(msg=f'Hybrid sweep:\n{table.to_string(index=False)}', tags=['validation', 'sweep'])
+
+        return table
+
+
+# CF and CB predictions and held out hits of the sweep, set once per worker process by _init_sweep_worker
+_SWEEP_DATA = {}
+
+
+def _init_sweep_worker(cf_rec: pd.DataFrame, cb_rec: pd.DataFrame, test_hits: pd.DataFrame):
+    _SWEEP_DATA.update(cf_rec=cf_rec, cb_rec=cb_rec, test_hits=test_hits)
+
+
+def _head(rec: pd.DataFrame, n_rec: int) -> pd.DataFrame:
+    """n_rec best of each member and gender, the predictions RecVal.batch_predict makes for that n_rec"""
+    return rec[rec.groupby(['memberID', 'gender']).cumcount() < n_rec]
+
+
+def _sweep_n_rec(n_rec: int, alphas: list, k_vals: list) -> list:
+    """:return: metrics of each alpha, k_val and gender for one n_rec, the join of CF and CB is shared by the alphas"""
+    cf_rec = _head(_SWEEP_DATA['cf_rec'], n_rec)
+    cb_rec = RecVal._rescale_cb(_head(_SWEEP_DATA['cb_rec'], n_rec), cf_rec)
+    joined = RecVal._rec_join(cf_rec, cb_rec)
+
+    rows = []
+    for alpha in alphas:
+
+        cbf = RecVal._rec_blend(joined, alpha)
+        val_df = validation_frame(cbf.memberID.unique(), _SWEEP_DATA['test_hits'], cbf)
+
+        for genderT, gender_name in ((0, 'women'), (1, 'men')):
+
+            val_gender = val_df[val_df.gender == genderT] if not val_df.empty else val_df
+
+            if not val_gender.empty:
+
+                for k_val in k_vals:
+                    rows.append(dict(n_rec=n_rec, alpha=alpha, k_val=k_val, gender=gender_name,
+                                     n_members=val_gender.shape[0],
+                                     **batch_avg_metrics(val_gender.test.tolist(), val_gender.pred.tolist(), k_val)))
+
+    return rows
+
+
+def hybrid_sweep(cf_rec: pd.DataFrame, cb_rec: pd.DataFrame, test_hits: pd.DataFrame,
+                 alphas: list, n_recs: list, k_vals: list, n_jobs: int = 1) -> pd.DataFrame:
+    """
+    Validation metrics of the hybrid for each n_rec, alpha and k_val, from predictions scored once
+
+    :param cf_rec: CF predictions of RecVal.batch_predict for the largest n_rec
+    :param cb_rec: CB predictions of RecVal.batch_predict for the largest n_rec, not rescaled
+    :param test_hits: held out ['memberID', 'gender', 'b_g']
+    :param n_jobs: number of worker processes, one n_rec each, each holds its own copy of the predictions
+    :return: ['n_rec', 'alpha', 'k_val', 'gender', 'n_members', 'avg_recall_at_k', ...]
+    """
+    start_time = time.perf_counter()
+    n_recs, alphas = sorted(n_recs), sorted(alphas)
+    n_jobs = min(n_jobs, len(n_recs))
+
+    if n_jobs <= 1:
+        _init_sweep_worker(cf_rec, cb_rec, test_hits)
+        try:
+            rows = [_sweep_n_rec(n_rec, alphas, k_vals) for n_rec in n_recs]
+        finally:
+            _SWEEP_DATA.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_sweep_worker,
+                                 initargs=(cf_rec, cb_rec, test_hits)) as executor:
+            rows = list(executor.map(_sweep_n_rec, n_recs, [alphas] * len(n_recs), [k_vals] * len(n_recs)))
+
+    app_logger.info(msg=f'Hybrid sweep: {len(n_recs)} n_rec, {len(alphas)} alpha, {len(k_vals)} k_val '
+                        f'in {round(time.perf_counter() - start_time, 2)}s, {n_jobs} jobs',
+                    tags=['validation', 'sweep'])
+
+    return pd.DataFrame([row for point_rows in rows for row in point_rows])
@@ -7,6 +7,7 @@ import time
 import json
 
 from app.config import Config
+from app.utils.stage_timer import stage_timer
 
 
 class RedisRepository:
@@ -15,11 +16,14 @@ class RedisRepository:
     _REDIS_PIPE_SIZE = 1000
     _REDIS_LPUSH_BLOCK_SIZE = 1000
 
-    def __init__(self, config: Config, app_logger: AppLogger):
-        self.redis = StrictRedis(host=config.REDIS_HOST,
-                                 port=config.REDIS_PORT,
-                                 encoding="utf-8",
-                                 decode_responses=True)
+    def __init__(self, config: Config, app_logger: AppLogger, redis: StrictRedis = None):
+        """
+        :param redis: client decoding responses, a client of config.REDIS_HOST when None
+        """
+        self.redis = redis if redis is not None else StrictRedis(host=config.REDIS_HOST,
+                                                                 port=config.REDIS_PORT,
+                                                                 encoding="utf-8",
+                                                                 decode_responses=True)
         self.app_logger = app_logger
 
     def batch_save(self, data: pd.DataFrame):
@@ -49,13 +53,44 @@ class RedisRepository:
         :return: an array of CustomerInteractions
         """
 
-        user_data_json = self.redis.get(f'scores:u:{member_id}')
+        with stage_timer.stage('predict.redis_get'):
+            user_data_json = self.redis.get(f'scores:u:{member_id}')
         if user_data_json is not None:
-            user_data = pd.read_json(user_data_json)
+            with stage_timer.stage('predict.json_decode'):
+                user_data = pd.read_json(user_data_json)
             return user_data
 
         return pd.DataFrame()
 
+    def open_connections(self, n_connections: int):
+        """
+        Connects n_connections of the pool and puts them back, so that the first requests do not pay for it
+        """
+        pool = self.redis.connection_pool
+        connections = [pool.get_connection('PING') for _ in range(n_connections)]
+        try:
+            for connection in connections:
+                connection.connect()
+        finally:
+            for connection in connections:
+                pool.release(connection)
+
+    def sample_member_ids(self, n_members: int) -> List[int]:
+        """
+        :return: up to n_members distinct member ids with interactions, drawn with RANDOMKEY
+        """
+        member_ids = set()
+        for _ in range(2 * n_members):
+            key = self.redis.randomkey()
+            if key is None:
+                break
+            if key.startswith('scores:u:'):
+                member_ids.add(int(re.sub('scores:u:', '', key)))
+            if len(member_ids) == n_members:
+                break
+
+        return list(member_ids)
+
     def get_all_member_ids(self) -> List[int]:
         """
         :return: an array of integers containing all the available member ids with available user interactions
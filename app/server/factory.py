@@ -1,7 +1,9 @@
+import time
 from typing import Tuple, Type, Dict, NoReturn
 
 from flask_injector import FlaskInjector
 import injector
+from ddtrace import tracer
 import ldclient
 from flask import Flask
 from flask_restful import Api
@@ -10,10 +12,11 @@ from redis import StrictRedis
 from app.config import Config
 from app.entities.model.model_info import ModelInfo
 from ssense_logger.app_logger import AppLogger
-from app.library.model_repository.loader.driver.filesystem import Filesystem
-from app.library.model_repository.repository import Repository
+from app.library.model_repository.loader.factory import Factory as LoaderFactory
 from app.server.middlewares.error_middleware import add_error_handler
+from app.server.metrics import MODEL_INFO, MODEL_LOAD_SECONDS, observe_stage
 from app.server.middlewares.record_access_log import record_access_log
+from app.server.middlewares.record_metrics import record_metrics
 from app.server.middlewares.record_request_id import record_request_id
 from app.server.middlewares.record_time_of_request import record_time_of_request
 from app.server.providers import AppLoggerModule
@@ -22,12 +25,18 @@ from app.server.resources.home import Home
 from app.server.resources.predict import Predict
 from app.server.resources.readiness import Readiness
 from app.server.resources.liveness import Liveness
+from app.server.resources.metrics import Metrics
 from app.server.services.predict import PredictService
+from app.server.services.warm_up import WarmUpService
 from app.repositories.redis_repository import RedisRepository
+from app.utils.stage_timer import stage_timer
 
 
 def create_app(config: Type[Config] = Config, custom_injector: injector.Injector = None,
-               injector_modules=None) -> Tuple[Flask, Api]:
+               injector_modules=None, redis_repository: RedisRepository = None) -> Tuple[Flask, Api]:
+    """
+    :param redis_repository: customer interactions of the predictions, read from config.REDIS_HOST when None
+    """
     app = Flask(__name__)
     api = Api(app)
 
@@ -36,6 +45,8 @@ def create_app(config: Type[Config] = Config, custom_injector: injector.Injector
 
     """----------------- Dependencies -----------------"""
     app_logger = AppLogger(app_name=config.APP_NAME, env=config.ENV)
+    stage_timer.tracer = tracer if config.STAGE_TIMER_TRACE else None
+    stage_timer.recorder = observe_stage
 
     """----------------- Middleware ---------------------"""
     # Before Request
@@ -44,15 +55,16 @@ def create_app(config: Type[Config] = Config, custom_injector: injector.Injector
                                        record_request_id]}
 
     # After Request
-    # Perform this function after every request.
+    # Perform these functions after every request, in the reverse order of their registration.
     app.after_request(record_access_log)
+    app.after_request(record_metrics)
 
     """----------------- Bind Resources -----------------"""
     api.add_resource(Health, '/healthcheck')
     api.add_resource(Liveness, '/liveness')
-    api.add_resource(Readiness, '/readiness', resource_class_kwargs={'config': app.config, 'app_logger': app_logger})
+    api.add_resource(Metrics, '/metrics')
 
-    loader = Filesystem(Repository(config.MODEL_BASE_DIR))
+    loader = LoaderFactory.factory(config.MODEL_LOADER_DRIVER, config)
 
     model_info = ModelInfo(
         config.USE_CASE_ID,
@@ -61,13 +73,19 @@ def create_app(config: Type[Config] = Config, custom_injector: injector.Injector
         config.TRAINING_ID
     )
 
-    app_logger.info(msg="Loading model from file..")
+    app_logger.info(msg=f"Loading model with the {config.MODEL_LOADER_DRIVER} loader..")
+    start_time = time.time()
     model = loader.load_model(model_info)
+    MODEL_LOAD_SECONDS.set(time.time() - start_time)
 
-    redis_repository = RedisRepository(
-        config,
-        app_logger
-    )
+    loaded_info = model.to_model_info()
+    MODEL_INFO.labels(loaded_info.usecase, loaded_info.model, loaded_info.version, loaded_info.timestamp).set(1)
+
+    if redis_repository is None:
+        redis_repository = RedisRepository(
+            config,
+            app_logger
+        )
 
     api.add_resource(
         Predict,
@@ -82,13 +100,20 @@ def create_app(config: Type[Config] = Config, custom_injector: injector.Injector
         }
     )
 
+    warm_up = WarmUpService(app_logger, model, redis_repository, config.WARM_UP_PARAM)
+    api.add_resource(Readiness, '/readiness', resource_class_kwargs={'config': app.config, 'app_logger': app_logger,
+                                                                     'warm_up': warm_up})
+
     api.add_resource(Home, '/', resource_class_kwargs={
         'config': app.config,
-        'model_info': model.to_model_info(),
+        'model_info': loaded_info,
     })
 
     add_error_handler(app)
 
+    # in the background, the worker answers liveness probes meanwhile
+    warm_up.start(app)
+
     app_logger.info(msg="The factory initiated the app successfully")
 
     return app, api
@@ -0,0 +1,25 @@
+"""
+@name: gunicorn_hooks.py
+@overview: gunicorn server hooks of the metrics multiprocess mode
+
+    prometheus_multiproc_dir=/tmp/metrics gunicorn -c python:app.server.gunicorn_hooks ...
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+from app.server.metrics import MULTIPROC_DIR_ENV
+
+
+def on_starting(server):
+    """Samples of a previous run would be added to the new ones"""
+    directory = os.environ.get(MULTIPROC_DIR_ENV)
+    if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if MULTIPROC_DIR_ENV in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,64 @@
+"""
+@name: metrics.py
+@overview: Prometheus metrics of the server, exposed in text format on /metrics.
+
+Under gunicorn, prometheus_multiproc_dir must name an empty directory shared by the workers, set before the app is
+imported: each worker then writes its samples to files there, /metrics aggregates the files of all workers and
+app.server.gunicorn_hooks drops the gauges of dead workers.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+MULTIPROC_DIR_ENV = 'prometheus_multiproc_dir'
+
+_STAGE_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0)
+
+REQUESTS = Counter('http_requests_total', 'Requests by route and status code', ['method', 'route', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Latency of the requests by route', ['method', 'route'])
+ERRORS = Counter('http_errors_total', 'Errors raised by the handlers by exception type', ['type'])
+
+# no_user_interactions is a miss of the member in the customer interactions cache
+PREDICT_OUTCOMES = Counter('predict_outcomes_total', 'Predict requests by outcome', ['outcome'])
+STAGE_LATENCY = Histogram('predict_stage_duration_seconds', 'Latency of the predict stages', ['stage'],
+                          buckets=_STAGE_BUCKETS)
+
+MODEL_INFO = Gauge('model_info', 'Model served by the worker, always 1',
+                   ['use_case_id', 'model_id', 'version', 'timestamp'], multiprocess_mode='liveall')
+MODEL_LOAD_SECONDS = Gauge('model_load_seconds', 'Time to load the model at start', multiprocess_mode='liveall')
+
+_uncounted = threading.local()
+
+
+@contextmanager
+def uncounted():
+    """Requests and stages run by the current thread within the block are left out of the metrics and access log"""
+    _uncounted.active = True
+    try:
+        yield
+    finally:
+        _uncounted.active = False
+
+
+def is_counted() -> bool:
+    return not getattr(_uncounted, 'active', False)
+
+
+def observe_stage(name: str, elapsed_ns: int):
+    """Recorder of the stage timer"""
+    if is_counted():
+        STAGE_LATENCY.labels(name).observe(elapsed_ns / 1e9)
+
+
+def latest() -> bytes:
+    """Metrics of every worker in multiprocess mode, of this process otherwise"""
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return generate_latest(registry)
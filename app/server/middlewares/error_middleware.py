@@ -1,9 +1,12 @@
 from app.errors import BaseHttpError, ApplicationException
+from app.server.metrics import ERRORS, is_counted
 
 
 def add_error_handler(app) -> None:
     @app.errorhandler(BaseHttpError)
     def handle_http_error(e: BaseHttpError):
+        if is_counted():
+            ERRORS.labels(type(e).__name__).inc()
         return {
             'error': {
                 'type': type(e).__name__,
@@ -13,6 +16,8 @@ def add_error_handler(app) -> None:
 
     @app.errorhandler(ApplicationException)
     def handle_base_error(e: ApplicationException):
+        if is_counted():
+            ERRORS.labels(type(e).__name__).inc()
         return {
             'error': {
                 'type': type(e).__name__,
@@ -22,6 +27,8 @@ def add_error_handler(app) -> None:
 
     @app.errorhandler(Exception)
     def handle_error(e: Exception):
+        if is_counted():
+            ERRORS.labels(type(e).__name__).inc()
         return {
             'error': {
                 'type': type(e).__name__,
@@ -6,6 +6,7 @@ from ddtrace.helpers import get_correlation_ids
 from ssense_logger.access_logger import AccessLogger
 from werkzeug import Response
 
+from app.server.metrics import is_counted
 from app.server.middlewares.record_request_id import REQUEST_ID
 
 
@@ -13,7 +14,11 @@ def record_access_log(resp: Response) -> Response:
     """
     Executed after a request.
     Note: we need to have the full function signature, even if some arguments are not used
+    The requests of the warm-up are left out.
     """
+    if not is_counted():
+        return resp
+
     _res_size = 0
     if resp is not None and resp.data is not None:
         _res_size = len(resp.data)
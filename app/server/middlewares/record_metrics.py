@@ -0,0 +1,23 @@
+import time
+
+from flask import request, g
+from werkzeug import Response
+
+from app.server.metrics import REQUESTS, REQUEST_LATENCY, is_counted
+
+
+def record_metrics(resp: Response) -> Response:
+    """
+    Executed after a request.
+    Counts the request and observes its latency, labelled by the rule of the route to bound the label values.
+    The requests of the warm-up are left out.
+    """
+    if not is_counted():
+        return resp
+
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    REQUESTS.labels(request.method, route, resp.status_code).inc()
+    REQUEST_LATENCY.labels(request.method, route).observe(time.time() - float(getattr(g, 'time_of_request', 0)))
+
+    return resp
@@ -0,0 +1,15 @@
+from flask import make_response
+from flask_restful import Resource
+from prometheus_client import CONTENT_TYPE_LATEST
+from werkzeug import Response
+
+from app.server.metrics import latest
+
+
+class Metrics(Resource):
+
+    def get(self) -> Response:
+        response = make_response(latest(), 200)
+        response.headers['Content-Type'] = CONTENT_TYPE_LATEST
+
+        return response
@@ -3,6 +3,7 @@ from flask_restful import Resource
 from werkzeug import Response
 
 from app.errors import BadRequestHttpError
+from app.utils.stage_timer import stage_timer
 from typing import Any
 
 
@@ -28,9 +29,11 @@ class Predict(Resource):
         Flask will no be able to serialize a list of python object instances
         So next line we map a list of instances to a list of dictionaries
         """
-        predictions_dict = [prediction.__dict__ for prediction in predictions]
+        with stage_timer.stage('predict.serialize'):
+            predictions_dict = [prediction.__dict__ for prediction in predictions]
+            response = make_response({'predictions': predictions_dict}, 200)
 
-        return make_response({'predictions': predictions_dict}, 200)
+        return response
 
     @staticmethod
     def _validate_member_id(member_id: Any, parameter_name: str = 'memberId') -> int:
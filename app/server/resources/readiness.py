@@ -16,8 +16,15 @@ class Readiness(Resource):
         self.config = kwargs['config']
         self.pubsub_service = PubSubService(self.config)
         self.app_logger = kwargs['app_logger']
+        self.warm_up = kwargs['warm_up']
 
     def get(self) -> Response:
+        if not self.warm_up.done:
+            return make_response({
+                'status': 'warming up',
+                self.config.get('APP_NAME'): 'not ready',
+                'response_code': 503}, 503)
+
         self.app_logger.debug(msg=f"PUBSUB_EVENT_SENT: {self.config['PUBSUB_EVENT_SENT']}")
 
         if self.config['PUBSUB_EVENT_SENT']:
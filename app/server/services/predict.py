@@ -3,6 +3,8 @@ from ssense_logger.app_logger import AppLogger
 from app.server.entities.prediction import Prediction
 from app.entities.model.model import Model
 from app.repositories.redis_repository import RedisRepository
+from app.server.metrics import PREDICT_OUTCOMES, is_counted
+from app.utils.stage_timer import stage_timer
 
 
 class PredictService:
@@ -26,21 +28,32 @@ class PredictService:
             self.app_logger.info(msg=f'{member_id} has no user interactions',
                                  tags=['PredictService', 'no_user_interactions'],
                                  request_id=request_id)
+            self._count_outcome('no_user_interactions')
             return []
 
-        raw_predictions = self._model.predict(user_data)
+        with stage_timer.stage('predict.model'):
+            raw_predictions = self._model.predict(user_data)
 
         if raw_predictions is None or len(raw_predictions.brand.keys()) < 1:
             self.app_logger.info(msg=f'{member_id} has no predictions', tags=['PredictService', 'no_predictions'],
                                  request_id=request_id)
+            self._count_outcome('no_predictions')
             return []
 
-        predictions = list(map(
-            lambda k: Prediction(
-                brand_id=raw_predictions.brand[k],
-                gender=raw_predictions.gender[k],
-                score=raw_predictions.score[k],
-                liked=raw_predictions.liked[k]
-            ), raw_predictions.brand.keys()))
+        with stage_timer.stage('predict.predictions'):
+            predictions = list(map(
+                lambda k: Prediction(
+                    brand_id=raw_predictions.brand[k],
+                    gender=raw_predictions.gender[k],
+                    score=raw_predictions.score[k],
+                    liked=raw_predictions.liked[k]
+                ), raw_predictions.brand.keys()))
+
+        self._count_outcome('predictions')
 
         return predictions
+
+    @staticmethod
+    def _count_outcome(outcome: str):
+        if is_counted():
+            PREDICT_OUTCOMES.labels(outcome).inc()
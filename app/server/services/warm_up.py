@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+from ssense_logger.app_logger import AppLogger
+
+from app.entities.model.model import Model
+from app.repositories.redis_repository import RedisRepository
+from app.server.metrics import uncounted
+
+# request id of the warm-up requests, to tell them apart in the logs
+WARM_UP_REQUEST_ID_PREFIX = 'warm-up-'
+
+
+class WarmUpService:
+    """
+    Warms a new worker up before it reports ready: opens the Redis connections, then runs rounds of requests to
+    /predict until the median latency of a round is stable. When Redis has no member to sample, /predict does not
+    reach the model, which is then warmed up with synthetic predictions first.
+    Runs in a thread of the worker, an app created before gunicorn forks (preload) has to be warmed up in each worker.
+    Its requests, predictions and stages are left out of the metrics and of the access log.
+    """
+
+    def __init__(self,
+                 app_logger: AppLogger,
+                 model: Model,
+                 redis_repository: RedisRepository,
+                 params: Dict):
+        """
+        :param params: WARM_UP_PARAM of the config
+        """
+        self.app_logger = app_logger
+        self._model = model
+        self._redis_repository = redis_repository
+        self.params = params
+        self.summary = dict()
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self, app: Flask) -> threading.Thread:
+        if not self.params['enabled']:
+            self._done.set()
+            return None
+
+        thread = threading.Thread(target=self.run, args=(app,), name='warm-up', daemon=True)
+        thread.start()
+
+        return thread
+
+    def run(self, app: Flask):
+        with uncounted():
+            self._run(app)
+
+    def _run(self, app: Flask):
+        start_time = time.time()
+        try:
+            self._redis_repository.open_connections(self.params['n_connections'])
+            member_ids = self._redis_repository.sample_member_ids(self.params['batch_size'])
+            if not member_ids:
+                self._warm_model()
+
+            medians, stable = self._predict_rounds(app, member_ids)
+            self.summary = {'rounds': len(medians),
+                            'stable': stable,
+                            'median_ms': [round(median * 1000, 2) for median in medians],
+                            'seconds': round(time.time() - start_time, 2)}
+            self.app_logger.info(msg=f'Warm-up done: {self.summary}', tags=['WarmUpService', 'done'])
+        except Exception as e:
+            # a worker that can not warm up still serves, cold
+            self.app_logger.error(msg=f'Warm-up failed: {e}', tags=['WarmUpService', 'error'])
+        finally:
+            self._done.set()
+
+    def _synthetic_user_data(self, rng: np.random.RandomState) -> pd.DataFrame:
+        labels = list(self._model.cf_item_dict.values())
+        size = min(self.params['history_length'], len(labels))
+
+        return pd.DataFrame({'b_g': rng.choice(labels, size=size, replace=False),
+                             'total_hits': np.round(rng.exponential(2., size=size) + 0.1, 4)})
+
+    def _warm_model(self):
+        rng = np.random.RandomState(0)
+        for _ in range(self.params['batch_size']):
+            self._model.predict(self._synthetic_user_data(rng))
+
+    def _predict_rounds(self, app: Flask, member_ids: List[int]) -> Tuple[List[float], bool]:
+        """
+        :return: median latency of /predict in each round, until two consecutive medians are within tolerance or
+                 max_rounds, and whether the latency is stable
+        """
+        client = app.test_client()
+        medians = []
+
+        for round_index in range(self.params['max_rounds']):
+            latencies = []
+            for i in range(self.params['batch_size']):
+                # the whole request path, with the interactions of a member when Redis has some
+                member_id = member_ids[i % len(member_ids)] if member_ids else i + 1
+
+                start_time = time.perf_counter()
+                client.get('/predict', query_string={'memberId': member_id},
+                           headers={'x-request-id': f'{WARM_UP_REQUEST_ID_PREFIX}{round_index}-{i}'})
+                latencies.append(time.perf_counter() - start_time)
+
+            medians.append(float(np.median(latencies)))
+            if len(medians) >= max(self.params['min_rounds'], 2) \
+                    and abs(medians[-1] - medians[-2]) <= self.params['tolerance'] * medians[-2]:
+                return medians, True
+
+        return medians, False
@@ -0,0 +1,137 @@
+"""
+@name: stage_timer.py
+@overview: In-process latency histograms per stage of a request, optionally mirrored as ddtrace spans.
+
+    with stage_timer.stage('predict.redis_get'):
+        ...
+
+Durations are read with perf_counter_ns and counted in buckets four per power of two (at most 19% wide): a stage
+costs two clock reads, an integer bucket index and a locked increment. Measured at 2 to 3.5us per stage, about 8us
+with the Prometheus recorder of the server, or under 0.2% of a 40ms prediction timing ten stages
+(python -m app.benchmarks.stage_timer).
+"""
+import threading
+from time import perf_counter_ns
+from typing import Dict, List
+
+# 4 sub-buckets per power of two of nanoseconds, the last bucket holds everything above ~480s
+_SUB_BUCKET_BITS = 2
+_N_BUCKETS = 4 * 38
+
+
+def _bucket(elapsed_ns: int) -> int:
+    n_bits = elapsed_ns.bit_length()
+    if n_bits <= _SUB_BUCKET_BITS + 1:
+        return elapsed_ns
+
+    # exponent and the two bits below the leading one
+    index = (n_bits - _SUB_BUCKET_BITS) * 4 + ((elapsed_ns >> (n_bits - _SUB_BUCKET_BITS - 1)) & 3)
+
+    return min(index, _N_BUCKETS - 1)
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Largest duration in nanoseconds counted in the bucket index, inf for the last one"""
+    if index == _N_BUCKETS - 1:
+        return float('inf')
+    if index < 8:
+        return index
+    exponent, sub_bucket = divmod(index, 4)
+
+    return (((4 | sub_bucket) + 1) << (exponent - 1)) - 1
+
+
+class _Stage(object):
+    __slots__ = ('timer', 'name', 'start', 'span')
+
+    def __init__(self, timer: 'StageTimer', name: str):
+        self.timer = timer
+        self.name = name
+        self.span = None
+
+    def __enter__(self):
+        tracer = self.timer.tracer
+        # a span only within a traced request, spans of the training or the benchmarks would be orphans
+        if tracer is not None and tracer.current_span() is not None:
+            self.span = tracer.trace(self.name)
+        self.start = perf_counter_ns()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.record(self.name, perf_counter_ns() - self.start)
+        if self.span is not None:
+            if exc_type is not None:
+                self.span.set_exc_info(exc_type, exc_value, traceback)
+            self.span.finish()
+
+
+class StageTimer(object):
+
+    def __init__(self, tracer=None, recorder=None):
+        """
+        :param tracer: ddtrace tracer, None to only aggregate the histograms
+        :param recorder: also called with the name and nanoseconds of every stage, e.g. to export them
+        """
+        self.tracer = tracer
+        self.recorder = recorder
+        self._lock = threading.Lock()
+        self._histograms = dict()
+        self._sums = dict()
+
+    def stage(self, name: str) -> _Stage:
+        """Context timing its block under name"""
+        return _Stage(self, name)
+
+    def record(self, name: str, elapsed_ns: int):
+        index = _bucket(elapsed_ns)
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [0] * _N_BUCKETS
+                self._sums[name] = 0
+            histogram[index] += 1
+            self._sums[name] += elapsed_ns
+
+        if self.recorder is not None:
+            self.recorder(name, elapsed_ns)
+
+    def histograms(self) -> Dict[str, Dict]:
+        """
+        :return: {stage: {'count', 'sum_ns', 'buckets': [[upper bound ns, count], ...] of the non empty buckets}}
+        """
+        with self._lock:
+            histograms = {name: list(histogram) for name, histogram in self._histograms.items()}
+            sums = dict(self._sums)
+
+        return {name: {'count': sum(histogram),
+                       'sum_ns': sums[name],
+                       'buckets': [[bucket_upper_bound(index), count] for index, count in enumerate(histogram) if count]}
+                for name, histogram in histograms.items()}
+
+    def quantiles(self, quantiles: List[float] = (0.5, 0.9, 0.99)) -> Dict[str, Dict[str, float]]:
+        """
+        :return: {stage: {'count', 'mean_us', 'p50_us', ...}}, a quantile is the upper bound of its bucket
+        """
+        summary = dict()
+        for name, histogram in self.histograms().items():
+            stage_summary = summary[name] = {'count': histogram['count'],
+                                             'mean_us': round(histogram['sum_ns'] / histogram['count'] / 1000, 3)}
+            for quantile in quantiles:
+                rank, seen = quantile * histogram['count'], 0
+                for upper_bound, count in histogram['buckets']:
+                    seen += count
+                    if seen >= rank:
+                        break
+                stage_summary['p{:g}_us'.format(quantile * 100)] = round(upper_bound / 1000, 3)
+
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._sums.clear()
+
+
+# timer of the process, the server sets its tracer and recorder
+stage_timer = StageTimer()
@@ -0,0 +1,500 @@
+"""
+@name: fixtures.py
+@overview: Synthetic data, a local S3 client and reference implementations shared by the tests and the benchmarks.
+           The references are copies of the code as it was before the optimizations, so that parity is asserted
+           against the original behaviour
+"""
+import datetime
+import hashlib
+import re
+import shutil
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from gensim.parsing.preprocessing import \
+    remove_stopwords, strip_numeric, strip_short, strip_non_alphanum, \
+    strip_punctuation, strip_multiple_whitespaces
+from implicit import nearest_neighbours
+from scipy.sparse import csr_matrix, random as sparse_random
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from app.config import ConfigTraining
+from app.models.cbcf.helpers.metrics import recall_at_k, precision_at_k, f1_at_k, jaccard_at_k, jaccard_ranked, \
+    ndcg_at_k, average_precision_at_k
+from app.models.cbcf.rec_pred import RecPred
+
+_CATEGORIES = ['clothing', 'shoes', 'bags', 'accessories', 'jewelry']
+_SUBCATEGORIES = ['shirts', 'sneakers', 'tote bags', 'belts', 'rings', 'jackets', 'boots', 'scarves']
+_COMPOSITIONS = ['100% cotton', '100% leather', '80% wool 20% polyamide', '100% silk', '100% polyester']
+_FITS = ['slim fit', 'regular fit', 'oversized fit', 'relaxed fit']
+_GENDERS = ['women', 'men', 'unisex']
+
+
+def synthetic_products(n_brands: int = 500, products_per_brand: int = 40, vocabulary_size: int = 5000,
+                       description_length: int = 25, seed: int = 0) -> pd.DataFrame:
+    """
+    :param n_brands: number of brands, each sold in one to three genders
+    :param products_per_brand: mean number of products per brand (geometric distribution)
+    :param vocabulary_size: number of distinct description words (zipf distributed)
+    :param description_length: number of words per product description
+    :param seed: random seed
+    :return: products dataframe
+    """
+    rng = np.random.RandomState(seed)
+
+    brand_sizes = rng.geometric(1 / products_per_brand, size=n_brands)
+    n_products = int(brand_sizes.sum())
+
+    # each brand has its own flavour of the vocabulary, so similarities are not uniform
+    brand_ids = np.repeat(np.arange(n_brands), brand_sizes)
+    words = (rng.zipf(1.4, size=(n_products, description_length)) + brand_ids[:, None] * 7) % vocabulary_size
+    descriptions = [' '.join('word' + str(w) for w in row) for row in words]
+
+    today = datetime.date.today()
+    creation_dates = [(today - datetime.timedelta(days=int(d))).strftime('%Y-%m-%d')
+                      for d in rng.randint(0, 7 * 90, size=n_products)]
+
+    return pd.DataFrame({
+        'productID': np.arange(n_products),
+        'gender': rng.choice(_GENDERS, size=n_products, p=[0.55, 0.4, 0.05]),
+        'brandID': brand_ids,
+        'brand_seo': ['brand-' + str(b) for b in brand_ids],
+        'name': ['color' + str(c) + ' ' + rng.choice(_SUBCATEGORIES) for c in rng.randint(0, 30, size=n_products)],
+        'composition': rng.choice(_COMPOSITIONS, size=n_products),
+        'prodCreationDate': creation_dates,
+        'priceCD': rng.lognormal(6, 0.8, size=n_products).round(2),
+        'description': [rng.choice(_FITS) + ' ' + d for d in descriptions],
+        'category': rng.choice(_CATEGORIES, size=n_products),
+        'subcategory': rng.choice(_SUBCATEGORIES, size=n_products),
+        'stockForSale': rng.poisson(3, size=n_products) * (rng.rand(n_products) > 0.3),
+    })
+
+
+def synthetic_hits(n_members: int = 20000, n_brands: int = 2000, hits_per_member: int = 15,
+                   seed: int = 0) -> pd.DataFrame:
+    """
+    :param n_members: number of members
+    :param n_brands: number of brands, each sold in genders 0 and 1
+    :param hits_per_member: mean number of brand-genders per member (geometric distribution)
+    :param seed: random seed
+    :return: DataFrame ['memberID', 'b_g', 'total_hits'], one row per member and brand-gender
+    """
+    rng = np.random.RandomState(seed)
+
+    # zipf like brand popularity, members mostly browse one gender
+    popularity = 1 / np.arange(1, n_brands + 1) ** 0.9
+    popularity /= popularity.sum()
+
+    sizes = np.minimum(rng.geometric(1 / hits_per_member, size=n_members), n_brands)
+    # distinct, non contiguous member ids, without drawing from a permutation of all the possible ids
+    member_ids = np.repeat(np.arange(n_members) * 1000 + rng.randint(0, 1000, size=n_members), sizes)
+    member_gender = np.repeat(rng.randint(0, 2, size=n_members), sizes)
+
+    brands = rng.choice(n_brands, size=len(member_ids), p=popularity)
+    genders = np.where(rng.rand(len(member_ids)) < 0.9, member_gender, 1 - member_gender)
+
+    hits = pd.DataFrame({'memberID': member_ids,
+                         'b_g': pd.Series(brands).astype(str) + ' ' + pd.Series(genders).astype(str),
+                         # decayed view counts
+                         'total_hits': np.round(rng.exponential(2., size=len(member_ids)) + 0.1, 4)})
+
+    return hits.drop_duplicates(['memberID', 'b_g']).reset_index(drop=True)
+
+
+def synthetic_model(n_items: int, density: float, seed: int) -> RecPred:
+    """RecPred with one random float32 similarity for both CF and CB"""
+    item_dict = {code: '{} {}'.format(code // 2, code % 2) for code in range(n_items)}
+    sim_mat = sparse_random(n_items, n_items, density=density, format='csr', dtype=np.float32, random_state=seed)
+
+    return RecPred(cf_sim_mat=sim_mat, cf_item_dict=item_dict, cb_sim_mat=sim_mat.copy(), cb_item_dict=item_dict)
+
+
+class _Body(object):
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def read(self) -> bytes:
+        return self.content
+
+
+class _Exceptions(object):
+
+    class NoSuchKey(Exception):
+        pass
+
+
+class LocalS3Client(object):
+    """Subset of the boto3 S3 client used by the model repository, objects are files under root"""
+
+    def __init__(self, root: str, latency: float = 0.0, bandwidth: float = None):
+        """
+        :param latency: seconds slept by each request, as a round trip to S3 would
+        :param bandwidth: bytes per second of one request or response body, None for no limit
+        """
+        self.root = Path(root)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.calls = Counter()
+        self.uploads = dict()
+        self.exceptions = _Exceptions
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def _request(self, name: str, n_bytes: int = 0):
+        self.calls[name] += 1
+        time.sleep(self.latency + (n_bytes / self.bandwidth if self.bandwidth else 0))
+
+    def upload_file(self, file_name: str, bucket: str, key: str):
+        self._request('upload_file')
+        self._path(bucket, key).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(file_name, str(self._path(bucket, key)))
+
+    def create_multipart_upload(self, Bucket: str, Key: str) -> dict:
+        self._request('create_multipart_upload')
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = dict()
+
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, PartNumber: int, UploadId: str, Body: bytes) -> dict:
+        self._request('upload_part', len(Body))
+        self.uploads[UploadId][PartNumber] = Body
+
+        return {'ETag': hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict):
+        self._request('complete_multipart_upload')
+        parts = self.uploads.pop(UploadId)
+        self._path(Bucket, Key).parent.mkdir(parents=True, exist_ok=True)
+        with self._path(Bucket, Key).open('wb') as f:
+            for part in sorted(MultipartUpload['Parts'], key=lambda part: part['PartNumber']):
+                f.write(parts[part['PartNumber']])
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str):
+        self._request('abort_multipart_upload')
+        self.uploads.pop(UploadId, None)
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes):
+        self._request('put_object')
+        self._path(Bucket, Key).parent.mkdir(parents=True, exist_ok=True)
+        self._path(Bucket, Key).write_bytes(Body)
+
+    def list_objects_v2(self, Bucket: str, Prefix: str, Delimiter: str = None, ContinuationToken: str = None) -> dict:
+        """One page with every key, or every common prefix with a delimiter"""
+        self._request('list_objects_v2')
+        keys = sorted(str(path.relative_to(self.root / Bucket)) for path in (self.root / Bucket).rglob('*')
+                      if path.is_file() and str(path.relative_to(self.root / Bucket)).startswith(Prefix))
+
+        if Delimiter is None:
+            return {'Contents': [{'Key': key} for key in keys], 'IsTruncated': False}
+
+        prefixes = sorted({Prefix + key[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                           for key in keys if Delimiter in key[len(Prefix):]})
+
+        return {'CommonPrefixes': [{'Prefix': prefix} for prefix in prefixes], 'IsTruncated': False}
+
+    def delete_objects(self, Bucket: str, Delete: dict):
+        self._request('delete_objects')
+        for key in Delete['Objects']:
+            self._path(Bucket, key['Key']).unlink()
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        self._request('head_object')
+        return {'ContentLength': self._path(Bucket, Key).stat().st_size}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None) -> dict:
+        if not self._path(Bucket, Key).is_file():
+            self._request('get_object')
+            raise self.exceptions.NoSuchKey(Key)
+
+        with self._path(Bucket, Key).open('rb') as f:
+            if Range is None:
+                content = f.read()
+            else:
+                start, end = (int(bound) for bound in Range.replace('bytes=', '').split('-'))
+                f.seek(start)
+                content = f.read(end - start + 1)
+
+        self._request('get_object', len(content))
+
+        return {'Body': _Body(content)}
+
+
+SINGLE_USER_METRICS = {'recall_at_k': recall_at_k,
+                       'precision_at_k': precision_at_k,
+                       'f1_at_k': f1_at_k,
+                       'jaccard_at_k': jaccard_at_k,
+                       'jaccard_ranked': jaccard_ranked,
+                       'ndcg_at_k': ndcg_at_k,
+                       'average_precision_at_k': average_precision_at_k}
+
+
+def random_lists(n_users: int, n_items: int, max_length: int, seed: int = 0):
+    """Actual and predicted lists of b_g like labels, with empty lists and repeated items"""
+    rng = np.random.RandomState(seed)
+    labels = np.array([f'{brand} {brand % 2}' for brand in range(n_items)])
+
+    def draw():
+        return list(labels[rng.randint(0, n_items, size=rng.randint(0, max_length + 1))])
+
+    return [draw() for _ in range(n_users)], [draw() for _ in range(n_users)]
+
+
+def single_user_scores(name: str, actual: list, predicted: list, k: int) -> np.ndarray:
+    """Scores of the single user function, one per user, NaN where batch_metrics leaves them undefined"""
+    func = SINGLE_USER_METRICS[name]
+
+    # the jaccard functions divide by zero when both lists are empty
+    return np.array([func(a, p, k) if a or p or not name.startswith('jaccard') else np.nan
+                     for a, p in zip(actual, predicted)], dtype=np.float64)
+
+
+def _legacy_matrix_quantile_zeroes(weights_inner: pd.DataFrame, quantile: float) -> pd.DataFrame:
+    dimension = weights_inner.shape[0]
+
+    quantile_vect = np.quantile(weights_inner, quantile, axis=0)
+    quantile_mat = np.repeat(quantile_vect, dimension, axis=0).reshape(dimension, dimension)
+
+    # similarity quantiles are set column-wise
+    weights_inner[weights_inner < quantile_mat.T] = 0
+
+    return weights_inner
+
+
+def _legacy_text_distance(corpus_in: list, stock_in: list, docids_in: list) -> pd.DataFrame:
+    """Former dense get_text_distance"""
+    vectorize = CountVectorizer(min_df=ConfigTraining.CB_REC_PARAM['min_df'])
+    X = vectorize.fit_transform(corpus_in)
+    weights = nearest_neighbours.bm25_weight(X=X, K1=ConfigTraining.CB_REC_PARAM['K1'],
+                                             B=ConfigTraining.CB_REC_PARAM['B']).toarray()
+
+    weights_norm = normalize(weights, axis=1, norm='l2')
+    weights_inner = weights_norm @ weights_norm.T
+
+    stock_level = np.array(stock_in)
+    stock_level[stock_level > 0] = 1
+    stock_level[stock_level <= 0] = 0
+
+    stock_diagonal = np.diag(stock_level)
+
+    weights_relevance_score = weights_inner @ stock_diagonal
+
+    balance = 3
+    weights_relevance_score = weights_relevance_score / balance + stock_diagonal * (1 - 1 / balance)
+
+    weights_relevance_score = weights_relevance_score.round(decimals=5)
+
+    weights_inner_pd = pd.DataFrame(weights_relevance_score,
+                                    index=pd.Index(docids_in, name='rows'),
+                                    columns=pd.Index(docids_in, name='cols'))
+
+    return _legacy_matrix_quantile_zeroes(weights_inner_pd, quantile=ConfigTraining.CB_REC_PARAM['quantile'])
+
+
+def _legacy_clean_text(x: str) -> str:
+    x = x.lower()
+    x = re.sub('ssense|exclusive', '', x)
+
+    x = strip_non_alphanum(x)
+    x = strip_numeric(x)
+    x = strip_short(x, minsize=2)
+    x = remove_stopwords(x)
+    x = strip_punctuation(x)
+    x = strip_multiple_whitespaces(x)
+
+    return x
+
+
+def _legacy_manipulate_text(raw_text_in: pd.DataFrame, start_date: str, end_date: str) -> pd.DataFrame:
+    """Former cb_manipulate_text, one cleaned description per brand-gender"""
+    date_min = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+    date_max = datetime.datetime.strptime(end_date, '%Y-%m-%d')
+
+    raw_text_in.rename(columns={'prodCreationDate': 'creationDate'}, inplace=True)
+
+    raw_text_in = (raw_text_in.assign(gender=lambda x: np.where(x.gender == 'women', '0',
+                                                                np.where(x.gender == 'men', '1', '2')),
+                                      b_g=lambda x: x['brandID'].astype(str) + ' ' + x['gender'].astype(str)))
+
+    raw_text_in['priceCDtxt'] = 'pricePrem pricePrem priceHigh'
+    raw_text_in.loc[raw_text_in['priceCD'].between(0, 300, inclusive=False), 'priceCDtxt'] = 'priceLow priceLow'
+    raw_text_in.loc[raw_text_in['priceCD'].between(300, 600, inclusive=True), 'priceCDtxt'] = 'priceMed priceMed'
+    raw_text_in.loc[raw_text_in['priceCD'].between(600, 1000, inclusive=True), 'priceCDtxt'] = 'priceHigh priceHigh'
+
+    raw_text_in['firstW'] = raw_text_in.name.str.split(' |_').str[0]
+    raw_text_in = raw_text_in[~raw_text_in['description'].isnull()]
+    raw_text_in['description'] = raw_text_in['description'].apply(lambda x: strip_non_alphanum(x))
+    raw_text_in_list = raw_text_in.description.str.split(' ')
+    raw_text_in['fitSize'] = raw_text_in_list.str[0] + ' ' + raw_text_in_list.str[1]
+
+    col_list_rep = {'name': 1,
+                    'firstW': 1,
+                    'fitSize': 2,
+                    'description': 1,
+                    'composition': 1,
+                    'priceCDtxt': 2,
+                    'subcategory': 1}
+
+    for key, value in col_list_rep.items():
+        if value > 1:
+            raw_text_in[key] = (raw_text_in[key] + " ") * value
+
+    col_list = ['description', 'composition', 'category', 'name']
+
+    raw_text_gend = (raw_text_in
+                     .assign(creationDate=lambda x: pd.to_datetime(x['creationDate']),
+                             creationDateMax=lambda x: x.groupby(['b_g'])['creationDate'].transform(max))
+                     .pipe(lambda x: x[x['creationDate'] <= date_max])
+                     .pipe(lambda x: x[(x['creationDate'] > date_min) | (x['creationDateMax'] < date_min)])
+                     .assign(description=lambda x: x.astype(str)[col_list]
+                             .apply(lambda y: _legacy_clean_text(' '.join(y)), axis=1)))
+
+    collapse_brands = {'description': [lambda x: ' '.join(x)],
+                       'stockForSale': ['sum'],
+                       'creationDateMax': ['max']}
+
+    bg_text = (raw_text_gend[['b_g', 'brandID', 'gender', 'description', 'stockForSale', 'creationDateMax']]
+               .groupby(['b_g', 'brandID', 'gender'], as_index=False)
+               .agg(collapse_brands))
+
+    bg_text.columns = pd.Index([column[0] for column in bg_text.columns.tolist()])
+
+    return bg_text.astype({'b_g': 'category'})
+
+
+def legacy_cb_sim_mat(product_data: pd.DataFrame) -> csr_matrix:
+    """Former ContTrain.fit: per gender dense frames, outer merged then converted to csr"""
+    last_n_weeks = ConfigTraining.CB_REC_PARAM['max_product_age_weeks']
+    start_date = (datetime.date.today() - datetime.timedelta(weeks=last_n_weeks)).strftime('%Y-%m-%d')
+    end_date = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+
+    brand_df = _legacy_manipulate_text(product_data, start_date=start_date, end_date=end_date)
+    brand_df['bg_codes'] = brand_df['b_g'].cat.codes
+    brand_df['gender'] = brand_df['b_g'].str.split(' ', n=1, expand=True)[1]
+
+    weights_inner = pd.DataFrame()
+
+    for gender in brand_df.gender.unique():
+        dataset_sub = brand_df[brand_df['gender'] == gender]
+        weights_inner_sub = _legacy_text_distance(corpus_in=list(dataset_sub['description']),
+                                                  stock_in=dataset_sub['stockForSale'],
+                                                  docids_in=dataset_sub['bg_codes'])
+        weights_inner = pd.merge(weights_inner, weights_inner_sub,
+                                 left_index=True, right_index=True, how='outer')
+
+    weights_inner.fillna(0, inplace=True)
+    weights_inner.sort_index(axis=0, inplace=True)
+    weights_inner.sort_index(axis=1, inplace=True)
+
+    return csr_matrix(weights_inner)
+
+
+def dense_cf_similarity(hits_matrix, K: int, K1: float, B: float) -> np.ndarray:
+    """
+    What BM25Recommender.fit keeps: the exact top K entries of each row of the item x item products of the
+    BM25 weights, members being the documents. Computed densely in float64
+    """
+    weights = nearest_neighbours.bm25_weight(hits_matrix.T, K1, B).T.toarray()
+    products = weights @ weights.T
+
+    neighbours = np.argsort(-products, axis=1, kind='stable')[:, :K]
+    similarity = np.zeros_like(products)
+    np.put_along_axis(similarity, neighbours, np.take_along_axis(products, neighbours, axis=1), axis=1)
+
+    return similarity
+
+
+def legacy_val_prep(userId, act, pred):
+    """Former RecVal._val_prep: validation lists of one member, one row per gender with held out hits"""
+    df = pd.DataFrame()
+
+    for genderT in (0, 1):
+
+        if not act[act.gender == genderT].empty:
+
+            dataset = pd.DataFrame({'memberID': [userId]})
+
+            dataset = dataset.assign(gender=genderT,
+                                     test=np.empty((dataset.shape[0], 0)).tolist(),
+                                     pred=np.empty((dataset.shape[0], 0)).tolist())
+
+            dataset.at[0, 'test'] = list(act[act.gender == genderT].b_g.tolist())
+
+            dataset.at[0, 'pred'] = list(pred[pred.gender == genderT].b_g.tolist())
+
+            df = pd.concat([df, dataset])
+
+    if not df.empty:
+
+        return df
+
+
+def _legacy_post_process_rec(dataset: pd.DataFrame, n_rec: int) -> pd.DataFrame:
+    """Former RecVal._post_process_rec: n_rec best of each gender, log1p scores divided by the best of the gender"""
+    dataset = dataset.assign(log_score=lambda x: np.log1p(x.score))
+    dataset.drop(columns=['score'], axis=1, inplace=True)
+
+    dataset.brand = dataset.brand.astype('int16')
+    dataset.gender = dataset.gender.astype('int8')
+
+    proc_dataset = pd.DataFrame()
+    for genderT in (1, 0):
+        dataset_gender = dataset[dataset.gender == genderT].head(n_rec).copy()
+        dataset_gender = dataset_gender.assign(score=dataset_gender.log_score / dataset_gender.log_score.max())
+        proc_dataset = pd.concat([proc_dataset, dataset_gender[['brand', 'gender', 'score', 'liked']]], sort=False)
+
+    # stable, gender 1 stays before gender 0 on equal scores
+    proc_dataset.sort_values(by='score', ascending=False, inplace=True, kind='mergesort')
+    proc_dataset.reset_index(inplace=True, drop=True)
+
+    proc_dataset.score = np.round(proc_dataset.score, decimals=6)
+
+    return proc_dataset
+
+
+def legacy_predict(user_data: pd.DataFrame, sim_mat: csr_matrix, item_dict: dict, n_rec: int) -> pd.DataFrame:
+    """Former RecVal.predict and _rec_predict: recommendations of one member from a dense vector of its hits"""
+    user_data_dict = dict(zip(user_data.b_g, user_data.total_hits))
+
+    user_items = np.zeros(len(item_dict))
+    for i in range(user_items.shape[0]):
+        if item_dict[i] in user_data_dict:
+            user_items[i] = user_data_dict[item_dict[i]]
+
+    user_items = csr_matrix(user_items.reshape(1, -1))
+
+    rec_mat = user_items @ sim_mat
+
+    liked = set(user_items.indices)
+    best = sorted(zip(rec_mat.indices, rec_mat.data), key=lambda x: -x[1])
+    result = [(item_dict[rid].split(' ')[0], item_dict[rid].split(' ')[1], score, False)
+              for rid, score in best if rid not in liked]
+
+    rec = pd.DataFrame(result, columns=['brand', 'gender', 'score', 'liked'])
+
+    if rec.score.lt(0).any():
+        rec = pd.DataFrame(columns=['brand', 'gender', 'score', 'liked'])
+    else:
+        rec = _legacy_post_process_rec(rec, n_rec)
+
+    return rec.assign(b_g=lambda x: x.brand.astype('str') + ' ' + x.gender.astype('str'))
+
+
+def legacy_batch_predict(users_array, train_hits: pd.DataFrame, test_hits: pd.DataFrame, sim_mat: csr_matrix,
+                         item_dict: dict, n_rec: int):
+    """Former RecVal.batch_predict: one filter of the hits and one prediction per member"""
+    pred_df, val_df = [], []
+
+    for userId in users_array:
+        pred = legacy_predict(train_hits[train_hits.memberID == userId].copy(), sim_mat, item_dict, n_rec)
+        pred_df.append(pred.assign(memberID=userId))
+        val_df.append(legacy_val_prep(userId, test_hits[test_hits.memberID == userId], pred))
+
+    return pd.concat(pred_df).reset_index(drop=True), pd.concat(val_df).reset_index(drop=True)
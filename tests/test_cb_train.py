@@ -0,0 +1,72 @@
+"""
+@name: test_cb_train.py
+@overview: Parity of the per gender, parallel ContTrain.fit with the former dense, outer merged cb_sim_mat
+
+    nosetests tests/test_cb_train.py
+"""
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from app.config import ConfigTraining
+from app.models.cbcf.helpers.cb_helper_function import _term_counts
+from app.models.cbcf.training.cb_train import ContTrain
+from tests.fixtures import legacy_cb_sim_mat, synthetic_products
+
+
+class ContTrainParityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.patches = [mock.patch.object(ConfigTraining, 'CB_TEXT_CACHE_DIR', self.cache_dir.name),
+                        mock.patch.dict(ConfigTraining.CB_REC_PARAM, n_jobs=3, top_k=None)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.cache_dir.cleanup()
+
+    def _assert_parity(self, seed: int):
+        products = synthetic_products(n_brands=40, products_per_brand=15, vocabulary_size=800, seed=seed)
+
+        cb_sim_mat, cb_item_dict = ContTrain(products.copy()).fit()
+        legacy_sim_mat = legacy_cb_sim_mat(products.copy())
+
+        self.assertEqual(len(cb_item_dict), cb_sim_mat.shape[0])
+        self.assertEqual(cb_sim_mat.shape, legacy_sim_mat.shape)
+        self.assertGreater(cb_sim_mat.nnz, 0)
+        self.assertTrue(np.allclose(cb_sim_mat.toarray(), legacy_sim_mat.toarray()))
+
+    def test_parallel_fit_matches_legacy(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self._assert_parity(seed)
+
+    def test_in_process_fit_matches_parallel_fit(self):
+        products = synthetic_products(n_brands=40, products_per_brand=15, vocabulary_size=800, seed=0)
+        parallel_sim_mat, _ = ContTrain(products.copy()).fit()
+
+        with mock.patch.dict(ConfigTraining.CB_REC_PARAM, n_jobs=1):
+            in_process_sim_mat, _ = ContTrain(products.copy()).fit()
+
+        self.assertTrue(np.allclose(parallel_sim_mat.toarray(), in_process_sim_mat.toarray()))
+
+
+class TermCountsTest(unittest.TestCase):
+
+    def test_sparse_counts_keep_the_terms_of_count_vectorizer(self):
+        rng = np.random.RandomState(0)
+        corpus = [' '.join('word' + str(w) for w in rng.zipf(1.5, size=30) % 200) for _ in range(60)]
+        counts = CountVectorizer().fit_transform(corpus)
+
+        # an integer is a number of documents, a float a share of them
+        for min_df in (1, 2, 5, 0.05, 0.2):
+            with self.subTest(min_df=min_df), mock.patch.dict(ConfigTraining.CB_REC_PARAM, min_df=min_df):
+                expected = _term_counts(corpus)
+                self.assertEqual(_term_counts(counts).shape, expected.shape)
+                self.assertEqual((_term_counts(counts) != expected).nnz, 0)
@@ -0,0 +1,46 @@
+"""
+@name: test_cf_train.py
+@overview: Parity of the blocked float32 CollabTrain.fit with the exact top K BM25 similarity of BM25Recommender
+
+    nosetests tests/test_cf_train.py
+"""
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from app.config import ConfigTraining
+from app.models.cbcf.training.cf_train import CollabTrain
+from tests.fixtures import dense_cf_similarity, synthetic_hits
+
+
+class CollabTrainParityTest(unittest.TestCase):
+
+    def _assert_parity(self, hits_data, K: int):
+        with mock.patch.dict(ConfigTraining.CF_KNN_PARAM, K=K), \
+                mock.patch.dict(ConfigTraining.CF_BUILD_PARAM, blocked=True, block_size=64, n_jobs=2):
+            similarity, item_dict = CollabTrain(hits_data).fit()
+            hits_matrix, _ = CollabTrain(hits_data).transform_data()
+            reference = dense_cf_similarity(hits_matrix, K=K, K1=ConfigTraining.CF_KNN_PARAM['K1'],
+                                            B=ConfigTraining.CF_KNN_PARAM['B'])
+
+        similarity = similarity.toarray()
+
+        self.assertEqual(similarity.shape, (len(item_dict), len(item_dict)))
+        self.assertEqual(similarity.dtype, np.float32)
+        # the same neighbours are kept, with values within float32 precision
+        np.testing.assert_array_equal(similarity != 0, reference != 0)
+        np.testing.assert_allclose(similarity, reference, rtol=1e-5, atol=0)
+
+    def test_popular_items(self):
+        # items co-occur with most others, blocks are selected from their dense form
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self._assert_parity(synthetic_hits(n_members=3000, n_brands=300, seed=seed), K=250)
+
+    def test_long_tail(self):
+        # few co-occurrences, blocks are selected by a sort of their entries
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self._assert_parity(synthetic_hits(n_members=2000, n_brands=1500, hits_per_member=5, seed=seed),
+                                    K=20)
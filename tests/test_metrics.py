@@ -0,0 +1,39 @@
+"""
+@name: test_metrics.py
+@overview: Exact parity of batch_metrics over ragged_codes with the single user ranking metrics, on random lists
+
+    nosetests tests/test_metrics.py
+"""
+import unittest
+
+import numpy as np
+
+from app.models.cbcf.helpers.metrics import batch_metrics, ragged_codes
+from tests.fixtures import SINGLE_USER_METRICS, random_lists, single_user_scores
+
+
+class BatchMetricsParityTest(unittest.TestCase):
+
+    def _assert_parity(self, n_users: int, n_items: int, max_length: int, k: int, seed: int):
+        actual, predicted = random_lists(n_users, n_items, max_length, seed)
+        scores = batch_metrics(*ragged_codes(actual, predicted), k=k)
+
+        for name in SINGLE_USER_METRICS:
+            with self.subTest(metric=name, seed=seed, k=k):
+                reference = single_user_scores(name, actual, predicted, k)
+                self.assertTrue(np.array_equal(scores[name], reference, equal_nan=True),
+                                f'{name} differs for {int(np.sum(~np.isclose(scores[name], reference, equal_nan=True)))}'
+                                f' of {n_users} users')
+
+    def test_random_lists(self):
+        for seed in range(5):
+            for k in (1, 5, 10):
+                self._assert_parity(n_users=500, n_items=50, max_length=15, k=k, seed=seed)
+
+    def test_lists_shorter_than_k(self):
+        for seed in range(3):
+            self._assert_parity(n_users=300, n_items=10, max_length=3, k=10, seed=seed)
+
+    def test_many_repeated_items(self):
+        for seed in range(3):
+            self._assert_parity(n_users=300, n_items=4, max_length=12, k=5, seed=seed)
@@ -0,0 +1,145 @@
+"""
+@name: test_model_versions.py
+@overview: Retention, active pointer and pinned training of the Filesystem and S3 model repositories,
+           S3 against the local stub S3 client
+
+    nosetests tests/test_model_versions.py
+"""
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.errors import ApplicationException
+from app.library.model_repository.artifact import save_artifact
+from app.library.model_repository.loader.driver.filesystem import Filesystem as FilesystemLoader
+from app.library.model_repository.loader.driver.s3 import S3 as S3Loader
+from app.library.model_repository.repository import Repository
+from app.library.model_repository.saver.driver.filesystem import Filesystem as FilesystemSaver
+from app.library.model_repository.saver.driver.s3 import S3 as S3Saver
+from tests.fixtures import LocalS3Client, synthetic_model
+
+_BUCKET = 'bucket'
+
+
+class _ModelVersionsTests(object):
+    """Shared by the drivers, each test case builds its own saver, loader and legacy model"""
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def _saver(self, **kwargs):
+        raise NotImplementedError
+
+    def _loader(self):
+        raise NotImplementedError
+
+    def _save_legacy(self, model):
+        """Save a model as the trainings saved before versioning, under 'latest' without a pointer"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _model(training: int):
+        model = synthetic_model(n_items=50, density=0.1, seed=training)
+        model.init_date = datetime(2020, 1, 1) + timedelta(days=training)
+
+        return model
+
+    @staticmethod
+    def _unpinned(model):
+        model_info = model.to_model_info()
+        model_info.timestamp = None
+
+        return model_info
+
+    def _save(self, saver, n_trainings: int) -> list:
+        models = [self._model(training) for training in range(n_trainings)]
+        for model in models:
+            saver.save_model(model)
+
+        return [model.to_model_info().timestamp for model in models]
+
+    def test_retention_count_is_honoured(self):
+        saver = self._saver(retention_count=2)
+        timestamps = self._save(saver, 4)
+
+        self.assertEqual(saver.list_versions(self._unpinned(self._model(0))), timestamps[-2:])
+
+    def test_active_training_is_never_pruned(self):
+        saver = self._saver()
+        timestamps = self._save(saver, 4)
+        saver.activate(self._model(0).to_model_info())
+
+        pruned = saver.prune(self._unpinned(self._model(0)), retention_count=1)
+
+        self.assertEqual(pruned, timestamps[1:3])
+        self.assertEqual(saver.list_versions(self._unpinned(self._model(0))), [timestamps[0], timestamps[-1]])
+        self.assertEqual(self._loader().load_model(self._unpinned(self._model(0))).init_date,
+                         self._model(0).init_date)
+
+    def test_pinned_training_is_never_pruned(self):
+        pinned = self._model(0).to_model_info().timestamp
+        saver = self._saver(retention_count=1, pinned=pinned)
+        timestamps = self._save(saver, 4)
+
+        self.assertEqual(saver.list_versions(self._unpinned(self._model(0))), [pinned, timestamps[-1]])
+        self.assertEqual(self._loader().load_model(self._model(0).to_model_info()).init_date,
+                         self._model(0).init_date)
+
+    def test_missing_active_falls_back_to_latest(self):
+        model = self._model(0)
+        self._save_legacy(model)
+
+        loader = self._loader()
+        self.assertEqual(loader.resolve(self._unpinned(model)).timestamp, Repository.legacy_timestamp)
+        self.assertEqual(loader.load_model(self._unpinned(model)).init_date, model.init_date)
+
+    def test_activate_rejects_unknown_training(self):
+        saver = self._saver()
+        self._save(saver, 2)
+
+        with self.assertRaises(ApplicationException):
+            saver.activate(self._model(5).to_model_info())
+
+        # the pointer still holds the last saved training
+        self.assertEqual(self._loader().resolve(self._unpinned(self._model(0))).timestamp,
+                         self._model(1).to_model_info().timestamp)
+
+
+class FilesystemVersionsTest(_ModelVersionsTests, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.repository = Repository(str(Path(self.work_dir.name) / 'models'))
+
+    def _saver(self, **kwargs):
+        return FilesystemSaver(self.repository, **kwargs)
+
+    def _loader(self):
+        return FilesystemLoader(self.repository)
+
+    def _save_legacy(self, model):
+        save_artifact(self.repository.build_path_from_info(
+            self.repository.with_timestamp(model.to_model_info(), Repository.legacy_timestamp)), model)
+
+
+class S3VersionsTest(_ModelVersionsTests, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.repository = Repository('ds-models')
+        self.s3_client = LocalS3Client(str(Path(self.work_dir.name) / 's3'))
+
+    def _saver(self, **kwargs):
+        return S3Saver(self.repository, self.s3_client, _BUCKET, **kwargs)
+
+    def _loader(self):
+        return S3Loader(self.repository, self.s3_client, _BUCKET, cache_dir=str(Path(self.work_dir.name) / 'cache'))
+
+    def _save_legacy(self, model):
+        self._saver()._save_tar(self.repository.build_path_from_info(
+            self.repository.with_timestamp(model.to_model_info(), Repository.legacy_timestamp)),
+            metadata={}, model=model)
@@ -0,0 +1,72 @@
+"""
+@name: test_rec_val.py
+@overview: Parity of the batch validation scoring of RecVal.batch_predict with the former per member predictions,
+           kept as the reference in tests/fixtures.py
+
+    nosetests tests/test_rec_val.py
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from app.models.cbcf.training.cf_train import CollabTrain
+from app.models.cbcf.validation.rec_val import RecVal
+from tests.fixtures import legacy_batch_predict, synthetic_hits
+
+
+class BatchPredictParityTest(unittest.TestCase):
+
+    def _assert_parity(self, seed: int, n_rec: int):
+        rng = np.random.RandomState(seed)
+
+        hits = synthetic_hits(n_members=2000, n_brands=200, seed=seed)
+        hits['gender'] = hits['b_g'].str.split(' ', n=1, expand=True)[1].astype('int8')
+        test_rows = rng.rand(len(hits)) < 0.2
+        train_hits, test_hits = hits[~test_rows].copy(), hits[test_rows].copy()
+
+        sim_mat, item_dict = CollabTrain(train_hits, n_jobs=1).fit()
+        users_array = rng.choice(train_hits.memberID.unique(), size=200, replace=False)
+
+        pred_df, val_df = RecVal(hits, pd.DataFrame()).batch_predict(users_array, train_hits, test_hits, sim_mat,
+                                                                      item_dict, n_rec=n_rec)
+        ref_pred_df, ref_val_df = legacy_batch_predict(users_array, train_hits, test_hits, sim_mat, item_dict, n_rec)
+
+        # members in the same order, each ranked as the per member scoring did
+        self.assertEqual(pred_df.memberID.tolist(), ref_pred_df.memberID.tolist())
+        self.assertEqual(pred_df.b_g.tolist(), ref_pred_df.b_g.tolist())
+        np.testing.assert_allclose(pred_df.score.values, ref_pred_df.score.values.astype(np.float64),
+                                   rtol=0, atol=1e-6)
+
+        self.assertEqual(val_df.memberID.tolist(), ref_val_df.memberID.tolist())
+        self.assertEqual(val_df.gender.tolist(), ref_val_df.gender.tolist())
+        self.assertEqual(val_df.test.tolist(), ref_val_df.test.tolist())
+        self.assertEqual(val_df.pred.tolist(), ref_val_df.pred.tolist())
+
+    def test_batch_predict(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self._assert_parity(seed, n_rec=10)
+
+    def test_batch_predict_long_lists(self):
+        # deep in the lists, normalized scores of the two genders are close and may round to the same value
+        self._assert_parity(seed=3, n_rec=100)
+
+    def test_rank_on_unrounded_score(self):
+        # the second items of both genders round to 0.5, gender 0 is ahead before rounding
+        item_dict = {0: '1 0', 1: '2 0', 2: '3 0', 3: '4 1', 4: '5 1'}
+        sim_mat = csr_matrix(np.array([[0, np.e - 1, np.expm1(0.5000004), np.e - 1, np.expm1(0.4999996)]] +
+                                      [[0] * 5] * 4))
+        train_hits = pd.DataFrame({'memberID': [7], 'b_g': ['1 0'], 'total_hits': [1.]})
+        test_hits = pd.DataFrame({'memberID': [7, 7], 'b_g': ['3 0', '5 1'], 'total_hits': [1., 1.],
+                                  'gender': [0, 1]})
+
+        pred_df, val_df = RecVal(train_hits, pd.DataFrame()).batch_predict(np.array([7]), train_hits, test_hits,
+                                                                            sim_mat, item_dict, n_rec=2)
+        ref_pred_df, ref_val_df = legacy_batch_predict([7], train_hits, test_hits, sim_mat, item_dict, n_rec=2)
+
+        self.assertEqual(pred_df.b_g.tolist(), ['4 1', '2 0', '3 0', '5 1'])
+        self.assertEqual(pred_df.b_g.tolist(), ref_pred_df.b_g.tolist())
+        self.assertEqual(pred_df.score.tolist(), [1., 1., .5, .5])
+        self.assertEqual(val_df.pred.tolist(), ref_val_df.pred.tolist())
@@ -0,0 +1,96 @@
+"""
+@name: test_s3_loader.py
+@overview: S3 model loader against the local stub S3 client: ranged GET reassembly, checksum verification
+           and the local cache
+
+    nosetests tests/test_s3_loader.py
+"""
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.errors import ApplicationException
+from app.library.model_repository.loader.driver.s3 import S3 as S3Loader
+from app.library.model_repository.repository import Repository
+from app.library.model_repository.saver.driver.s3 import S3 as S3Saver
+from tests.fixtures import LocalS3Client, synthetic_model
+
+_BUCKET = 'bucket'
+_PART_SIZE = 64 * 1024
+
+
+class S3LoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.s3_client = LocalS3Client(str(Path(self.work_dir.name) / 's3'))
+        self.repository = Repository('ds-models')
+        self.model = synthetic_model(n_items=400, density=0.05, seed=0)
+        self.model_info = self.model.to_model_info()
+
+        S3Saver(self.repository, self.s3_client, _BUCKET, part_size=_PART_SIZE, max_workers=2).save_model(self.model)
+
+        self.metadata = json.loads(self.s3_client.get_object(
+            Bucket=_BUCKET, Key=str(self.repository.build_path_from_info(self.model_info, 'metadata.json')))['Body']
+            .read())
+        self.tar_key = str(self.repository.build_path_from_info(self.model_info, self.metadata['tar_file_name']))
+        self.tar_size = self.s3_client.head_object(Bucket=_BUCKET, Key=self.tar_key)['ContentLength']
+        self.s3_client.calls.clear()
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def _loader(self, cache_name: str = 'cache', **kwargs) -> S3Loader:
+        return S3Loader(self.repository, self.s3_client, _BUCKET, cache_dir=str(Path(self.work_dir.name) / cache_name),
+                        **kwargs)
+
+    def test_ranged_gets_reassemble_the_tar(self):
+        # parts smaller than the tar, the last one shorter than the others
+        part_size = 4096 + 7
+        n_parts = -(-self.tar_size // part_size)
+        self.assertGreater(n_parts, 2)
+
+        loaded = self._loader(part_size=part_size, max_workers=4).load_model(self.model_info)
+
+        # metadata.json then one GET per part
+        self.assertEqual(self.s3_client.calls['get_object'], 1 + n_parts)
+        self.assertEqual(self.s3_client.calls['head_object'], 0)
+
+        extracted = Path(self.work_dir.name, 'cache', self.metadata['sha256'])
+        for name, component in self.metadata['components'].items():
+            self.assertEqual(hashlib.sha256((extracted / name).read_bytes()).hexdigest(), component['sha256'])
+
+        self.assertEqual((loaded.cf_sim_mat != self.model.cf_sim_mat).nnz, 0)
+        self.assertEqual((loaded.cb_sim_mat != self.model.cb_sim_mat).nnz, 0)
+        self.assertEqual(loaded.cf_item_dict, self.model.cf_item_dict)
+
+    def test_checksum_mismatch_is_rejected(self):
+        with self.s3_client._path(_BUCKET, self.tar_key).open('r+b') as f:
+            f.seek(self.tar_size // 2)
+            f.write(b'corrupted')
+
+        with self.assertRaises(ApplicationException):
+            self._loader(part_size=_PART_SIZE).load_model(self.model_info)
+
+        # no extracted artifact, temporary tar or ref is left behind
+        self.assertEqual(list(Path(self.work_dir.name, 'cache').iterdir()), [])
+
+    def test_cache_hit_skips_the_download(self):
+        self._loader(part_size=_PART_SIZE).load_model(self.model_info)
+        self.s3_client.calls.clear()
+
+        loaded = self._loader(part_size=_PART_SIZE).load_model(self.model_info)
+
+        # metadata.json is read again, the tar is not
+        self.assertEqual(dict(self.s3_client.calls), {'get_object': 1})
+        self.assertEqual((loaded.cf_sim_mat != self.model.cf_sim_mat).nnz, 0)
+
+    def test_offline_cache_hit_skips_the_network(self):
+        self._loader(part_size=_PART_SIZE).load_model(self.model_info)
+        self.s3_client.calls.clear()
+
+        self._loader(part_size=_PART_SIZE, revalidate=False).load_model(self.model_info)
+
+        self.assertEqual(dict(self.s3_client.calls), {})